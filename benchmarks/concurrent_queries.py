@@ -0,0 +1,80 @@
+import argparse
+import glob
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from divinwd.sparql import SparqlError, add_client_arguments, client_from_arguments
+from language_query import clear_cache
+
+
+QUERIES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'queries')
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Send the queries of all the scripts in queries/ to the endpoint, one at a time and several at '
+                    'a time with SparqlClient.query_all, and report the time taken to get all the results. On a '
+                    'replay endpoint (`python -m divinwd.replay --latency 1`), this measures the client alone.')
+    add_client_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='send the queries reading the triples derived when indexing the dataset '
+                             '(see database/README.md)')
+    parser.add_argument('--max-concurrency', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='numbers of queries sent at the same time to compare (default: 1 2 4 8)')
+    parser.add_argument('--runs', type=int, default=3, help='runs of each number (default: 3)')
+
+    return parser
+
+
+def script_queries(derived):
+    # The query of each script, by script name; scripts whose dependencies are missing
+    # are left out
+    queries = {}
+    for path in sorted(glob.glob(os.path.join(QUERIES_DIRECTORY, '*', '*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(f"queries.{name.replace('-', '_')}", path)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+        except ImportError as e:
+            print(f"Warning: cannot load {name}.py ({e}), its query is left out", file=sys.stderr)
+            continue
+        queries[name] = getattr(module, 'QUERY_DERIVED' if derived else 'QUERY')
+
+    return queries
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+    queries = script_queries(arguments.derived)
+    print(f"{len(queries)} queries: {', '.join(queries)}")
+
+    # Results must be computed by the endpoint every time
+    arguments.no_cache = True
+    expected = None
+    for max_concurrency in arguments.max_concurrency:
+        with client_from_arguments(arguments, max_concurrency=max_concurrency) as client:
+            times = []
+            for _ in range(arguments.runs):
+                clear_cache(client)
+                start = time.perf_counter()
+                try:
+                    results = client.query_all(list(queries.values()))
+                except SparqlError as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    sys.exit(1)
+                times.append(time.perf_counter() - start)
+        print(f"{max_concurrency} at a time: best {min(times):.2f} s, mean {sum(times) / len(times):.2f} s "
+              f"over {len(times)} runs")
+
+        expected = expected or results
+        if results != expected:
+            print(f"The results differ with {max_concurrency} queries at a time", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
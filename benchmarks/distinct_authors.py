@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from divinwd.incidence import AuthorshipMatrix
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Compare a pandas group-by and the sparse authorship matrix of divinwd.incidence counting '
+                    'the distinct authors per year of a subset of the articles')
+    parser.add_argument('--articles', type=int, default=1_400_000, help='number of articles (default: 1400000)')
+    parser.add_argument('--authors', type=int, default=870_000, help='number of authors (default: 870000)')
+    parser.add_argument('--pairs', type=int, default=5_000_000,
+                        help='number of (article, author) pairs (default: 5000000)')
+    parser.add_argument('--fraction', type=float, default=0.3,
+                        help='fraction of the articles in each subset (default: 0.3)')
+    parser.add_argument('--runs', type=int, default=5, help='subsets counted by each method (default: 5)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+
+    return parser
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+    rng = np.random.default_rng(arguments.seed)
+
+    articles = np.arange(arguments.articles, dtype=np.int64)
+    years = rng.integers(1990, 2025, size=arguments.articles)
+    # Pairs come sorted by article from the store
+    article = np.sort(rng.integers(0, arguments.articles, size=arguments.pairs))
+    author = rng.integers(0, arguments.authors, size=arguments.pairs)
+
+    start = time.perf_counter()
+    authorship = AuthorshipMatrix(articles, years, article, author)
+    print(f"{arguments.pairs} pairs of {arguments.articles} articles and {arguments.authors} authors, "
+          f"matrix built in {time.perf_counter() - start:.2f} s")
+
+    df = pd.DataFrame({'article': article, 'author': author, 'year': years[article]})
+    subsets = [rng.random(arguments.articles) < arguments.fraction for _ in range(arguments.runs)]
+
+    start = time.perf_counter()
+    expected = [df[subset[df['article'].to_numpy()]].groupby('year')['author'].nunique().to_numpy()
+                for subset in subsets]
+    print(f"pandas group-by: {(time.perf_counter() - start) / arguments.runs:.3f} s per subset")
+
+    start = time.perf_counter()
+    counts = [authorship.authors_per_year(authorship.article_mask(articles[subset]))['author_count'].to_numpy()
+              for subset in subsets]
+    elapsed = (time.perf_counter() - start) / arguments.runs
+    same = all(np.array_equal(a, b) for a, b in zip(expected, counts))
+    print(f"sparse matrix: {elapsed:.3f} s per subset" + ("" if same else " (DIFFERENT RESULT)"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from ntriples_parser import write_dump
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from divinwd.derive import find_eligible_articles
+from divinwd.ntriples import read_triples
+from divinwd.offline import eligible_articles
+from divinwd.store import TripleStore, build_store
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Compare the selection of articles by divinwd.derive (one pass over the dump) '
+                    'and by divinwd.offline (arrays of the store)')
+    parser.add_argument('--articles', type=int, default=1_000_000, help='number of synthetic articles (default: 1000000)')
+    parser.add_argument('--current-year', type=int, default=2024, help='current year (default: 2024)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+
+    return parser
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'synthetic.nt.gz')
+        triples = write_dump(path, arguments.articles, arguments.seed)
+        print(f"Synthetic dump: {triples} triples")
+
+        start = time.perf_counter()
+        expected = find_eligible_articles(read_triples([path]), arguments.current_year)
+        print(f"divinwd.derive: {time.perf_counter() - start:.2f} s, {len(expected)} articles")
+
+        start = time.perf_counter()
+        build_store(read_triples([path]), os.path.join(directory, 'store'))
+        print(f"building the store: {time.perf_counter() - start:.2f} s")
+
+        start = time.perf_counter()
+        with TripleStore(os.path.join(directory, 'store')) as store:
+            articles, years = eligible_articles(store, arguments.current_year)
+            elapsed = time.perf_counter() - start
+            same = {store.term(a): int(y) for a, y in zip(articles, years)} == {
+                article: year for article, (_, year) in expected.items()}
+        print(f"divinwd.offline: {elapsed:.2f} s, {len(articles)} articles"
+              + ("" if same else " (DIFFERENT RESULT)"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'queries', 'gender'))
+from gender import count_authors
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(description='Compare the row-by-row and the vectorized gender tally of gender.py')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='number of author-year rows (default: 1000000)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+
+    return parser
+
+
+def make_rows(n, seed):
+    # Same shape as the result of QUERY_AUTHORS in gender.py
+    rng = np.random.default_rng(seed)
+    genders = np.array(['male', 'female', 'other', 'unknown', ' Male '], dtype=object)
+    sources = np.array(['wikidata', 'genderize.io', 'unknown'], dtype=object)
+
+    return pd.DataFrame({
+        'author': np.arange(n),
+        'year': rng.integers(2008, 2026, size=n),
+        'gender_category': genders[rng.choice(len(genders), size=n, p=[0.55, 0.25, 0.01, 0.17, 0.02])],
+        'source': sources[rng.choice(len(sources), size=n, p=[0.6, 0.23, 0.17])],
+    })
+
+
+def count_authors_rows(df, years):
+    # The per-row loop gender.py used before count_authors
+    data_source = {
+        "Source: Wikidata": np.zeros(len(years), dtype=int),
+        "Source: Genderize": np.zeros(len(years), dtype=int),
+    }
+    data_gender = {
+        "Female": np.zeros(len(years), dtype=int),
+        "Male": np.zeros(len(years), dtype=int),
+        "Other": np.zeros(len(years), dtype=int),
+    }
+    unknown = np.zeros(len(years), dtype=int)
+
+    for i, y in enumerate(years):
+        dfy = df[df['year'] == int(y)]
+        for _, row in dfy.iterrows():
+            g = row['gender_category']
+            g = '' if pd.isna(g) else str(g).strip().lower()
+            if not g or g == 'unknown':
+                unknown[i] += 1
+            elif g == 'female':
+                data_gender['Female'][i] += 1
+            elif g == 'male':
+                data_gender['Male'][i] += 1
+            else:
+                data_gender['Other'][i] += 1
+
+            s = row['source']
+            s = '' if pd.isna(s) else str(s).strip().lower()
+            if 'wikidata' in s:
+                data_source['Source: Wikidata'][i] += 1
+            elif 'genderize' in s:
+                data_source['Source: Genderize'][i] += 1
+
+    return data_source, data_gender, unknown
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+
+    df = make_rows(arguments.rows, arguments.seed)
+    years = np.arange(2010, 2025)
+
+    expected, rows_time = timed(count_authors_rows, df, years)
+    result, vectorized_time = timed(count_authors, df, years)
+
+    for e, r in zip(expected[:2], result[:2]):
+        assert all(np.array_equal(e[k], r[k]) for k in e), "the two tallies differ"
+    assert np.array_equal(expected[2], result[2]), "the two tallies differ"
+
+    print(f"{arguments.rows:,} rows")
+    print(f"row by row: {rows_time:8.3f} s")
+    print(f"vectorized: {vectorized_time:8.3f} s ({rows_time / vectorized_time:,.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
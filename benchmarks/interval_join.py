@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from divinwd.offline import EARLIEST, LATEST, interval_join
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Compare a per-row loop and the vectorized interval join of divinwd.offline, which keeps '
+                    'the employment or citizenship statements valid at the publication date of each article')
+    parser.add_argument('--rows', type=int, default=5_000_000,
+                        help='number of (article, author) pairs (default: 5000000)')
+    parser.add_argument('--authors', type=int, default=2_000_000, help='number of authors (default: 2000000)')
+    parser.add_argument('--statements', type=int, default=1_000_000,
+                        help='number of statements with their intervals (default: 1000000)')
+    parser.add_argument('--loop-rows', type=int, default=200_000,
+                        help='pairs joined by the loop, whose time is extrapolated to all pairs (default: 200000)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+
+    return parser
+
+
+def make_intervals(arguments):
+    rng = np.random.default_rng(arguments.seed)
+    day = np.timedelta64(86400, 's')
+    first = np.datetime64('1990-01-01T00:00:00', 's')
+
+    keys = rng.integers(0, arguments.authors, size=arguments.rows)
+    dates = first + rng.integers(0, 35 * 365, size=arguments.rows) * day
+
+    # Statements with a start, an end, both or neither, as in Wikidata
+    holders = np.sort(rng.integers(0, arguments.authors, size=arguments.statements))
+    starts = first + rng.integers(-20 * 365, 30 * 365, size=arguments.statements) * day
+    ends = starts + rng.integers(365, 20 * 365, size=arguments.statements) * day
+    starts[rng.random(arguments.statements) < 0.3] = EARLIEST
+    ends[rng.random(arguments.statements) < 0.5] = LATEST
+
+    return keys, dates, holders, starts, ends
+
+
+def interval_join_rows(keys, dates, interval_keys, starts, ends):
+    # One lookup and a loop over the intervals of the key, row by row
+    intervals = {}
+    for j, key in enumerate(interval_keys.tolist()):
+        intervals.setdefault(key, []).append(j)
+
+    rows, matches = [], []
+    for i, (key, date) in enumerate(zip(keys.tolist(), dates)):
+        for j in intervals.get(key, ()):
+            if starts[j] <= date < ends[j]:
+                rows.append(i)
+                matches.append(j)
+
+    return np.array(rows, dtype=np.int64), np.array(matches, dtype=np.int64)
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+    keys, dates, holders, starts, ends = make_intervals(arguments)
+    print(f"{arguments.rows} pairs, {arguments.statements} statements of {arguments.authors} authors")
+
+    n = min(arguments.loop_rows, arguments.rows)
+    start = time.perf_counter()
+    expected = interval_join_rows(keys[:n], dates[:n], holders, starts, ends)
+    elapsed = time.perf_counter() - start
+    print(f"loop: {elapsed:.2f} s for {n} pairs, about {elapsed * arguments.rows / n:.1f} s for all")
+
+    start = time.perf_counter()
+    rows, matches = interval_join(keys, dates, holders, starts, ends)
+    elapsed = time.perf_counter() - start
+
+    head = rows < n
+    same = np.array_equal(rows[head], expected[0]) and np.array_equal(matches[head], expected[1])
+    print(f"interval_join: {elapsed:.2f} s for all pairs, {len(rows)} matches"
+          + ("" if same else " (DIFFERENT RESULT)"))
+
+
+if __name__ == '__main__':
+    main()
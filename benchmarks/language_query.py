@@ -0,0 +1,99 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'queries', 'language'))
+from divinwd.sparql import SparqlError, add_client_arguments, client_from_arguments
+from language import ARTICLES, ARTICLES_DERIVED, QUERY
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Compare the runtime of the query of language.py on the endpoint, with the language '
+                    'variants mapped by VALUES tables and by the IF chains used before')
+    add_client_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='select articles with the triples derived when indexing the dataset (see database/README.md)')
+    parser.add_argument('--runs', type=int, default=3, help='runs of each query (default: 3)')
+
+    return parser
+
+
+# The mapping of language.py before it was generated from divinwd/languages.json
+LEGACY_WIKIDATA = """            OPTIONAL { ?article wdt:P407 ?languageValue . }
+
+            BIND (
+                COALESCE(
+                    IF(!BOUND(?languageValue) || ?languageValue IN (wd:Q66724591, wd:Q20923490), wd:Q22282914, 1/0), # map to undetermined: non-English, multiple languages
+                    IF(?languageValue IN (wd:Q44679, wd:Q44676, wd:Q7979, wd:Q1348800, wd:Q21480034, wd:Q7976, wd:Q6144345, wd:Q7707309), wd:Q1860, 1/0), # English
+                    IF(?languageValue IN (wd:Q24841726, wd:Q13414913, wd:Q18130932, wd:Q100148307, wd:Q64427357, wd:Q13646143, wd:Q1048980, wd:Q262828, wd:Q4380827), wd:Q7850, 1/0), # Chinese
+                    IF(?languageValue = wd:Q750553, wd:Q5146, 1/0), # Portuguese
+                    IF(?languageValue = wd:Q8141, wd:Q9288, 1/0), # Hebrew
+                    IF(?languageValue = wd:Q1115875, wd:Q1321, 1/0), # Spanish
+                    IF(?languageValue IN (wd:Q306626, wd:Q125258960, wd:Q1366643, wd:Q64427341), wd:Q188, 1/0), # German
+                    ?languageValue
+                ) AS ?language
+            )
+"""
+
+LEGACY_EXTERNAL = """    OPTIONAL {
+        ?article oacr:lang ?langValue .
+        BIND (COALESCE(
+            IF(?langValue = wd:Q191769, wd:Q9043, 1/0),
+            IF(?langValue IN (wd:Q24841726, wd:Q13414913, wd:Q18130932, wd:Q100148307, wd:Q64427357, wd:Q13646143, wd:Q1048980, wd:Q262828, wd:Q4380827), wd:Q7850, 1/0),
+            ?langValue
+        ) AS ?extLang)
+    }
+"""
+
+
+def legacy_query(query):
+    # Swap the generated mappings of the query for the IF chains
+    start = query.index("            # Languages in Wikidata")
+    end = query.index("AS ?language)\n", start) + len("AS ?language)\n")
+    query = query[:start] + LEGACY_WIKIDATA + query[end:]
+
+    start = query.index("    OPTIONAL {\n        ?article oacr:lang ?langValue .")
+    end = query.index("    }\n", query.index("AS ?extLang)", start)) + len("    }\n")
+    return query[:start] + LEGACY_EXTERNAL + query[end:]
+
+
+def clear_cache(client):
+    # QLever keeps query results; without clearing them, every run but the first is a lookup
+    try:
+        client.session.get(client.url, params={'cmd': 'clear-cache'}, timeout=client.timeout).raise_for_status()
+    except Exception as e:
+        print(f"Warning: cannot clear the cache of the endpoint ({e}), runs may be cached", file=sys.stderr)
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+    query = QUERY.replace(ARTICLES, ARTICLES_DERIVED) if arguments.derived else QUERY
+    queries = {'IF chains': legacy_query(query), 'VALUES tables': query}
+
+    # Results must be computed by the endpoint every time
+    arguments.no_cache = True
+    with client_from_arguments(arguments) as client:
+        results = {}
+        for name, text in queries.items():
+            times = []
+            for _ in range(arguments.runs):
+                clear_cache(client)
+                start = time.perf_counter()
+                try:
+                    results[name] = client.query(text)
+                except SparqlError as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    sys.exit(1)
+                times.append(time.perf_counter() - start)
+            print(f"{name}: best {min(times):.2f} s, mean {sum(times) / len(times):.2f} s over {len(times)} runs")
+
+    if len(set(results.values())) > 1:
+        print("The two queries return different results", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from divinwd.ntriples import read_triples
+from divinwd.store import TripleEncoder, parse_dumps
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Measure the throughput of the N-Triples parser of divinwd.store against the number of workers')
+    parser.add_argument('--articles', type=int, default=200_000, help='number of synthetic articles (default: 200000)')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count()}),
+                        help='worker counts to measure (default: 1 2 4 and the number of CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=8, help='MiB per chunk (default: 8)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+
+    return parser
+
+
+def write_dump(path, n, seed):
+    # Articles with a publication date, a language and a few authors, each author with a
+    # gender: the shapes of terms found in the dataset (entities, Q-ids, typed and plain
+    # literals), not its statistics
+    rng = np.random.default_rng(seed)
+    entity = 'https://divinwd.dev/wd/entity/X'
+    wdt = 'http://www.wikidata.org/prop/direct/'
+    n_authors = n // 2
+    count = 0
+
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=1) as f:
+        for article in range(n):
+            year = rng.integers(2000, 2025)
+            month, day = rng.integers(1, 13), rng.integers(1, 29)
+            f.write(f'<{entity}{article}> <{wdt}P31> <http://www.wikidata.org/entity/Q13442814> .\n')
+            f.write(f'<{entity}{article}> <{wdt}P577> "{year}-{month:02d}-{day:02d}T00:00:00Z"'
+                    '^^<http://www.w3.org/2001/XMLSchema#dateTime> .\n')
+            f.write(f'<{entity}{article}> <{wdt}P407> <http://www.wikidata.org/entity/Q1860> .\n')
+            f.write(f'<{entity}{article}> <https://divinwd.dev/semanticscholar/fos/value> "computer science" .\n')
+            count += 4
+            for author in rng.integers(0, n_authors, size=rng.integers(1, 6)):
+                f.write(f'<{entity}{article}> <{wdt}P50> <{entity}{n + author}> .\n')
+                count += 1
+        for author in range(n_authors):
+            f.write(f'<{entity}{n + author}> <{wdt}P31> <http://www.wikidata.org/entity/Q5> .\n')
+            f.write(f'<{entity}{n + author}> <https://divinwd.dev/genderize/gender> "female" .\n')
+            count += 2
+
+    return count
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'synthetic.nt.gz')
+        triples = write_dump(path, arguments.articles, arguments.seed)
+        print(f"Synthetic dump: {triples} triples, {os.path.getsize(path) / 2 ** 20:.1f} MiB gzipped "
+              f"({os.cpu_count()} CPUs)")
+
+        start = time.perf_counter()
+        encoder = TripleEncoder()
+        for s, p, o in read_triples([path]):
+            encoder.add(s, p, o)
+        expected = encoder.finish()
+        elapsed = time.perf_counter() - start
+        print(f"single loop: {elapsed:.2f} s, {triples / elapsed:,.0f} triples/s")
+
+        for workers in arguments.workers:
+            start = time.perf_counter()
+            terms, partitions = parse_dumps([path], workers, arguments.chunk_size * 1024 * 1024)
+            elapsed = time.perf_counter() - start
+
+            same = terms == expected[0] and partitions.keys() == expected[1].keys() and all(
+                np.array_equal(partitions[p][i], expected[1][p][i]) for p in partitions for i in (0, 1))
+            print(f"{workers} worker(s): {elapsed:.2f} s, {triples / elapsed:,.0f} triples/s"
+                  + ("" if same else " (DIFFERENT RESULT)"))
+
+
+if __name__ == '__main__':
+    main()
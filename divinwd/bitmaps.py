@@ -0,0 +1,287 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from divinwd.cube import article_fields, article_languages, author_continents, author_genders, author_ror_types
+from divinwd.incidence import AuthorshipMatrix
+from divinwd.offline import article_authors, eligible_articles, publication_dates
+from divinwd.store import TripleStore
+
+
+INDEX_VERSION = 1
+MANIFEST = 'bitmaps.json'
+BITMAPS = 'bitmaps.npz'
+
+# Attributes of articles, of authors, and of authors in a year (their citizenships and
+# employers at the publication date of their articles of that year)
+ARTICLE_ATTRIBUTES = ['year', 'language', 'language_source', 'field_of_study']
+AUTHOR_ATTRIBUTES = ['gender', 'gender_source']
+AUTHOR_YEAR_ATTRIBUTES = ['continent', 'nationality_source', 'ror_type']
+
+# Number of set bits of each byte, for NumPy versions without bitwise_count
+_BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Build bitmap indexes of the articles and authors of the dataset per attribute value from '
+                    'the offline store (see database/README.md), or count the articles and authors matching '
+                    'conditions with such an index')
+    parser.add_argument('conditions', nargs='*',
+                        help='conditions attribute=value, e.g. year=2018 gender=female continent=Asia '
+                             'language=non-English; give several values of an attribute to match any of them')
+    parser.add_argument('--index', required=True, help='directory of the index (e.g. divinwd-bitmaps)')
+    parser.add_argument('--store', help='build the index from the store built by `python -m divinwd.store` in '
+                                        'this directory')
+    parser.add_argument('--current-year', type=int, default=datetime.date.today().year,
+                        help='publication dates after this year are ignored, as YEAR(NOW()) does in the queries '
+                             '(default: this year)')
+
+    return parser
+
+
+def to_bitmap(mask):
+    # Bits of a boolean array packed in 64-bit words, bit i of the array being bit i % 64
+    # of word i // 64
+    data = np.packbits(mask, bitorder='little')
+    words = np.zeros(-(-len(data) // 8) * 8, dtype=np.uint8)
+    words[:len(data)] = data
+    return words.view(np.uint64)
+
+
+def to_mask(bitmap, n):
+    return np.unpackbits(bitmap.view(np.uint8), count=n, bitorder='little').astype(bool)
+
+
+def count(bitmap):
+    # Number of set bits; bitmaps are combined with the operators & and | of NumPy arrays
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bitmap).sum())
+    return int(_BYTE_COUNTS[bitmap.view(np.uint8)].sum())
+
+
+def value_bitmaps(ids, values, key, n):
+    # {key(values): bitmap} of the positions ids (< n) having each combination of values;
+    # ids and the arrays of values are parallel, with one row per value of an id
+    bitmaps = {}
+    for group, positions in pd.Series(ids).groupby(list(values)):
+        mask = np.zeros(n, dtype=bool)
+        mask[positions.to_numpy()] = True
+        bitmaps[key(*group)] = to_bitmap(mask)
+    return bitmaps
+
+
+class BitmapIndex:
+    # One bitmap per attribute value over the articles (the rows of an AuthorshipMatrix) and
+    # one over the authors (its columns). Authors are matched with articles through the
+    # matrix: the authors of a set of articles, and the articles of a set of authors.
+
+    def __init__(self, authorship, bitmaps):
+        self.authorship = authorship
+        self.bitmaps = bitmaps
+
+    @classmethod
+    def from_store(cls, store, current_year):
+        articles, years = eligible_articles(store, current_year)
+        dates = publication_dates(store, articles)
+        article, author = article_authors(store, articles)
+        authorship = AuthorshipMatrix(articles, years, article, author)
+        n_articles, n_authors = authorship.matrix.shape
+
+        # Rows of the articles and columns of the authors
+        row_order = np.argsort(authorship.articles)
+        rows = lambda ids: row_order[np.searchsorted(authorship.articles, ids, sorter=row_order)]
+        columns = lambda ids: np.searchsorted(authorship.authors, ids)
+
+        bitmaps = value_bitmaps(np.arange(n_articles), [authorship.years], lambda v: ('year', int(v)), n_articles)
+        languages = article_languages(store, articles)
+        fields = article_fields(store, articles)
+        for attribute, df in (('language', languages), ('language_source', languages), ('field_of_study', fields)):
+            bitmaps.update(value_bitmaps(rows(df['article'].to_numpy()), [df[attribute].to_numpy()],
+                                         lambda v, a=attribute: (a, v), n_articles))
+
+        genders = author_genders(store, authorship.authors)
+        for attribute in AUTHOR_ATTRIBUTES:
+            bitmaps.update(value_bitmaps(columns(genders['author'].to_numpy()), [genders[attribute].to_numpy()],
+                                         lambda v, a=attribute: (a, v), n_authors))
+
+        # Attributes of authors in a year, keyed by value and year
+        continents = author_continents(store, articles, dates)
+        ror_types = author_ror_types(store, articles, dates)
+        for attribute, df in (('continent', continents), ('nationality_source', continents),
+                              ('ror_type', ror_types)):
+            year = years[np.searchsorted(articles, df['article'].to_numpy())]
+            bitmaps.update(value_bitmaps(columns(df['author'].to_numpy()), [df[attribute].to_numpy(), year],
+                                         lambda v, y, a=attribute: (a, v, int(y)), n_authors))
+
+        return cls(authorship, bitmaps)
+
+    def articles(self, attribute, value):
+        return self.bitmaps.get((attribute, value), self.none(0))
+
+    def authors(self, attribute, value, year=None):
+        # Authors with a value; for attributes of authors in a year, in that year, or in any
+        # year when year is None
+        if attribute not in AUTHOR_YEAR_ATTRIBUTES:
+            return self.bitmaps.get((attribute, value), self.none(1))
+        if year is not None:
+            return self.bitmaps.get((attribute, value, year), self.none(1))
+        bitmap = self.none(1)
+        for key, other in self.bitmaps.items():
+            if key[:2] == (attribute, value):
+                bitmap = bitmap | other
+        return bitmap
+
+    def none(self, axis):
+        # Empty bitmap of the articles (axis 0) or the authors (axis 1)
+        return to_bitmap(np.zeros(self.authorship.matrix.shape[axis], dtype=bool))
+
+    def all(self, axis):
+        return to_bitmap(np.ones(self.authorship.matrix.shape[axis], dtype=bool))
+
+    def values(self, attribute):
+        return sorted({key[1] for key in self.bitmaps if key[0] == attribute})
+
+    def authors_of(self, articles):
+        # Authors of the articles of a bitmap
+        n_articles, n_authors = self.authorship.matrix.shape
+        counts = self.authorship.matrix.T @ to_mask(articles, n_articles).astype(np.int32)
+        return to_bitmap(counts > 0)
+
+    def articles_of(self, authors):
+        # Articles with at least one author of a bitmap
+        n_articles, n_authors = self.authorship.matrix.shape
+        counts = self.authorship.matrix @ to_mask(authors, n_authors).astype(np.int32)
+        return to_bitmap(counts > 0)
+
+    def match(self, conditions):
+        # Articles and authors matching {attribute: values}: articles with all the article
+        # attributes and an author with all the author attributes, and the authors of these
+        # articles. Attributes of authors in a year hold in the given years, if any.
+        years = conditions.get('year')
+        articles, authors = self.all(0), self.all(1)
+        for attribute, values in conditions.items():
+            if attribute in ARTICLE_ATTRIBUTES:
+                bitmap = self.none(0)
+                for value in values:
+                    bitmap = bitmap | self.articles(attribute, value)
+                articles = articles & bitmap
+            elif attribute in AUTHOR_ATTRIBUTES + AUTHOR_YEAR_ATTRIBUTES:
+                bitmap = self.none(1)
+                for value in values:
+                    for year in years or [None]:
+                        bitmap = bitmap | self.authors(attribute, value, year)
+                authors = authors & bitmap
+            else:
+                raise ValueError(f"Unknown attribute {attribute}")
+
+        if any(attribute not in ARTICLE_ATTRIBUTES for attribute in conditions):
+            articles = articles & self.articles_of(authors)
+        return articles, authors & self.authors_of(articles)
+
+    def breakdown(self, measure, attributes, years):
+        # Distinct articles or authors ('articles' or 'authors') per year and combination of
+        # values of the attributes, as gender.py, language.py and nationality.py count them.
+        # Attributes of the counted items only take an AND and a count per combination.
+        rows = []
+        combinations = pd.MultiIndex.from_product([self.values(a) for a in attributes])
+        own = ARTICLE_ATTRIBUTES if measure == 'articles' else AUTHOR_ATTRIBUTES + AUTHOR_YEAR_ATTRIBUTES
+        for year in years:
+            articles = self.articles('year', year)
+            items = articles if measure == 'articles' else self.authors_of(articles)
+            for values in combinations:
+                if all(a in own for a in attributes):
+                    bitmap = items
+                    for attribute, value in zip(attributes, values):
+                        bitmap = bitmap & (self.articles(attribute, value) if measure == 'articles'
+                                           else self.authors(attribute, value, year))
+                else:
+                    matched = self.match({'year': [year], **{a: [v] for a, v in zip(attributes, values)}})
+                    bitmap = matched[0] if measure == 'articles' else matched[1]
+                n = count(bitmap)
+                if n:
+                    rows.append((year, *values, n))
+
+        name = 'article_count' if measure == 'articles' else 'author_count'
+        return pd.DataFrame(rows, columns=['year', *attributes, name])
+
+    def save(self, directory, current_year):
+        os.makedirs(directory, exist_ok=True)
+        keys = list(self.bitmaps)
+        matrix = self.authorship.matrix
+        np.savez_compressed(os.path.join(directory, BITMAPS), articles=self.authorship.articles,
+                            years=self.authorship.years, authors=self.authorship.authors,
+                            indptr=matrix.indptr, indices=matrix.indices,
+                            **{str(k): self.bitmaps[key] for k, key in enumerate(keys)})
+        manifest = {'version': INDEX_VERSION, 'current_year': current_year, 'bitmaps': keys}
+        with open(os.path.join(directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    @classmethod
+    def load(cls, directory):
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No index in {directory}; build it with `python -m divinwd.bitmaps "
+                                    "--store`") from None
+        if manifest.get('version') != INDEX_VERSION:
+            raise ValueError(f"The index in {directory} was built by another version; build it again")
+
+        with np.load(os.path.join(directory, BITMAPS)) as data:
+            # The matrix is built again from its rows, ordered by year then article
+            articles, years, authors = data['articles'], data['years'], data['authors']
+            indptr, indices = data['indptr'], data['indices']
+            article = articles[np.repeat(np.arange(len(articles)), np.diff(indptr))]
+            author = authors[indices]
+            order, pairs = np.argsort(articles), np.argsort(article, kind='stable')
+            authorship = AuthorshipMatrix(articles[order], years[order], article[pairs], author[pairs])
+            bitmaps = {tuple(key): data[str(k)] for k, key in enumerate(manifest['bitmaps'])}
+
+        return cls(authorship, bitmaps)
+
+
+def parse_conditions(conditions):
+    # ['year=2018', 'gender=female', 'gender=male'] -> {'year': [2018], 'gender': ['female', 'male']}
+    parsed = {}
+    for condition in conditions:
+        attribute, sep, value = condition.partition('=')
+        if not sep:
+            raise ValueError(f"Expected attribute=value, got {condition}")
+        parsed.setdefault(attribute, []).append(int(value) if attribute == 'year' else value)
+    return parsed
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+
+    try:
+        conditions = parse_conditions(arguments.conditions)
+        if arguments.store:
+            start = time.perf_counter()
+            with TripleStore(arguments.store) as store:
+                index = BitmapIndex.from_store(store, arguments.current_year)
+            index.save(arguments.index, arguments.current_year)
+            print(f"Indexed {len(index.bitmaps)} attribute values in {arguments.index} "
+                  f"({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+        else:
+            index = BitmapIndex.load(arguments.index)
+
+        if conditions:
+            start = time.perf_counter()
+            articles, authors = index.match(conditions)
+            print(f"{count(articles)} articles, {count(authors)} authors "
+                  f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+
+DEFAULT_CACHE_SIZE = 1024  # MiB
+# Temporary files older than this were left by a killed writer
+STALE_TEMPORARY_AGE = 24 * 3600  # seconds
+
+# IRIs and string literals are kept verbatim; comments are dropped. The "#" in
+# IRIs such as <http://wikiba.se/ontology#> must not be taken for a comment.
+_QUERY_TOKENS = re.compile(r'(<[^<>"{}|^`\\\s]*>|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')|#[^\n]*')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'divinwd')
+
+
+def normalize_query(query):
+    # Editing comments or indentation must not invalidate a cached result. Whitespace is
+    # collapsed between the tokens only: "New  York" and "New York" are different queries.
+    pieces = _QUERY_TOKENS.split(query)
+    text = [pieces[0]]
+    for token, rest in zip(pieces[1::2], pieces[2::2]):
+        if token is None:
+            text[-1] += ' ' + rest
+        else:
+            text += [token, rest]
+    text[::2] = [_WHITESPACE.sub(' ', piece) for piece in text[::2]]
+
+    return ''.join(text).strip()
+
+
+def file_fingerprint(path, cache_dir=None):
+    # Hashing the multi-GB dump takes a while, so checksums are remembered per
+    # (path, size, mtime) in the cache directory.
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stamp = f'{path}:{st.st_size}:{st.st_mtime_ns}'
+
+    known = {}
+    known_path = os.path.join(cache_dir, 'fingerprints.json') if cache_dir else None
+    if known_path:
+        # An unreadable file only means the checksum is computed again
+        try:
+            with open(known_path) as f:
+                known = json.load(f)
+        except (OSError, ValueError):
+            known = {}
+        if not isinstance(known, dict):
+            known = {}
+    if stamp in known:
+        return known[stamp]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    fingerprint = digest.hexdigest()
+
+    if known_path:
+        known[stamp] = fingerprint
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written to a temporary file first, as cached results are: scripts running at
+        # the same time or a killed run never leave a truncated file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(known, f, indent=2)
+        os.replace(tmp_path, known_path)
+
+    return fingerprint
+
+
+class PendingEntry:
+
+    def __init__(self, file):
+        self.file = file
+        self.complete = False
+
+
+class ResultCache:
+    # Query results stored as one file per key. A hit refreshes the file's mtime,
+    # so evicting the oldest mtimes first gives least-recently-used eviction.
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_SIZE << 20):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(url, query, fingerprint):
+        text = '\0'.join([url.rstrip('/'), fingerprint, normalize_query(query)])
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.csv')
+
+    def touch(self, path):
+        # Another process may have evicted the entry since it was read, which only
+        # means it is not refreshed
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        self.touch(path)
+
+        return text
+
+    def open(self, key):
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        self.touch(path)
+
+        return f
+
+    @contextlib.contextmanager
+    def writer(self, key):
+        # Results are written to a temporary file, which replaces the entry only once
+        # the caller marks it complete: an interrupted download or run never leaves a
+        # truncated result behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        entry = PendingEntry(os.fdopen(fd, 'wb'))
+        try:
+            with entry.file:
+                yield entry
+        finally:
+            if entry.complete:
+                os.replace(tmp_path, self.path(key))
+            else:
+                os.remove(tmp_path)
+
+        if entry.complete:
+            self.evict()
+
+    def put(self, key, text):
+        with self.writer(key) as entry:
+            entry.file.write(text.encode('utf-8'))
+            entry.complete = True
+
+    def entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.csv'):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+
+        return entries
+
+    def remove_stale_temporaries(self):
+        # Temporary files of writers killed before they could remove them; those of
+        # running writers are recent
+        limit = time.time() - STALE_TEMPORARY_AGE
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.tmp'):
+                try:
+                    if entry.stat().st_mtime < limit:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        self.remove_stale_temporaries()
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        # Never evict the most recent entry, even if it is larger than the cache
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,108 @@
+import json
+import os
+
+import numpy as np
+
+from divinwd.sparql import values_table
+from divinwd.store import join_sorted, lookup_sorted, lookup_table
+
+
+# Places mapped to countries, excluded values and continents, shared by the SPARQL queries
+# (as VALUES tables) and the offline store (as lookup arrays). Edit countries.json to
+# change them everywhere.
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'countries.json'), encoding='utf-8') as f:
+    _DATA = json.load(f)
+
+WD = 'http://www.wikidata.org/entity/'
+CONTINENT = '<http://www.wikidata.org/prop/direct/P30>'
+
+EXCLUDED_COUNTRIES = [entry['id'] for entry in _DATA['excluded']]
+COUNTRY_MAPPING = {place: entry['to'] for entry in _DATA['countries'] for place in entry['from']}
+CONTINENTS = {entry['id']: entry['label'] for entry in _DATA['continents']}
+CONTINENT_OVERRIDES = {entry['country']: entry['continent'] for entry in _DATA['continent_overrides']}
+DEFAULT_CONTINENTS = {country: entry['continent']
+                      for entry in _DATA['default_continents'] for country in entry['countries']}
+
+
+def excluded_countries():
+    # For FILTER (?country NOT IN (...))
+    return ', '.join(f'wd:{q}' for q in EXCLUDED_COUNTRIES)
+
+
+def country_pattern(place, country, indent):
+    # Binds ?country to the country of ?place, or to ?place itself when it is not mapped
+    return '\n'.join([
+        f"{indent}OPTIONAL {{",
+        values_table([place, f'{country}_mapped'], COUNTRY_MAPPING.items(), indent + '    '),
+        f"{indent}}}",
+        f"{indent}BIND (COALESCE(?{country}_mapped, ?{place}) AS ?{country})",
+    ])
+
+
+def continent_pattern(country, continent, indent):
+    # Binds ?continent to the continent(s) of ?country: its continents in Wikidata, unless
+    # overridden, or a default continent for countries without any
+    inner = indent + '    '
+    return '\n'.join([
+        f"{indent}OPTIONAL {{",
+        f"{inner}?{country} wdt:P30 ?{continent}_value .",
+        values_table([f'{continent}_value'], [[q] for q in CONTINENTS], inner),
+        f"{inner}OPTIONAL {{",
+        values_table([country, f'{continent}_override'], CONTINENT_OVERRIDES.items(), inner + '    '),
+        f"{inner}}}",
+        f"{inner}BIND (COALESCE(?{continent}_override, ?{continent}_value) AS ?{continent}_direct)",
+        f"{indent}}}",
+        f"{indent}OPTIONAL {{",
+        values_table([country, f'{continent}_default'], DEFAULT_CONTINENTS.items(), inner),
+        f"{indent}}}",
+        f"{indent}BIND (COALESCE(?{continent}_direct, ?{continent}_default) AS ?{continent})",
+    ])
+
+
+class CountryLookup:
+    # The same tables over the term numbers of an offline store (see divinwd.store)
+
+    def __init__(self, store):
+        def ids(qids):
+            ids = [store.term_id(f'<{WD}{q}>') for q in qids]
+            return np.array([-1 if i is None else i for i in ids], dtype=np.int64)
+
+        def table(mapping):
+            return lookup_table(store, {f'<{WD}{k}>': f'<{WD}{v}>' for k, v in mapping.items()})
+
+        self.excluded = np.sort(ids(EXCLUDED_COUNTRIES))
+        self.places, self.countries = table(COUNTRY_MAPPING)
+        self.overridden, self.overrides = table(CONTINENT_OVERRIDES)
+        self.defaulted, self.defaults = table(DEFAULT_CONTINENTS)
+
+        s, o = store.triples(CONTINENT)
+        keep = np.isin(o, ids(CONTINENTS))
+        self.continent_countries, self.continent_values = np.asarray(s[keep]), np.asarray(o[keep])
+
+    def is_excluded(self, ids):
+        return np.isin(ids, self.excluded)
+
+    def normalize(self, ids):
+        return lookup_sorted(self.places, self.countries, ids)[0]
+
+    def continents(self, countries):
+        # (i, continents) pairs, with one row per continent of countries[i]; countries
+        # without a continent have no row
+        rows, matches = join_sorted(countries, self.continent_countries)
+        continents = self.continent_values[matches]
+
+        # An override replaces all the continents of a country, which then has one row
+        overridden, found = lookup_sorted(self.overridden, self.overrides, countries[rows])
+        continents = np.where(found, overridden, continents)
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (continents[1:] != continents[:-1]) | ~found[1:]
+        rows, continents = rows[keep], continents[keep]
+
+        # Countries without a continent in Wikidata may have a default one
+        missing = np.setdiff1d(np.arange(len(countries)), rows)
+        defaults, found = lookup_sorted(self.defaulted, self.defaults, countries[missing])
+        rows = np.concatenate([rows, missing[found]])
+        continents = np.concatenate([continents, defaults[found]])
+        order = np.argsort(rows, kind='stable')
+
+        return rows[order], continents[order]
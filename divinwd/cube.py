@@ -0,0 +1,579 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from divinwd import hll
+from divinwd.countries import CountryLookup
+from divinwd.derive import WD, WDT
+from divinwd.languages import LanguageLookup
+from divinwd.ntriples import literal_value
+from divinwd.offline import (article_authors, eligible_articles, literal_dates, publication_dates,
+                             ror_organizations, ror_values, statement_values, valid_statements)
+from divinwd.sparql import add_client_arguments
+from divinwd.store import TripleStore, join_sorted
+
+
+CUBE_VERSION = 2
+MANIFEST = 'cube.json'
+CELLS = 'cells.npz'
+DEFAULT_MAX_DIMENSIONS = 2
+
+LANGUAGE = f'<{WDT}P407>'
+GENDER = f'<{WDT}P21>'
+DISSOLVED = f'<{WDT}P576>'
+ISO_CODE = f'<{WDT}P297>'
+LABEL = '<http://www.w3.org/2000/01/rdf-schema#label>'
+EXTERNAL_LANGUAGE = '<https://divinwd.dev/oacr/lang>'
+FIELDS_OF_STUDY = ['<https://divinwd.dev/semanticscholar/fos/value>',
+                   '<https://divinwd.dev/semanticscholar/fos/prediction>']
+GENDERIZE_GENDER = '<https://divinwd.dev/genderize/gender>'
+GENDERIZE_NATIONALITY = '<https://divinwd.dev/genderize/nationality>'
+GENDERS = {f'<{WD}Q113124952>': 'unknown', f'<{WD}Q6581072>': 'female', f'<{WD}Q6581097>': 'male'}
+
+# Dimensions of articles, and of authors in a year. Each cell counts the distinct articles
+# and the distinct authors of the facts (article, author) having its values.
+ARTICLE_DIMENSIONS = ['language', 'language_source', 'field_of_study']
+AUTHOR_DIMENSIONS = ['gender', 'gender_source', 'nationality_sources', 'continents', 'ror_type']
+DIMENSIONS = ['year'] + ARTICLE_DIMENSIONS + AUTHOR_DIMENSIONS
+MEASURES = {'articles': 'article_count', 'authors': 'author_count'}
+# Authors counted by affiliation-continents-heatmap.py once over these years, not per
+# year: its result is kept as it is, next to the cells
+HEATMAP_YEARS = (2010, 2024)
+CONTINENT_PAIRS = 'continent_pairs'
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Count the distinct articles and authors of the dataset per year and combination of '
+                    'diversity dimensions, from the offline store (see database/README.md), so that the '
+                    'scripts in queries/ can render their figures with --cube')
+    parser.add_argument('--store', required=True, help='directory of the store built by `python -m divinwd.store`')
+    parser.add_argument('--output', required=True, help='directory of the cube (e.g. divinwd-cube)')
+    parser.add_argument('--current-year', type=int, default=datetime.date.today().year,
+                        help='publication dates after this year are ignored, as YEAR(NOW()) does in the queries '
+                             '(default: this year)')
+    parser.add_argument('--max-dimensions', type=int, default=DEFAULT_MAX_DIMENSIONS,
+                        help='counts are kept per year and combination of up to this number of other dimensions '
+                             f'(default: {DEFAULT_MAX_DIMENSIONS})')
+    parser.add_argument('--approx', action='store_true',
+                        help='keep HyperLogLog sketches of the articles and authors of each cell instead of their '
+                             'counts: slices may then add up any years and values, with approximate counts')
+    parser.add_argument('--precision', type=int, default=hll.DEFAULT_PRECISION,
+                        help='sketches of --approx have 2**PRECISION registers, for a relative standard error of '
+                             f'1.04/sqrt(2**PRECISION) (default: {hll.DEFAULT_PRECISION}, '
+                             f'{100 * hll.relative_error(hll.DEFAULT_PRECISION):.1f}%%)')
+
+    return parser
+
+
+def term_labels(store, ids):
+    # Terms as the endpoint writes them in CSV results: IRIs without brackets, literals
+    # without quotes, datatype or language
+    unique, inverse = np.unique(ids, return_inverse=True)
+    labels = np.empty(len(unique), dtype=object)
+    for k, i in enumerate(unique):
+        term = store.term(i)
+        labels[k] = term[1:-1] if term.startswith('<') else literal_value(term) if term.startswith('"') else term
+
+    return labels[inverse]
+
+
+def is_blank(store, ids):
+    unique, inverse = np.unique(ids, return_inverse=True)
+    return np.array([store.term(i).startswith('_:') for i in unique], dtype=bool)[inverse]
+
+
+def article_languages(store, articles):
+    # (article, language, language_source) rows, as language.py classifies articles: their
+    # single language in Wikidata, else their languages in the external sources
+    lookup = LanguageLookup(store)
+
+    s, o = store.triples(LANGUAGE)
+    rows, matches = join_sorted(articles, s)
+    df = pd.DataFrame({'i': rows, 'language': lookup.normalize(np.asarray(o)[matches], 'wikidata')})
+    df = df.drop_duplicates()
+    counts = df.groupby('i')['language'].agg(['first', 'size'])
+    single = counts[counts['size'] == 1]
+    wikidata = np.full(len(articles), lookup.undetermined, dtype=np.int64)
+    wikidata[single.index.to_numpy()] = single['first'].to_numpy()
+
+    determined = wikidata != lookup.undetermined
+    undetermined = articles[~determined]
+    s, o = store.triples(EXTERNAL_LANGUAGE)
+    rows, matches = join_sorted(undetermined, s)
+    missing = np.setdiff1d(undetermined, undetermined[rows])
+
+    article = np.concatenate([articles[determined], undetermined[rows], missing])
+    language = np.concatenate([wikidata[determined], lookup.normalize(np.asarray(o)[matches], 'external'),
+                               np.full(len(missing), lookup.undetermined)])
+    source = np.repeat(['wikidata', 'external', 'unknown'], [determined.sum(), len(rows), len(missing)])
+    category = np.where(language == lookup.undetermined, 'unknown',
+                        np.where(language == lookup.english, 'English', 'non-English'))
+
+    df = pd.DataFrame({'article': article, 'language': category, 'language_source': source})
+    return df.drop_duplicates()
+
+
+def article_fields(store, articles):
+    # (article, field_of_study) rows: the labels and predicted fields of Semantic Scholar,
+    # or unknown
+    frames = []
+    for predicate in FIELDS_OF_STUDY:
+        s, o = store.triples(predicate)
+        rows, matches = join_sorted(articles, s)
+        frames.append(pd.DataFrame({'article': articles[rows],
+                                    'field_of_study': term_labels(store, np.asarray(o)[matches])}))
+    df = pd.concat(frames)
+    missing = np.setdiff1d(articles, df['article'].to_numpy())
+    frames.append(pd.DataFrame({'article': missing, 'field_of_study': 'unknown'}))
+
+    return pd.concat(frames).drop_duplicates()
+
+
+def author_genders(store, authors):
+    # (author, gender, gender_source) rows, as gender.py classifies authors: their single
+    # gender category in Wikidata, unless unknown, else their gender in Genderize
+    s, o = store.triples(GENDER)
+    rows, matches = join_sorted(authors, s)
+    values = np.asarray(o)[matches]
+    unique, inverse = np.unique(values, return_inverse=True)
+    blank = is_blank(store, unique)
+    categories = np.array([
+        'unknown' if blank[k] else GENDERS.get(store.term(i), 'other') for k, i in enumerate(unique)
+    ], dtype=object)[inverse]
+
+    df = pd.DataFrame({'i': rows, 'gender': categories}).drop_duplicates()
+    counts = df.groupby('i')['gender'].agg(['first', 'size'])
+    wikidata = np.full(len(authors), 'unknown', dtype=object)
+    wikidata[counts.index.to_numpy()] = np.where(counts['size'] == 1, counts['first'], 'other')
+
+    known = wikidata != 'unknown'
+    unknown = authors[~known]
+    s, o = store.triples(GENDERIZE_GENDER)
+    rows, matches = join_sorted(unknown, s)
+    missing = np.setdiff1d(unknown, unknown[rows])
+
+    return pd.DataFrame({
+        'author': np.concatenate([authors[known], unknown[rows], missing]),
+        'gender': np.concatenate([wikidata[known], term_labels(store, np.asarray(o)[matches]),
+                                  np.full(len(missing), 'unknown', dtype=object)]),
+        'gender_source': np.repeat(['wikidata', 'genderize.io', 'unknown'], [known.sum(), len(rows), len(missing)]),
+    }).drop_duplicates()
+
+
+def existing_countries(store, countries, dates):
+    # Whether each country exists at the date: it has no dissolution date (P576), or one
+    # after the date. The queries also compare inception dates, of wdt:571, which the
+    # dataset does not have (it has P571): no country is left out for its inception.
+    s, o = store.triples(DISSOLVED)
+    rows, matches = join_sorted(countries, s)
+    ends = literal_dates(store, np.asarray(o)[matches])
+    valid = np.ones(len(countries), dtype=bool)
+    valid[rows] = False
+    valid[rows[dates[rows] < ends]] = True
+
+    return valid
+
+
+def english_labels(store, ids):
+    # (i, labels) with one row per English label of ids[i]
+    s, o = store.triples(LABEL)
+    rows, matches = join_sorted(ids, s)
+    terms = np.asarray(o)[matches]
+    unique, inverse = np.unique(terms, return_inverse=True)
+    english = np.array([store.term(i).endswith('"@en') for i in unique], dtype=bool)[inverse]
+
+    return rows[english], term_labels(store, terms[english])
+
+
+def author_continents(store, articles, dates):
+    # (article, author, nationality_source, continent) rows, as nationality.py finds the
+    # continents of the citizenships of the authors at the publication date of each article
+    lookup = CountryLookup(store)
+    article, author = article_authors(store, articles)
+    date = dates[np.searchsorted(articles, article)]
+
+    # Citizenships in Wikidata, or else the nationalities of Genderize, given as ISO codes
+    a, au, statements = valid_statements(store, 'P27', articles, dates)
+    rows, countries = statement_values(store, 'P27', statements)
+    a, au = a[rows], au[rows]
+    keep = (~is_blank(store, countries) & ~lookup.is_excluded(countries)
+            & existing_countries(store, countries, dates[np.searchsorted(articles, a)]))
+    wikidata = pd.DataFrame({'article': a[keep], 'author': au[keep], 'country': countries[keep],
+                             'nationality_source': 'wikidata'})
+
+    s, o = store.triples(GENDERIZE_NATIONALITY)
+    rows, matches = join_sorted(author, s)
+    coded, codes = store.triples(ISO_CODE)
+    order = np.argsort(codes, kind='stable')
+    i, j = join_sorted(np.asarray(o)[matches], np.asarray(codes)[order])
+    rows, countries = rows[i], np.asarray(coded)[order][j]
+    keep = existing_countries(store, countries, date[rows])
+    genderize = pd.DataFrame({'article': article[rows][keep], 'author': author[rows][keep],
+                              'country': countries[keep], 'nationality_source': 'genderize'})
+
+    df = pd.concat([wikidata, genderize]).drop_duplicates()
+    df = df[df['nationality_source'] == df.groupby(['article', 'author'])['nationality_source'].transform('first')]
+    pairs = pd.DataFrame({'article': article, 'author': author})
+    pairs = pairs.merge(df[['article', 'author']].drop_duplicates(), how='left', indicator=True)
+    missing = pairs[pairs['_merge'] == 'left_only'].drop(columns='_merge')
+    df = pd.concat([df, missing.assign(country=np.int64(-1), nationality_source='unknown')], ignore_index=True)
+
+    # Continents of the countries, named by their English labels
+    rows, continents = lookup.continents(lookup.normalize(df['country'].to_numpy()))
+    unique, inverse = np.unique(continents, return_inverse=True)
+    i, labels = english_labels(store, unique)
+    k, matches = join_sorted(inverse, i)
+    df = df.drop(columns='country')
+    named = df.iloc[rows[k]].assign(continent=labels[matches])
+    unnamed = df.iloc[np.setdiff1d(np.arange(len(df)), rows[k])].assign(continent='Unknown')
+
+    return pd.concat([named, unnamed]).drop_duplicates()
+
+
+def author_ror_types(store, articles, dates):
+    # (article, author, ror_type) rows, as affiliation.py finds the types of the ROR
+    # organizations employing the authors at the publication date of each article
+    a, au, statements = valid_statements(store, 'P108', articles, dates, require_qualifier=True)
+    rows, employers = statement_values(store, 'P108', statements)
+    organizations, ror = ror_organizations(store)
+    i, j = join_sorted(employers, organizations)
+    k, types = ror_values(store, 'type', ror[j])
+    rows = rows[i][k]
+
+    df = pd.DataFrame({'article': a[rows], 'author': au[rows], 'ror_type': term_labels(store, types)})
+    return df.drop_duplicates()
+
+
+def affiliation_continents(store, articles, dates):
+    # (article, author, affiliation_continent) rows, as affiliation-continents-heatmap.py
+    # finds the continents of the locations of the ROR organizations employing the authors
+    # at the publication date of each article
+    lookup = CountryLookup(store)
+    a, au, statements = valid_statements(store, 'P108', articles, dates, require_qualifier=True)
+    rows, employers = statement_values(store, 'P108', statements)
+    organizations, ror = ror_organizations(store)
+    i, j = join_sorted(employers, organizations)
+    k, locations = ror_values(store, 'location', ror[j])
+    rows = rows[i][k]
+
+    # Organizations in a country without a continent are left out, as "unknown"
+    k, continents = lookup.continents(locations)
+    unique, inverse = np.unique(continents, return_inverse=True)
+    i, labels = english_labels(store, unique)
+    l, matches = join_sorted(inverse, i)
+    rows = rows[k[l]]
+
+    df = pd.DataFrame({'article': a[rows], 'author': au[rows], 'affiliation_continent': labels[matches]})
+    return df.drop_duplicates()
+
+
+def label_sets(df, keys, column):
+    # The set of values of a column per group of keys, as GROUP_CONCAT(DISTINCT ...;
+    # SEPARATOR="|") writes it (in sorted order), computed as bit masks
+    codes, values = pd.factorize(df[column], sort=True)
+    masks = df[keys].assign(bit=np.left_shift(np.int64(1), codes)).drop_duplicates()
+    masks = masks.groupby(keys)['bit'].sum()
+    names = {m: '|'.join(v for k, v in enumerate(values) if m >> k & 1) for m in np.unique(masks)}
+
+    return masks.map(names).rename(column)
+
+
+def continent_pairs(continents, affiliations, articles, years):
+    # Authors per set of "citizenship>affiliation" continent pairs, the result of the query
+    # of affiliation-continents-heatmap.py: each author counts once over the years
+    first, last = HEATMAP_YEARS
+    df = continents[continents['continent'] != 'Unknown'].merge(affiliations, on=['article', 'author'])
+    year = years[np.searchsorted(articles, df['article'].to_numpy())]
+    df = df[(first <= year) & (year <= last)]
+    if df.empty:
+        return pd.DataFrame({'pairs': pd.Series(dtype=str), 'count': pd.Series(dtype=np.int64)})
+
+    df = df.assign(pair=df['continent'] + '>' + df['affiliation_continent'])
+    pairs = label_sets(df, ['author'], 'pair')
+    return pairs.value_counts().rename_axis('pairs').reset_index(name='count').sort_values('pairs')
+
+
+def build_facts(store, current_year):
+    # One row per (article, author) of the dataset and combination of their values, and
+    # the authors per set of continent pairs (see continent_pairs)
+    articles, years = eligible_articles(store, current_year)
+    dates = publication_dates(store, articles)
+    article, author = article_authors(store, articles)
+    facts = pd.DataFrame({'article': article, 'author': author, 'year': years[np.searchsorted(articles, article)]})
+
+    # Citizenships and employers hold at the date of each article: nationality.py gathers
+    # them per author and year, and affiliation.py counts authors per year
+    continents = author_continents(store, articles, dates)
+    pairs = continent_pairs(continents, affiliation_continents(store, articles, dates), articles, years)
+    continents['year'] = years[np.searchsorted(articles, continents['article'])]
+    nationalities = pd.concat([label_sets(continents, ['year', 'author'], 'nationality_source'),
+                               label_sets(continents, ['year', 'author'], 'continent')], axis=1)
+    nationalities = nationalities.rename(columns={'nationality_source': 'nationality_sources',
+                                                  'continent': 'continents'}).reset_index()
+
+    ror_types = author_ror_types(store, articles, dates)
+    ror_types['year'] = years[np.searchsorted(articles, ror_types['article'])]
+    ror_types = ror_types[['year', 'author', 'ror_type']].drop_duplicates()
+
+    facts = (facts
+             .merge(article_languages(store, articles), on='article')
+             .merge(article_fields(store, articles), on='article')
+             .merge(author_genders(store, np.unique(author)), on='author')
+             .merge(nationalities, on=['year', 'author'])
+             .merge(ror_types, on=['year', 'author'], how='left')
+             .fillna({'ror_type': 'unknown'}))
+
+    return facts, pairs
+
+
+def cell_index(codes, sizes):
+    # Cell of each fact per combination of codes: returns the row of the first fact of
+    # each cell and the cells of the facts
+    key = np.zeros(len(codes[0]), dtype=np.int64)
+    for column, size in zip(codes, sizes):
+        key = key * size + column
+    _, first, cells = np.unique(key, return_index=True, return_inverse=True)
+
+    return first, cells.astype(np.int64)
+
+
+def count_distinct(cells, n_cells, ids):
+    # Distinct entities (numbered from 0) per cell. Sorting the pairs is faster than
+    # np.unique, which hashes them.
+    n = int(ids.max(initial=0)) + 1
+    pairs = np.sort(cells * n + ids)
+    distinct = np.ones(len(pairs), dtype=bool)
+    distinct[1:] = pairs[1:] != pairs[:-1]
+
+    return np.bincount(pairs[distinct] // n, minlength=n_cells)
+
+
+def write_cube(directory, facts, pairs, current_year, max_dimensions, precision=None):
+    # Counts of distinct articles and authors do not add up across cells (an author of
+    # several articles, or with several values of a dimension, is in several of them), so
+    # the counts of every combination of dimensions with the year are kept: a slice reads
+    # its counts directly. Cells without facts are left out. With a precision, cells keep
+    # HyperLogLog sketches of their articles and authors instead, which do merge.
+    os.makedirs(directory, exist_ok=True)
+    labels, codes = {}, {}
+    for dimension in DIMENSIONS:
+        codes[dimension], values = pd.factorize(facts[dimension], sort=True)
+        labels[dimension] = values.tolist()
+    entities = {'articles': np.unique(facts['article'].to_numpy(), return_inverse=True)[1],
+                'authors': np.unique(facts['author'].to_numpy(), return_inverse=True)[1]}
+    if precision is not None:
+        registers = {measure: hll.registers(ids, precision) for measure, ids in entities.items()}
+
+    cells = {}
+    cuboids = []
+    others = DIMENSIONS[1:]
+    for n in range(min(max_dimensions, len(others)) + 1):
+        for combination in itertools.combinations(others, n):
+            dimensions = ['year', *combination]
+            name = '+'.join(dimensions)
+            first, index = cell_index([codes[d] for d in dimensions], [len(labels[d]) for d in dimensions])
+            for measure, ids in entities.items():
+                if precision is None:
+                    cells[f'{name}.{measure}'] = count_distinct(index, len(first), ids)
+                else:
+                    # Entries are sorted by cell: their number per cell is enough
+                    cell, register, rank = hll.compact(index, *registers[measure], precision)
+                    cells[f'{name}.{measure}.entries'] = np.bincount(cell, minlength=len(first))
+                    cells[f'{name}.{measure}.register'] = register
+                    cells[f'{name}.{measure}.rank'] = rank
+            for d in dimensions:
+                cells[f'{name}.{d}'] = codes[d][first]
+            cuboids.append(dimensions)
+    cells[f'{CONTINENT_PAIRS}.pairs'] = pairs['pairs'].to_numpy(dtype=str)
+    cells[f'{CONTINENT_PAIRS}.count'] = pairs['count'].to_numpy(dtype=np.int64)
+    # Compressing the registers would take longer than sketching them
+    (np.savez_compressed if precision is None else np.savez)(os.path.join(directory, CELLS), **cells)
+
+    manifest = {
+        'version': CUBE_VERSION,
+        'current_year': current_year,
+        'facts': len(facts),
+        'articles': int(entities['articles'].max(initial=-1)) + 1,
+        'authors': int(entities['authors'].max(initial=-1)) + 1,
+        'dimensions': labels,
+        'cuboids': cuboids,
+        'precision': precision,
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    return manifest
+
+
+class DiversityCube:
+    def __init__(self, directory):
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No cube in {directory}; build it with `python -m divinwd.cube`") from None
+        if self.manifest.get('version') != CUBE_VERSION:
+            raise ValueError(f"The cube in {directory} was built by another version; build it again")
+
+        self.labels = {d: np.array(values) for d, values in self.manifest['dimensions'].items()}
+        self.cuboids = {frozenset(dimensions): '+'.join(dimensions) for dimensions in self.manifest['cuboids']}
+        self.cells = np.load(os.path.join(directory, CELLS))
+        self.precision = self.manifest.get('precision')
+        # Whether a slice read sketches rather than exact counts
+        self.estimated = False
+
+    @property
+    def approximate(self):
+        return self.precision is not None
+
+    @property
+    def error(self):
+        # Relative standard error of the counts
+        return hll.relative_error(self.precision) if self.approximate else 0.0
+
+    def slice(self, measure, by, where=None):
+        # Number of distinct articles or authors ('articles' or 'authors') per combination
+        # of the dimensions by, among the facts matching where ({dimension: value or values}).
+        # Rows are sorted by the dimensions, as the ORDER BY of the queries.
+        where = where or {}
+        if measure not in MEASURES:
+            raise ValueError(f"Unknown measure {measure}; expected one of {', '.join(MEASURES)}")
+        unknown = (set(by) | set(where)) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown dimensions: {', '.join(sorted(unknown))}")
+
+        where = {d: list(v) if isinstance(v, (list, tuple, set, range)) else [v] for d, v in where.items()}
+        if self.approximate:
+            self.estimated = True
+            return self.approximate_slice(measure, by, where)
+
+        # Counts add up over the years for articles only, which have a single year; other
+        # dimensions must be given or restricted to a single value
+        summed = [d for d, values in where.items() if d not in by and len(values) > 1]
+        if 'year' not in by and measure == 'articles':
+            summed = [d for d in summed if d != 'year']
+        elif 'year' not in by and 'year' not in where:
+            summed.append('year')
+        if summed:
+            raise ValueError(f"The {measure} of several values of {', '.join(summed)} cannot be added up; "
+                             "add them to the dimensions of the slice")
+
+        dimensions = {'year', *by, *where}
+        name = self.cuboids.get(frozenset(dimensions))
+        if name is None:
+            raise ValueError(f"The cube has no counts per {', '.join(sorted(dimensions))}; "
+                             "build it with a larger --max-dimensions")
+
+        df = pd.DataFrame({d: self.labels[d][self.cells[f'{name}.{d}']] for d in name.split('+')})
+        df[MEASURES[measure]] = self.cells[f'{name}.{measure}']
+        for d, values in where.items():
+            df = df[df[d].isin(values)]
+
+        return df.groupby(list(by), as_index=False)[MEASURES[measure]].sum()
+
+    def approximate_slice(self, measure, by, where):
+        # Sketches merge over any years and values: the smallest table having the
+        # dimensions is merged into the groups of the slice
+        dimensions = {*by, *where}
+        names = [name for key, name in self.cuboids.items() if dimensions <= key]
+        if not names:
+            raise ValueError(f"The cube has no sketches per {', '.join(sorted(dimensions))}; "
+                             "build it with a larger --max-dimensions")
+        name = min(names, key=lambda name: name.count('+'))
+
+        df = pd.DataFrame({d: self.labels[d][self.cells[f'{name}.{d}']] for d in name.split('+')})
+        selected = np.ones(len(df), dtype=bool)
+        for d, values in where.items():
+            selected &= df[d].isin(values).to_numpy()
+        groups = np.full(len(df), -1, dtype=np.int64)
+        df = df[selected]
+        groups[selected] = df.groupby(list(by), sort=True).ngroup().to_numpy()
+        n_groups = int(groups.max(initial=-1)) + 1
+
+        entries = self.cells[f'{name}.{measure}.entries']
+        cell = np.repeat(np.arange(len(entries)), entries)
+        keep = groups[cell] >= 0
+        sketches = hll.sketch(groups[cell[keep]], self.cells[f'{name}.{measure}.register'][keep],
+                              self.cells[f'{name}.{measure}.rank'][keep], n_groups, self.precision)
+
+        df = df.groupby(list(by), as_index=False, sort=True).size().drop(columns='size')
+        df[MEASURES[measure]] = np.rint(hll.estimate(sketches)).astype(np.int64)
+        return df
+
+    def continent_pairs(self):
+        # Number of authors per set of "citizenship>affiliation" continent pairs, over the
+        # years of the heatmap: exact, in approximate cubes too
+        return pd.DataFrame({'pairs': self.cells[f'{CONTINENT_PAIRS}.pairs'],
+                             'count': self.cells[f'{CONTINENT_PAIRS}.count']})
+
+    def close(self):
+        self.cells.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def add_source_arguments(parser):
+    # The scripts in queries/ query the endpoint (--url), or read their counts from a cube
+    add_client_arguments(parser, required=False)
+    parser.add_argument('--cube',
+                        help='render the figure from the cube built by `python -m divinwd.cube` in this directory, '
+                             'instead of querying the endpoint')
+
+
+def parse_source_arguments(parser):
+    arguments = parser.parse_args()
+    if not arguments.url and not arguments.cube:
+        parser.error('one of the arguments --url --cube is required')
+
+    return arguments
+
+
+def counts_or_exit(directory, counts):
+    # counts(cube) reads the result of a query from the cube in a directory, e.g. the
+    # cube_counts function of a script in queries/
+    try:
+        with DiversityCube(directory) as cube:
+            df = counts(cube)
+            if cube.estimated:
+                print(f"Approximate counts: relative standard error of {cube.error:.1%} (about 95% of the counts "
+                      f"within {2 * cube.error:.1%})", file=sys.stderr)
+            return df
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    parser = get_arg_parser()
+    arguments = parser.parse_args()
+    if not 4 <= arguments.precision <= 16:
+        parser.error('--precision must be between 4 and 16')
+
+    start = time.perf_counter()
+    with TripleStore(arguments.store) as store:
+        facts, pairs = build_facts(store, arguments.current_year)
+    print(f"Classified {len(facts):,} facts ({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+    start = time.perf_counter()
+    precision = arguments.precision if arguments.approx else None
+    manifest = write_cube(arguments.output, facts, pairs, arguments.current_year, arguments.max_dimensions, precision)
+    print(f"{'Sketched' if arguments.approx else 'Counted'} {manifest['articles']:,} articles and "
+          f"{manifest['authors']:,} authors per combination of up to {arguments.max_dimensions} dimensions with "
+          f"the year, in {len(manifest['cuboids'])} tables of {arguments.output} "
+          f"({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
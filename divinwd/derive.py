@@ -0,0 +1,156 @@
+import argparse
+import datetime
+import gzip
+import sys
+
+from divinwd.ntriples import date_year, read_triples
+
+
+WDT = 'http://www.wikidata.org/prop/direct/'
+WD = 'http://www.wikidata.org/entity/'
+DERIVED = 'https://divinwd.dev/derived/'
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+INSTANCE_OF = f'<{WDT}P31>'
+PUBLICATION_DATE = f'<{WDT}P577>'
+AUTHOR = f'<{WDT}P50>'
+AUTHOR_NAME_STRING = f'<{WDT}P2093>'
+ROR_ID = f'<{WDT}P6782>'
+ROR_ORGANIZATION_ID = '<https://divinwd.dev/ror/id>'
+SCHOLARLY_ARTICLE = f'<{WD}Q13442814>'
+HUMAN = f'<{WD}Q5>'
+
+ELIGIBLE_DATE = f'<{DERIVED}eligibleDate>'
+ELIGIBLE_YEAR = f'<{DERIVED}eligibleYear>'
+ROR_ORGANIZATION = f'<{DERIVED}rorOrganization>'
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Compute the articles and organizations selected by every query once, and write them '
+                    'as derived triples to be indexed alongside the dataset')
+    parser.add_argument('input', nargs='+', help='N-Triples dump(s), possibly gzipped (e.g. divinwd.nt.gz)')
+    parser.add_argument('--output', required=True, help='gzipped N-Triples file to write (e.g. divinwd-derived.nt.gz)')
+    parser.add_argument('--current-year', type=int, default=datetime.date.today().year,
+                        help='publication dates after this year are ignored, as YEAR(NOW()) does in the queries '
+                             '(default: this year)')
+
+    return parser
+
+
+def find_eligible_articles(triples, current_year):
+    # The same selection as the article subquery of the scripts in queries/:
+    #   ?article wdt:P31 wd:Q13442814 ; wdt:P577 ?date ; wdt:P50 [ wdt:P31 wd:Q5 ] .
+    #   FILTER (YEAR(?date) <= YEAR(NOW()))
+    #   MINUS { ?article wdt:P2093 ?name . }
+    #   MINUS { ?article wdt:P50 ?x . FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . } }
+    #   GROUP BY ?article HAVING (COUNT(DISTINCT YEAR(?date)) = 1)
+    # Returns {article: (MIN(?date) as written in the dump, its year)}.
+    scholarly = set()
+    humans = set()
+    with_name_strings = set()
+    authors = {}
+    dates = {}
+
+    for s, p, o in triples:
+        if p == INSTANCE_OF:
+            if o == SCHOLARLY_ARTICLE:
+                scholarly.add(s)
+            elif o == HUMAN:
+                humans.add(s)
+        elif p == AUTHOR:
+            authors.setdefault(s, []).append(o)
+        elif p == AUTHOR_NAME_STRING:
+            with_name_strings.add(s)
+        elif p == PUBLICATION_DATE:
+            try:
+                year = date_year(o)
+            except ValueError:
+                continue
+            if year > current_year:
+                continue
+
+            # Keep the earliest date, and whether the dates span several years
+            known = dates.get(s)
+            if known is None:
+                dates[s] = (year, o, year, False)
+            else:
+                min_year, min_date, first_year, several = known
+                if (year, o) < (min_year, min_date):
+                    min_year, min_date = year, o
+                dates[s] = (min_year, min_date, first_year, several or year != first_year)
+
+    eligible = {}
+    for article, (year, date, _, several) in dates.items():
+        if several or article not in scholarly or article in with_name_strings:
+            continue
+        article_authors = authors.get(article)
+        if not article_authors or not all(author in humans for author in article_authors):
+            continue
+        eligible[article] = (date, year)
+
+    return eligible
+
+
+def find_ror_organizations(triples):
+    # The organizations kept by affiliation.py and the heatmap, with their ROR organization:
+    #   { SELECT (SAMPLE(?organization) AS ?org) ?rorid WHERE {
+    #       SELECT ?organization (SAMPLE(?roridValue) AS ?rorid) WHERE { ?organization wdt:P6782 ?roridValue . }
+    #       GROUP BY ?organization HAVING (COUNT(DISTINCT ?roridValue) = 1) }
+    #     GROUP BY ?rorid HAVING (COUNT(DISTINCT ?organization) = 1) }
+    #   ?org wdt:P6782 ?rorid . ?rorOrganization ror:id ?rorid .
+    # Organizations with several ROR ids do not count against the other holders of an id.
+    # Returns {organization: [ROR organizations]}.
+    ror_ids = {}
+    ror_organizations = {}
+    for s, p, o in triples:
+        if p == ROR_ID:
+            ror_ids.setdefault(s, set()).add(o)
+        elif p == ROR_ORGANIZATION_ID:
+            ror_organizations.setdefault(o, []).append(s)
+
+    holders = {}
+    for organization, ids in ror_ids.items():
+        if len(ids) == 1:
+            holders.setdefault(next(iter(ids)), []).append(organization)
+
+    return {organizations[0]: ror_organizations[ror_id]
+            for ror_id, organizations in holders.items()
+            if len(organizations) == 1 and ror_id in ror_organizations}
+
+
+def write_derived_triples(path, eligible, organizations):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for article, (date, year) in eligible.items():
+            f.write(f'{article} {ELIGIBLE_DATE} {date} .\n')
+            f.write(f'{article} {ELIGIBLE_YEAR} "{year}"^^<{XSD}int> .\n')
+        for organization, ror_organizations in organizations.items():
+            for ror_organization in ror_organizations:
+                f.write(f'{organization} {ROR_ORGANIZATION} {ror_organization} .\n')
+
+
+def collect(triples, predicates, into):
+    # Pass the triples through, keeping those of the given predicates in `into`, so that the
+    # few triples about ROR ids can be examined after the single pass over the dump
+    for triple in triples:
+        if triple[1] in predicates:
+            into.append(triple)
+        yield triple
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+
+    print("Reading the dataset...", file=sys.stderr)
+    ror_triples = []
+    triples = collect(read_triples(arguments.input), (ROR_ID, ROR_ORGANIZATION_ID), ror_triples)
+    eligible = find_eligible_articles(triples, arguments.current_year)
+    organizations = find_ror_organizations(ror_triples)
+
+    write_derived_triples(arguments.output, eligible, organizations)
+    print(f"Wrote {len(eligible):,} eligible articles and {len(organizations):,} organizations "
+          f"to {arguments.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
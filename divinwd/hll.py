@@ -0,0 +1,76 @@
+import numpy as np
+
+
+# HyperLogLog sketches of sets of integer ids: 2**precision registers of one byte, each
+# keeping the largest rank seen among the ids hashed to it. The sketch of a union is the
+# maximum of the sketches, so sketches of groups can be merged into any coarser group.
+DEFAULT_PRECISION = 12
+HASH_BITS = 64
+
+
+def relative_error(precision):
+    # Relative standard error of the estimates
+    return 1.04 / np.sqrt(2 ** precision)
+
+
+def hash_ids(ids):
+    # 64-bit mix of ids (the finalizer of SplitMix64); products wrap around
+    x = np.asarray(ids).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def bit_length(x):
+    # Number of bits of uint64 values, exact: each half fits in the mantissa of a float
+    high = (x >> np.uint64(32)).astype(np.float64)
+    low = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def registers(ids, precision=DEFAULT_PRECISION):
+    # Register of each id and its rank: the position of the first set bit of the rest of
+    # its hash, 1 for a leading one
+    h = hash_ids(ids)
+    rest = HASH_BITS - precision
+    register = (h >> np.uint64(rest)).astype(np.int64)
+    rank = rest - bit_length(h & np.uint64((1 << rest) - 1)) + 1
+
+    return register, rank.astype(np.uint8)
+
+
+def compact(groups, register, rank, precision=DEFAULT_PRECISION):
+    # Sketches of the ids of each group, as the (group, register, rank) of their nonzero
+    # registers: far smaller than 2**precision bytes per group for small groups
+    key = np.asarray(groups, dtype=np.int64) * 2 ** precision + register
+    entries = np.sort(key * 64 + rank)
+    last = np.ones(len(entries), dtype=bool)
+    last[:-1] = entries[1:] // 64 != entries[:-1] // 64
+    entries = entries[last]
+    key = entries // 64
+
+    return key >> precision, (key & (2 ** precision - 1)).astype(np.uint16), (entries % 64).astype(np.uint8)
+
+
+def sketch(groups, register, rank, n_groups, precision=DEFAULT_PRECISION):
+    # Sketches (one row per group) of the registers and ranks of each group, of ids or of
+    # compact sketches: merging sketches takes the maximum of their registers
+    m = 2 ** precision
+    sketches = np.zeros((n_groups, m), dtype=np.uint8)
+    np.maximum.at(sketches.reshape(-1), np.asarray(groups, dtype=np.int64) * m + register, rank)
+
+    return sketches
+
+
+def estimate(sketches):
+    # Estimated number of distinct ids of each sketch; small sets, which leave registers
+    # empty, are counted from the number of empty registers
+    sketches = np.atleast_2d(sketches)
+    m = sketches.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-sketches.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(sketches == 0, axis=1)
+    with np.errstate(divide='ignore'):
+        small = m * np.log(m / zeros)
+
+    return np.where((raw <= 2.5 * m) & (zeros > 0), small, raw)
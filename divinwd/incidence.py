@@ -0,0 +1,134 @@
+import argparse
+import datetime
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+from divinwd.offline import article_authors, eligible_articles
+from divinwd.store import TripleStore
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Count the distinct articles and authors of the dataset per year from the offline store '
+                    '(see database/README.md), with a sparse matrix of the authors of each article, and print '
+                    'them as CSV')
+    parser.add_argument('--store', required=True, help='directory of the store built by `python -m divinwd.store`')
+    parser.add_argument('--current-year', type=int, default=datetime.date.today().year,
+                        help='publication dates after this year are ignored, as YEAR(NOW()) does in the queries '
+                             '(default: this year)')
+
+    return parser
+
+
+class AuthorshipMatrix:
+    # The authors (wdt:P50) of the articles of the dataset, as a sparse matrix with one row
+    # per article and one column per author. Rows are ordered by year, then article: the
+    # articles of a year are a range of rows. Distinct authors of a set of articles are the
+    # nonzero entries of the product of the transposed matrix with the indicator vector of
+    # the articles, so COUNT(DISTINCT ?author) needs neither a join nor a sort.
+
+    def __init__(self, articles, years, article, author):
+        # articles (sorted) and their years, and (article, author) pairs of these articles,
+        # faster to look up in the order of the store (sorted by article)
+        order = np.lexsort((articles, years))
+        self.articles, self.years = articles[order], years[order]
+        self.authors, columns = np.unique(author, return_inverse=True)
+        position = np.empty(len(articles), dtype=np.int64)
+        position[order] = np.arange(len(articles))
+        rows = position[np.searchsorted(articles, article)]
+
+        # Sorting the pairs gives the rows in order, each with its sorted columns once
+        n = max(len(self.authors), 1)
+        pairs = np.sort(rows * n + columns)
+        keep = np.ones(len(pairs), dtype=bool)
+        keep[1:] = pairs[1:] != pairs[:-1]
+        pairs = pairs[keep]
+        indptr = np.zeros(len(articles) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // n, minlength=len(articles)), out=indptr[1:])
+        self.matrix = scipy.sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int32), pairs % n, indptr), shape=(len(articles), len(self.authors)))
+
+        # The rows of each year, as matrices sharing the arrays of the whole one
+        self.year_values, self.year_starts = np.unique(self.years, return_index=True)
+        self.year_ends = np.append(self.year_starts[1:], len(self.years))
+        self.year_matrices = [self.year_matrix(s, e) for s, e in zip(self.year_starts, self.year_ends)]
+
+    def year_matrix(self, start, end):
+        lo, hi = self.matrix.indptr[start], self.matrix.indptr[end]
+        return scipy.sparse.csr_matrix(
+            (self.matrix.data[lo:hi], self.matrix.indices[lo:hi], self.matrix.indptr[start:end + 1] - lo),
+            shape=(end - start, self.matrix.shape[1]))
+
+    @classmethod
+    def from_store(cls, store, current_year):
+        articles, years = eligible_articles(store, current_year)
+        return cls(articles, years, *article_authors(store, articles))
+
+    def article_mask(self, ids):
+        # Indicator of the rows of the given articles
+        return np.isin(self.articles, ids)
+
+    def author_mask(self, ids):
+        # Indicator of the columns of the given authors
+        return np.isin(self.authors, ids)
+
+    def year_rows(self, year):
+        # Rows of the articles of a year, e.g. matrix[year_rows(2015)]
+        k = np.searchsorted(self.year_values, year)
+        if k == len(self.year_values) or self.year_values[k] != year:
+            return slice(0, 0)
+        return slice(self.year_starts[k], self.year_ends[k])
+
+    def distinct_authors(self, articles=None, authors=None):
+        # Number of distinct authors of the articles selected by a row indicator (all by
+        # default), among the authors selected by a column indicator
+        selected = np.ones(self.matrix.shape[0], dtype=bool) if articles is None else articles
+        counts = self.matrix.T @ selected.astype(np.int32)
+        if authors is not None:
+            counts = counts[authors]
+
+        return int(np.count_nonzero(counts))
+
+    def authors_per_year(self, articles=None, authors=None):
+        # Distinct articles and authors per year, as the queries group them, for the articles
+        # selected by a row indicator and the authors selected by a column indicator: one
+        # product per year, over the rows of that year only
+        selected = np.ones(self.matrix.shape[0], dtype=bool) if articles is None else articles
+        if authors is not None:
+            # Articles count when they have one of the authors
+            selected = selected & (self.matrix @ authors.astype(np.int32) > 0)
+        selected = selected.astype(np.int32)
+
+        article_counts, author_counts = [], []
+        for matrix, start, end in zip(self.year_matrices, self.year_starts, self.year_ends):
+            counts = matrix.T @ selected[start:end]
+            article_counts.append(int(selected[start:end].sum()))
+            author_counts.append(int(np.count_nonzero(counts if authors is None else counts[authors])))
+
+        df = pd.DataFrame({'year': self.year_values, 'article_count': article_counts, 'author_count': author_counts},
+                          columns=['year', 'article_count', 'author_count'])
+        return df[df['article_count'] > 0].reset_index(drop=True)
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+
+    start = time.perf_counter()
+    with TripleStore(arguments.store) as store:
+        authorship = AuthorshipMatrix.from_store(store, arguments.current_year)
+    print(f"Built the matrix of {authorship.matrix.shape[0]:,} articles and {authorship.matrix.shape[1]:,} "
+          f"authors ({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+    start = time.perf_counter()
+    df = authorship.authors_per_year()
+    print(f"Counted the authors per year ({time.perf_counter() - start:.2f} s)", file=sys.stderr)
+
+    df.to_csv(sys.stdout, index=False)
+
+
+if __name__ == '__main__':
+    main()
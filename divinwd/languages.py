@@ -0,0 +1,51 @@
+import json
+import os
+
+import numpy as np
+
+from divinwd.sparql import values_table
+from divinwd.store import lookup_sorted, lookup_table
+
+
+# Language variants mapped to base languages, for the languages found in Wikidata (P407)
+# and in the external sources (oacr:lang). Edit languages.json to change them everywhere.
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'languages.json'), encoding='utf-8') as f:
+    _DATA = json.load(f)
+
+WD = 'http://www.wikidata.org/entity/'
+
+UNDETERMINED = _DATA['undetermined']
+ENGLISH = _DATA['english']
+LANGUAGE_MAPPINGS = {
+    source: {variant: entry['to'] for entry in _DATA[source] for variant in entry['from']}
+    for source in ('wikidata', 'external')
+}
+
+
+def language_pattern(source, value, language, indent):
+    # Binds ?language to the base language of ?value, or to ?value itself when it is not
+    # mapped. Put it in the group that binds ?value: an unbound ?value would match every
+    # row of the table.
+    return '\n'.join([
+        f"{indent}OPTIONAL {{",
+        values_table([value, f'{language}Mapped'], LANGUAGE_MAPPINGS[source].items(), indent + '    '),
+        f"{indent}}}",
+        f"{indent}BIND (COALESCE(?{language}Mapped, ?{value}) AS ?{language})",
+    ])
+
+
+class LanguageLookup:
+    # The same tables over the term numbers of an offline store (see divinwd.store)
+
+    def __init__(self, store):
+        self.tables = {
+            source: lookup_table(store, {f'<{WD}{k}>': f'<{WD}{v}>' for k, v in mapping.items()})
+            for source, mapping in LANGUAGE_MAPPINGS.items()
+        }
+        undetermined = store.term_id(f'<{WD}{UNDETERMINED}>')
+        english = store.term_id(f'<{WD}{ENGLISH}>')
+        self.undetermined = -1 if undetermined is None else undetermined
+        self.english = -1 if english is None else english
+
+    def normalize(self, ids, source):
+        return lookup_sorted(*self.tables[source], np.asarray(ids))[0]
@@ -0,0 +1,73 @@
+import gzip
+
+
+def open_dump(path):
+    # The dump is distributed gzipped, but plain N-Triples files work as well
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def parse_line(line):
+    # Split a `<subject> <predicate> <object> .` line into its three terms, written as in
+    # the file (IRIs keep their angle brackets, literals their quotes and datatype).
+    # Literals may contain spaces, so everything after the predicate is the object.
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+
+    s, p, o = line.split(None, 2)
+    o = o[:-1].rstrip()
+
+    return s, p, o
+
+
+def read_triples(paths):
+    for path in paths:
+        with open_dump(path) as f:
+            for line in f:
+                triple = parse_line(line)
+                if triple is not None:
+                    yield triple
+
+
+def literal_value(term):
+    # Lexical form of a literal term: "2015-03-01T00:00:00Z"^^<...> -> 2015-03-01T00:00:00Z
+    return term[1:term.rindex('"')]
+
+
+def date_year(term):
+    # Year of an xsd:date or xsd:dateTime literal; years before the common era are negative
+    value = literal_value(term)
+    return int(value[:value.index('-', 1)])
+
+
+def read_chunks(paths, chunk_bytes):
+    # Decompressed contents of the dumps in blocks of about chunk_bytes, cut after a line
+    # break so that every block holds whole lines
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            rest = b''
+            while True:
+                block = f.read(chunk_bytes)
+                if not block:
+                    break
+                block = rest + block
+                end = block.rfind(b'\n') + 1
+                if end == 0:
+                    rest = block
+                    continue
+                rest = block[end:]
+                yield block[:end]
+            if rest:
+                yield rest
+
+
+def parse_chunk(data):
+    # Only \n ends a line: splitlines() would also split on characters such as U+2028,
+    # which N-Triples literals may contain unescaped
+    for line in data.decode('utf-8').split('\n'):
+        triple = parse_line(line)
+        if triple is not None:
+            yield triple
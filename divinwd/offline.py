@@ -0,0 +1,298 @@
+import argparse
+import datetime
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from divinwd.derive import (AUTHOR, AUTHOR_NAME_STRING, HUMAN, INSTANCE_OF, PUBLICATION_DATE, ROR_ID,
+                            ROR_ORGANIZATION_ID, SCHOLARLY_ARTICLE)
+from divinwd.ntriples import date_year, literal_value
+from divinwd.sparql import add_client_arguments, client_from_arguments, query_or_exit
+from divinwd.store import TripleStore, join_sorted, sort_pairs
+
+
+P = 'http://www.wikidata.org/prop/'
+ROR = 'https://divinwd.dev/ror/'
+RDF_TYPE = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>'
+BEST_RANK = '<http://wikiba.se/ontology#BestRank>'
+START_TIME = f'<{P}qualifier/P580>'
+END_TIME = f'<{P}qualifier/P582>'
+
+# A missing start or end time does not bound the interval of a statement. Qualifiers that
+# are not dates (unknown values are blank nodes) are NaT, which compares false with any
+# date, as comparing them fails in SPARQL.
+EARLIEST = np.datetime64(np.iinfo(np.int64).min + 1, 's')
+LATEST = np.datetime64(np.iinfo(np.int64).max, 's')
+
+# Articles per year, as selected by the article subquery of the scripts in queries/
+QUERY_ARTICLES_PER_YEAR = """
+PREFIX wd: <http://www.wikidata.org/entity/>
+PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+
+SELECT ?year (COUNT(?article) AS ?article_count) WHERE {
+    {
+        SELECT ?article (YEAR(MIN(?publicationDate)) AS ?year) WHERE {
+            ?article wdt:P31 wd:Q13442814 ;
+                    wdt:P577 ?publicationDate ;
+                    wdt:P50 [ wdt:P31 wd:Q5 ] .
+
+            FILTER (YEAR(?publicationDate) <= YEAR(NOW()))
+            MINUS { ?article wdt:P2093 ?authorNameString . }
+            MINUS {
+                ?article wdt:P50 ?x .
+                FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
+            }
+        }
+        GROUP BY ?article
+        HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && ?year <= YEAR(NOW()))
+    }
+}
+GROUP BY ?year
+ORDER BY ?year
+"""
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Select the articles of the dataset from the offline store (see database/README.md), '
+                    'and print their number per year as CSV')
+    parser.add_argument('--store', required=True, help='directory of the store built by `python -m divinwd.store`')
+    parser.add_argument('--current-year', type=int, default=datetime.date.today().year,
+                        help='publication dates after this year are ignored, as YEAR(NOW()) does in the queries '
+                             '(default: this year)')
+    # With --url, the numbers are checked against those computed by the endpoint
+    add_client_arguments(parser, required=False)
+
+    return parser
+
+
+def subjects_with(store, predicate, obj):
+    # Subjects of the triples (?s predicate obj), sorted; a partition is sorted by subject
+    # and holds each triple once, so the subjects of a single object are unique
+    s, o = store.triples(predicate)
+    i = store.term_id(obj)
+    if i is None:
+        return np.empty(0, dtype=np.int64)
+    return np.asarray(s[o == i])
+
+
+def literal_years(store, ids):
+    # Years of the date literals numbered ids, and whether they are dates at all. Far fewer
+    # distinct dates than triples exist, so each one is only parsed once.
+    unique, inverse = np.unique(ids, return_inverse=True)
+    years = np.zeros(len(unique), dtype=np.int64)
+    valid = np.ones(len(unique), dtype=bool)
+    for k, i in enumerate(unique):
+        try:
+            years[k] = date_year(store.term(i))
+        except ValueError:
+            valid[k] = False
+
+    return years[inverse], valid[inverse]
+
+
+def literal_dates(store, ids):
+    # Dates (datetime64[s]) of the date literals numbered ids, NaT for other terms
+    unique, inverse = np.unique(ids, return_inverse=True)
+    dates = np.full(len(unique), np.datetime64('NaT'), dtype='datetime64[s]')
+    for k, i in enumerate(unique):
+        try:
+            dates[k] = np.datetime64(literal_value(store.term(i)).rstrip('Z'))
+        except ValueError:
+            pass
+
+    return dates[inverse]
+
+
+def eligible_articles(store, current_year):
+    # The same selection as the article subquery of the scripts in queries/ (see
+    # divinwd.derive.find_eligible_articles), over whole arrays of the store.
+    # Returns (articles, years), sorted by article.
+    scholarly = subjects_with(store, INSTANCE_OF, SCHOLARLY_ARTICLE)
+    humans = subjects_with(store, INSTANCE_OF, HUMAN)
+
+    # Publication years up to the current year, once per article and year
+    s, o = store.triples(PUBLICATION_DATE)
+    keep = np.isin(s, scholarly)
+    s = np.asarray(s[keep])
+    years, valid = literal_years(store, o[keep])
+    keep = valid & (years <= current_year)
+    s, years = sort_pairs(s[keep], years[keep])
+
+    # Articles with a single year
+    articles, first, counts = np.unique(s, return_index=True, return_counts=True)
+    articles = articles[counts == 1]
+    years = years[first[counts == 1]]
+
+    # At least one author, all of them humans, and no author name strings
+    s, o = store.triples(AUTHOR)
+    human = np.isin(o, humans)
+    keep = (np.isin(articles, s[human])
+            & ~np.isin(articles, s[~human])
+            & ~np.isin(articles, store.triples(AUTHOR_NAME_STRING)[0]))
+
+    return articles[keep], years[keep]
+
+
+def publication_dates(store, articles):
+    # Earliest publication date of each article (articles sorted), as MIN(?publicationDate)
+    # in the queries; dates after the current year cannot be the earliest of an eligible
+    # article, so all of them are considered
+    s, o = store.triples(PUBLICATION_DATE)
+    keep = np.isin(s, articles)
+    s = np.asarray(s[keep])
+    dates = literal_dates(store, o[keep])
+    keep = ~np.isnat(dates)
+    s, dates = s[keep], dates[keep]
+
+    order = np.lexsort((dates, s))
+    s, dates = s[order], dates[order]
+    first = np.ones(len(s), dtype=bool)
+    first[1:] = s[1:] != s[:-1]
+
+    return dates[first][np.searchsorted(s[first], articles)]
+
+
+def article_authors(store, articles):
+    # (article, author) pairs of the given articles, sorted by article
+    s, o = store.triples(AUTHOR)
+    keep = np.isin(s, articles)
+    return np.asarray(s[keep]), np.asarray(o[keep])
+
+
+def with_qualifiers(statements, s, values, unbound):
+    # (i, value) pairs for every qualifier (s, value) of statements[i], or (i, unbound) when
+    # statements[i] has none, as OPTIONAL does; the third array tells which rows are bound
+    rows, matches = join_sorted(statements, s)
+    missing = np.setdiff1d(np.arange(len(statements)), rows)
+
+    return (np.concatenate([rows, missing]),
+            np.concatenate([values[matches], np.full(len(missing), unbound)]),
+            np.concatenate([np.ones(len(rows), dtype=bool), np.zeros(len(missing), dtype=bool)]))
+
+
+def statement_intervals(store, prop, require_qualifier=False):
+    # Best-ranked statements of a property (e.g. 'P108') with the intervals given by their
+    # start and end time qualifiers, as the pattern
+    #   ?holder p:P108 ?statement . ?statement rdf:type wikibase:BestRank .
+    #   OPTIONAL { ?statement pq:P580 ?start . } OPTIONAL { ?statement pq:P582 ?end . }
+    # yields them: one row for each combination of start and end. With require_qualifier,
+    # statements with neither qualifier are left out, as affiliation.py does.
+    # Returns (holders, statements, starts, ends), sorted by holder.
+    holders, statements = store.triples(f'<{P}{prop}>')
+    keep = np.isin(statements, subjects_with(store, RDF_TYPE, BEST_RANK))
+    holders, statements = np.asarray(holders[keep]), np.asarray(statements[keep])
+
+    s, o = store.triples(START_TIME)
+    i, starts, has_start = with_qualifiers(statements, s, literal_dates(store, o), EARLIEST)
+    s, o = store.triples(END_TIME)
+    j, ends, has_end = with_qualifiers(statements[i], s, literal_dates(store, o), LATEST)
+    holders, statements, starts, has_start = holders[i][j], statements[i][j], starts[j], has_start[j]
+
+    keep = has_start | has_end if require_qualifier else np.ones(len(j), dtype=bool)
+    order = np.argsort(holders[keep], kind='stable')
+
+    return holders[keep][order], statements[keep][order], starts[keep][order], ends[keep][order]
+
+
+def interval_join(keys, dates, interval_keys, starts, ends):
+    # Intervals [start, end) of the same key containing each date: (i, j) index pairs with
+    # keys[i] == interval_keys[j] and starts[j] <= dates[i] < ends[j]. interval_keys must be
+    # sorted; each key is matched against the few intervals of its own key only.
+    rows, matches = join_sorted(keys, interval_keys)
+    valid = (starts[matches] <= dates[rows]) & (dates[rows] < ends[matches])
+
+    return rows[valid], matches[valid]
+
+
+def valid_statements(store, prop, articles, dates, require_qualifier=False):
+    # Statements of a property about the authors of the articles that hold at the
+    # publication date of each article. Returns (articles, authors, statements) arrays with
+    # one row per distinct triple.
+    article, author = article_authors(store, articles)
+    date = dates[np.searchsorted(articles, article)]
+    holders, statements, starts, ends = statement_intervals(store, prop, require_qualifier)
+    rows, matches = interval_join(author, date, holders, starts, ends)
+
+    # A statement with several start or end times can hold through several intervals
+    df = pd.DataFrame({'article': article[rows], 'author': author[rows], 'statement': statements[matches]})
+    df = df.drop_duplicates()
+
+    return df['article'].to_numpy(), df['author'].to_numpy(), df['statement'].to_numpy()
+
+
+def statement_values(store, prop, statements):
+    # Values of statements (ps:P108 ?value ...): (i, values) with statements[i] -> values
+    s, o = store.triples(f'<{P}statement/{prop}>')
+    rows, matches = join_sorted(statements, s)
+    return rows, np.asarray(o)[matches]
+
+
+def ror_organizations(store):
+    # Organizations with a ROR id of their own, and their ROR organization (see
+    # divinwd.derive.find_ror_organizations). Returns (organizations, ROR organizations),
+    # sorted by organization.
+    s, o = store.triples(ROR_ID)
+    organizations, first, counts = np.unique(s, return_index=True, return_counts=True)
+    organizations = organizations[counts == 1]
+    ids = np.asarray(o)[first[counts == 1]]
+
+    unique, counts = np.unique(ids, return_counts=True)
+    keep = np.isin(ids, unique[counts == 1])
+    organizations, ids = organizations[keep], ids[keep]
+
+    s, o = store.triples(ROR_ORGANIZATION_ID)
+    order = np.argsort(o, kind='stable')
+    rows, matches = join_sorted(ids, np.asarray(o)[order])
+
+    return organizations[rows], np.asarray(s)[order][matches]
+
+
+def ror_values(store, attribute, organizations):
+    # Values of a ROR attribute ('type' or 'location') of ROR organizations:
+    # (i, values) with organizations[i] -> values
+    s, o = store.triples(f'<{ROR}{attribute}>')
+    rows, matches = join_sorted(organizations, s)
+    return rows, np.asarray(o)[matches]
+
+
+def count_per_year(years):
+    values, counts = np.unique(years, return_counts=True)
+    return pd.DataFrame({'year': values, 'article_count': counts})
+
+
+def check_counts(df, csv_text):
+    # Compare the offline counts with those of the endpoint; returns the differing years
+    expected = pd.read_csv(io.StringIO(csv_text))
+    merged = df.merge(expected, on='year', how='outer', suffixes=('', '_endpoint'))
+    merged = merged.fillna(0).astype({'article_count': int, 'article_count_endpoint': int})
+    return merged[merged['article_count'] != merged['article_count_endpoint']]
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+
+    start = time.perf_counter()
+    with TripleStore(arguments.store) as store:
+        _, years = eligible_articles(store, arguments.current_year)
+    df = count_per_year(years)
+    print(f"Selected {len(years):,} articles ({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+    if arguments.url:
+        with client_from_arguments(arguments) as client:
+            csv_text = query_or_exit(client, QUERY_ARTICLES_PER_YEAR)
+        differences = check_counts(df, csv_text)
+        if not differences.empty:
+            print("The endpoint selects different articles:", file=sys.stderr)
+            print(differences.to_string(index=False), file=sys.stderr)
+            sys.exit(1)
+        print("The endpoint selects the same number of articles every year", file=sys.stderr)
+
+    df.to_csv(sys.stdout, index=False)
+
+
+if __name__ == '__main__':
+    main()
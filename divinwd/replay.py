@@ -0,0 +1,293 @@
+import argparse
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from divinwd.cache import normalize_query
+from divinwd.cube import MANIFEST, DiversityCube
+from divinwd.sparql import SparqlClient, SparqlError
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8888
+QUERIES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'queries')
+# Throttled responses are sent in pieces of this duration
+SEND_INTERVAL = 0.05
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Serve query results on a local SPARQL endpoint, as QLever does for the scripts in queries/ '
+                    '(GET or POST of `query`, results in text/csv): recorded results, or results computed from a '
+                    'cube built by `python -m divinwd.cube`, with a configurable latency and throughput')
+    parser.add_argument('--recordings', help='directory of recorded results (written by --upstream)')
+    parser.add_argument('--cube', help='directory of a cube: the queries of the scripts in queries/ that can render '
+                                       'their figures with --cube are answered from it')
+    parser.add_argument('--upstream',
+                        help='SPARQL endpoint URL: queries without a result are sent to it, and its results are '
+                             'recorded in --recordings')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds to wait before answering each query (default: 0)')
+    parser.add_argument('--throughput', type=float, default=0.0,
+                        help='KiB per second at which each result is sent (default: 0, as fast as possible)')
+    parser.add_argument('--max-concurrency', type=int, default=0,
+                        help='queries answered at the same time, the others wait (default: 0, no limit)')
+
+    return parser
+
+
+class Recordings:
+    # Results stored as one CSV file per query, named after the hash of the query without
+    # its comments and indentation (as the result cache of the scripts does), with the
+    # query next to it for reference
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(query):
+        return hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()
+
+    def get(self, query):
+        try:
+            with open(os.path.join(self.directory, f'{self.key(query)}.csv'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, query, body):
+        key = self.key(query)
+        with open(os.path.join(self.directory, f'{key}.rq'), 'w', encoding='utf-8') as f:
+            f.write(query)
+
+        # Written to a temporary file first, so that a result is never read half-written
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(path, os.path.join(self.directory, f'{key}.csv'))
+
+    def __len__(self):
+        return len(glob.glob(os.path.join(self.directory, '*.csv')))
+
+
+def load_scripts(directory=QUERIES_DIRECTORY):
+    # The scripts in queries/ defining cube_counts, by query: {normalized query: script}.
+    # Both the full and the --derived query of a script give the same result.
+    scripts = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*', '*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(f"queries.{name.replace('-', '_')}", path)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+        except ImportError as e:
+            print(f"Warning: cannot load {name}.py ({e}), its queries will not be answered from the cube",
+                  file=sys.stderr)
+            continue
+        if not hasattr(module, 'cube_counts'):
+            continue
+        for attribute in ('QUERY', 'QUERY_DERIVED'):
+            if hasattr(module, attribute):
+                scripts[normalize_query(getattr(module, attribute))] = module
+
+    return scripts
+
+
+class ReplayEndpoint:
+    # The results behind the server: recorded, computed from the cube, or fetched from the
+    # upstream endpoint and recorded, in this order
+
+    def __init__(self, recordings=None, cube=None, upstream=None, latency=0.0, throughput=0.0, max_concurrency=0):
+        self.recordings = Recordings(recordings) if recordings else None
+        self.cube = DiversityCube(cube) if cube else None
+        self.scripts = load_scripts() if cube else {}
+        self.upstream = SparqlClient(upstream) if upstream else None
+        self.latency = latency
+        self.throughput = throughput * 1024
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+
+        # The cube is read by one thread at a time, and each result computed once
+        self.lock = threading.Lock()
+        self.computed = {}
+
+        self.fingerprint = ''
+        if cube:
+            with open(os.path.join(cube, MANIFEST), 'rb') as f:
+                self.fingerprint = hashlib.sha256(f.read()).hexdigest()
+
+    def result(self, query):
+        # (CSV result, where it comes from), or a LookupError
+        if self.recordings is not None:
+            body = self.recordings.get(query)
+            if body is not None:
+                return body, 'recorded'
+
+        script = self.scripts.get(normalize_query(query))
+        if script is not None:
+            with self.lock:
+                key = normalize_query(query)
+                if key not in self.computed:
+                    self.computed[key] = script.cube_counts(self.cube).to_csv(index=False).encode('utf-8')
+                return self.computed[key], 'cube'
+
+        if self.upstream is not None:
+            body = self.upstream.request(query).content
+            if self.recordings is not None:
+                self.recordings.put(query, body)
+            return body, 'upstream'
+
+        raise LookupError("No recorded result for this query, and it cannot be computed from a cube")
+
+    def stats(self):
+        # The fields of the QLever statistics that identify the dataset (see
+        # SparqlClient.index_fingerprint), so that clients cache the results per cube.
+        # Nothing else may change them: a new recording must not orphan client caches.
+        return {
+            'name-index': 'divinwd-replay',
+            'name-cube': self.fingerprint,
+        }
+
+    def close(self):
+        if self.cube is not None:
+            self.cube.close()
+        if self.upstream is not None:
+            self.upstream.close()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections, as QLever and the pooled sessions of the client use them
+    protocol_version = 'HTTP/1.1'
+    endpoint = None
+
+    def do_GET(self):
+        self.handle_parameters(parse_qs(urlsplit(self.path).query))
+
+    def do_POST(self):
+        parameters = parse_qs(urlsplit(self.path).query)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+        if content_type == 'application/sparql-query':
+            parameters['query'] = [body]
+        else:
+            parameters.update(parse_qs(body))
+        self.handle_parameters(parameters)
+
+    def handle_parameters(self, parameters):
+        command = parameters.get('cmd', [None])[0]
+        if command == 'stats':
+            return self.send_json(200, self.endpoint.stats())
+        if command == 'clear-cache':
+            return self.send_json(200, {})
+        if command is not None:
+            return self.send_error_json(400, f"Unsupported command: {command}")
+
+        query = parameters.get('query', [None])[0]
+        if query is None:
+            return self.send_error_json(400, "Missing parameter: query")
+        if parameters.get('format', ['text/csv'])[0] not in ('text/csv', 'csv'):
+            return self.send_error_json(400, "Only text/csv results are served")
+
+        # A query holds its slot until its result is sent, throttled or not
+        start = time.perf_counter()
+        if self.endpoint.slots is not None:
+            self.endpoint.slots.acquire()
+        try:
+            sent = self.answer(query)
+        finally:
+            if self.endpoint.slots is not None:
+                self.endpoint.slots.release()
+        if sent is not None:
+            print(f"{self.address_string()} query: {sent} ({time.perf_counter() - start:.2f} s)", file=sys.stderr)
+
+    def answer(self, query):
+        # Returns what was sent, or None for an error
+        time.sleep(self.endpoint.latency)
+        try:
+            body, source = self.endpoint.result(query)
+        except LookupError as e:
+            return self.send_error_json(400, str(e), query)
+        except SparqlError as e:
+            return self.send_error_json(502, f"The upstream endpoint failed: {e}", query)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.send_throttled(body)
+
+        return f"{len(body):,} bytes {source}"
+
+    def send_throttled(self, body):
+        throughput = self.endpoint.throughput
+        if throughput <= 0:
+            self.wfile.write(body)
+            return
+
+        size = max(1, int(throughput * SEND_INTERVAL))
+        for offset in range(0, len(body), size):
+            piece = body[offset:offset + size]
+            self.wfile.write(piece)
+            self.wfile.flush()
+            time.sleep(len(piece) / throughput)
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, query=None):
+        # Errors as QLever reports them
+        print(f"{self.address_string()} error: {message}", file=sys.stderr)
+        self.send_json(status, {'status': 'ERROR', 'exception': message, 'query': query})
+
+    def log_request(self, code='-', size='-'):
+        # Queries are logged once answered
+        pass
+
+
+def main():
+    parser = get_arg_parser()
+    arguments = parser.parse_args()
+    if not arguments.recordings and not arguments.cube:
+        parser.error('one of the arguments --recordings --cube is required')
+    if arguments.upstream and not arguments.recordings:
+        parser.error('--upstream requires --recordings, where its results are recorded')
+
+    try:
+        endpoint = ReplayEndpoint(arguments.recordings, arguments.cube, arguments.upstream, arguments.latency,
+                                  arguments.throughput, arguments.max_concurrency)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    ReplayHandler.endpoint = endpoint
+    server = ThreadingHTTPServer((arguments.host, arguments.port), ReplayHandler)
+    server.daemon_threads = True
+    print(f"Serving {len(endpoint.scripts)} queries from the cube and "
+          f"{len(endpoint.recordings) if endpoint.recordings is not None else 0} recorded results at "
+          f"http://{arguments.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        endpoint.close()
+
+
+if __name__ == '__main__':
+    main()
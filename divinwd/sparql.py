@@ -0,0 +1,320 @@
+import contextlib
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from divinwd.cache import DEFAULT_CACHE_SIZE, ResultCache, file_fingerprint
+
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 3600
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Queries whose encoded parameters are longer are sent in a form-encoded POST body. Most
+# HTTP servers and proxies reject request lines above 8 KiB, some above 4 KiB; half of
+# the larger limit leaves room for the rest of the request line and for an endpoint URL
+# with a path. The queries of language.py, nationality.py and the continent heatmap,
+# with their VALUES tables, are longer and go by POST; the others fit in a GET.
+MAX_GET_LENGTH = 4096
+
+# Rows parsed at a time when reading a streamed result
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+class SparqlError(Exception):
+    pass
+
+
+class ResponseReader(io.RawIOBase):
+    # Readable file over the body of a streamed response, decoded chunk by chunk as it
+    # arrives. Every chunk is also copied to `sink`, if given.
+
+    def __init__(self, response, sink=None, chunk_size=1 << 16):
+        self.chunks = response.iter_content(chunk_size=chunk_size)
+        self.sink = sink
+        self.pending = b''
+        self.exhausted = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending and not self.exhausted:
+            try:
+                self.pending = next(self.chunks)
+            except StopIteration:
+                self.exhausted = True
+            except requests.RequestException as e:
+                raise SparqlError(f"The connection broke while receiving the result: {str(e)}") from e
+            else:
+                if self.sink is not None:
+                    self.sink.write(self.pending)
+
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+
+        return n
+
+
+class SparqlClient:
+    # A client keeps one requests.Session, so consecutive queries to the same endpoint
+    # reuse pooled keep-alive connections instead of opening a new one every time.
+
+    def __init__(self, url, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_get_length=MAX_GET_LENGTH, cache=None, fingerprint=None, refresh=False):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_concurrency = max_concurrency
+        self.max_get_length = max_get_length
+
+        # Results are cached only when they can be tied to a dataset version: either
+        # a given fingerprint or, by default, the statistics of the QLever index
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.refresh = refresh
+
+        # Retry connection failures and gateway errors with exponential backoff. Read
+        # timeouts are not retried: a query that took too long once will do it again.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET', 'POST'}),
+            raise_on_status=False,
+        )
+        # One pooled connection per query sent at the same time by query_all
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_concurrency), max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept': 'text/csv',
+            'User-Agent': 'divinwd-dataset-resources',
+        })
+
+    def request(self, query, stream=False):
+        params = {'query': query, 'format': 'text/csv'}
+
+        try:
+            if len(urlencode(params)) <= self.max_get_length:
+                response = self.session.get(self.url, params=params, timeout=self.timeout, stream=stream)
+            else:
+                response = self.session.post(self.url, data=params, timeout=self.timeout, stream=stream)
+            response.raise_for_status()
+        except requests.ConnectionError as e:
+            raise SparqlError("Failed to connect to the server. Check the URL (is the server up?)") from e
+        except requests.Timeout as e:
+            raise SparqlError("Request timed out. The server took too long to respond.") from e
+        except requests.HTTPError as e:
+            message = f"The server returned an error: {str(e)}"
+            if e.response is not None and e.response.text:
+                message += f"\nServer details: {e.response.text}"
+            raise SparqlError(message) from e
+        except requests.RequestException as e:
+            raise SparqlError(f"An error occurred while making the request: {str(e)}") from e
+
+        return response
+
+    def index_fingerprint(self):
+        # QLever describes its index at ?cmd=stats (name, build revision, number of
+        # triples, ...); these values change whenever the index is rebuilt
+        try:
+            response = self.session.get(self.url, params={'cmd': 'stats'}, headers={'Accept': 'application/json'},
+                                        timeout=self.timeout)
+            response.raise_for_status()
+            stats = response.json()
+        except (requests.RequestException, ValueError):
+            return None
+
+        index = {k: v for k, v in stats.items() if k.startswith(('name-', 'num-', 'git-hash-index'))}
+        if not index:
+            return None
+
+        return json.dumps(index, sort_keys=True)
+
+    def dataset_fingerprint(self):
+        if self.fingerprint is None:
+            self.fingerprint = self.index_fingerprint() or ''
+            if not self.fingerprint:
+                print("Warning: cannot identify the dataset behind the endpoint, results will not be cached "
+                      "(use --dataset or --dataset-fingerprint)", file=sys.stderr)
+
+        return self.fingerprint
+
+    def cache_key(self, query):
+        if self.cache is None or not self.dataset_fingerprint():
+            return None
+
+        return self.cache.key(self.url, query, self.fingerprint)
+
+    def query(self, query):
+        key = self.cache_key(query)
+        if key is not None and not self.refresh:
+            text = self.cache.get(key)
+            if text is not None:
+                return text
+
+        text = self.request(query).text
+        if key is not None:
+            self.cache.put(key, text)
+
+        return text
+
+    @contextlib.contextmanager
+    def stream(self, query):
+        # Binary file over the CSV result, read while it is being downloaded. Streamed
+        # results go through the cache like any other: a complete download is stored,
+        # and a cached result is read back from disk.
+        key = self.cache_key(query)
+        if key is not None and not self.refresh:
+            f = self.cache.open(key)
+            if f is not None:
+                with f:
+                    yield f
+                return
+
+        with self.request(query, stream=True) as response:
+            if key is None:
+                yield io.BufferedReader(ResponseReader(response))
+                return
+
+            with self.cache.writer(key) as entry:
+                reader = ResponseReader(response, sink=entry.file)
+                yield io.BufferedReader(reader)
+                entry.complete = reader.exhausted
+
+    def read_csv_chunks(self, query, chunksize=DEFAULT_CHUNK_SIZE, **kwargs):
+        # Parse the result incrementally: at most `chunksize` rows are held at a time,
+        # and parsing overlaps with the download
+        with self.stream(query) as f:
+            try:
+                yield from pd.read_csv(f, chunksize=chunksize, **kwargs)
+            except pd.errors.EmptyDataError:
+                return
+
+    def query_all(self, queries):
+        # Independent queries are dispatched concurrently, at most max_concurrency at a
+        # time, so the total latency is that of the slowest query rather than the sum.
+        # Results are returned in the same order as the queries.
+        if self.max_concurrency <= 1 or len(queries) <= 1:
+            return [self.query(query) for query in queries]
+
+        # Resolve the fingerprint once, before the workers need it
+        if self.cache is not None:
+            self.dataset_fingerprint()
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(queries))) as executor:
+            futures = [executor.submit(self.query, query) for query in queries]
+            try:
+                return [future.result() for future in futures]
+            except SparqlError:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def values_table(variables, rows, indent):
+    # VALUES clause binding the variables to the Wikidata entities of each row
+    lines = [f"{indent}VALUES ({' '.join('?' + v for v in variables)}) {{"]
+    lines += [f"{indent}    ({' '.join('wd:' + q for q in row)})" for row in rows]
+    lines.append(f"{indent}}}")
+    return '\n'.join(lines)
+
+
+def add_client_arguments(parser, required=True):
+    parser.add_argument('--url', required=required, help='SPARQL endpoint URL')
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help=f'seconds to wait for a connection (default: {DEFAULT_CONNECT_TIMEOUT})')
+    parser.add_argument('--read-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                        help=f'seconds to wait for a query result (default: {DEFAULT_READ_TIMEOUT})')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f'retries on connection errors and 502/503/504 responses (default: {DEFAULT_RETRIES})')
+
+    cache = parser.add_argument_group('result cache')
+    cache.add_argument('--no-cache', action='store_true', help='neither read nor store cached query results')
+    cache.add_argument('--refresh', action='store_true', help='re-run queries and overwrite their cached results')
+    cache.add_argument('--cache-dir', default=None, help='cache directory (default: ~/.cache/divinwd)')
+    cache.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                       help=f'maximum cache size in MiB, least recently used results are evicted first (default: {DEFAULT_CACHE_SIZE})')
+    cache.add_argument('--dataset', default=None,
+                       help='dataset file (e.g. divinwd.nt.gz) whose checksum identifies cached results, '
+                            'instead of the index statistics reported by QLever')
+    cache.add_argument('--dataset-fingerprint', default=None, help='explicit identifier of the dataset version')
+
+    return parser
+
+
+def client_from_arguments(arguments, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    cache = None
+    fingerprint = arguments.dataset_fingerprint
+    if not arguments.no_cache:
+        cache = ResultCache(arguments.cache_dir, max_bytes=arguments.cache_size << 20)
+        if fingerprint is None and arguments.dataset is not None:
+            fingerprint = file_fingerprint(arguments.dataset, cache_dir=cache.directory)
+
+    return SparqlClient(
+        arguments.url,
+        connect_timeout=arguments.connect_timeout,
+        read_timeout=arguments.read_timeout,
+        retries=arguments.retries,
+        max_concurrency=max_concurrency,
+        cache=cache,
+        fingerprint=fingerprint,
+        refresh=arguments.refresh,
+    )
+
+
+def query_or_exit(client, query):
+    try:
+        return client.query(query)
+    except SparqlError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def count_rows(chunks, name='count'):
+    # Count rows per distinct combination of values, one chunk at a time, so that only
+    # the aggregate is kept in memory
+    counts = None
+    columns = None
+    for chunk in chunks:
+        columns = list(chunk.columns)
+        chunk_counts = chunk.groupby(columns, dropna=False).size()
+        counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+
+    if counts is None:
+        return pd.DataFrame(columns=(columns or []) + [name])
+
+    return counts.astype('int64').rename(name).reset_index()
+
+
+def count_rows_or_exit(client, query, columns, name='count'):
+    try:
+        return count_rows(client.read_csv_chunks(query, usecols=columns), name=name)
+    except SparqlError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,360 @@
+import argparse
+import bisect
+import concurrent.futures
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+
+import numpy as np
+
+from divinwd.ntriples import parse_chunk, read_chunks, read_triples
+
+
+STORE_VERSION = 2
+MANIFEST = 'store.json'
+TERMS = 'terms.bin'
+TERM_OFFSETS = 'terms.npy'
+PREDICATES = 'predicates'
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Pseudonymized entities and statements (see database/README.md) are not kept in the
+# dictionary: their number is stored with the tag of their namespace in the high bits.
+# Terms of the dictionary have tag 0, so their ids are their index in the dictionary.
+TAG_SHIFT = 56
+NUMBER_MASK = (1 << TAG_SHIFT) - 1
+ENTITY_TAG = 1
+STATEMENT_TAG = 2
+ENTITY_PREFIX = '<https://divinwd.dev/wd/entity/'
+PSEUDONYM_PREFIXES = {
+    ENTITY_TAG: ENTITY_PREFIX + 'X',
+    STATEMENT_TAG: ENTITY_PREFIX + 'statement/XS',
+}
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Build an offline store of the dataset: the terms are numbered, and the subjects and objects '
+                    'of each predicate are kept in arrays that are memory-mapped when the store is opened')
+    parser.add_argument('input', nargs='+', help='N-Triples dump(s), possibly gzipped (e.g. divinwd.nt.gz)')
+    parser.add_argument('--output', required=True, help='directory of the store (e.g. divinwd-store)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of processes parsing the dump (default: number of CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_BYTES // (1024 * 1024),
+                        help='MiB of the decompressed dump sent to a process at once '
+                             f'(default: {DEFAULT_CHUNK_BYTES // (1024 * 1024)})')
+
+    return parser
+
+
+def pseudonym_id(term):
+    # Tagged id of a pseudonymized entity or statement, or None for other terms. Numbers
+    # with leading zeros would not be written back the same way, so they are left out.
+    if not term.startswith(ENTITY_PREFIX) or not term.endswith('>'):
+        return None
+    name = term[len(ENTITY_PREFIX):-1]
+    if name.startswith('X'):
+        tag, digits = ENTITY_TAG, name[1:]
+    elif name.startswith('statement/XS'):
+        tag, digits = STATEMENT_TAG, name[12:]
+    else:
+        return None
+    if not (digits.isascii() and digits.isdigit()) or (digits[0] == '0' and digits != '0'):
+        return None
+    number = int(digits)
+    if number > NUMBER_MASK:
+        return None
+    return tag << TAG_SHIFT | number
+
+
+def pseudonym_term(i):
+    return f'{PSEUDONYM_PREFIXES[i >> TAG_SHIFT]}{i & NUMBER_MASK}>'
+
+
+def remap_terms(ids, remap):
+    # Translate the dictionary ids of an array, leaving pseudonym ids as they are
+    ids = np.array(ids, dtype=np.int64)
+    in_dictionary = ids <= NUMBER_MASK
+    ids[in_dictionary] = remap[ids[in_dictionary]]
+    return ids
+
+
+class TripleEncoder:
+    # Numbers the terms in the order they are first seen, and collects the subject and
+    # object numbers of every predicate
+
+    def __init__(self):
+        self.ids = {}
+        self.partitions = {}
+        # Dumps list the triples of a subject one after the other
+        self.subject = None
+        self.subject_id = None
+
+    def encode(self, term):
+        i = pseudonym_id(term)
+        if i is not None:
+            return i
+        i = self.ids.get(term)
+        if i is None:
+            i = self.ids[term] = len(self.ids)
+        return i
+
+    def add(self, s, p, o):
+        partition = self.partitions.get(p)
+        if partition is None:
+            partition = self.partitions[p] = (array('q'), array('q'))
+        if s != self.subject:
+            self.subject, self.subject_id = s, self.encode(s)
+        partition[0].append(self.subject_id)
+        partition[1].append(self.encode(o))
+
+    def finish(self):
+        # Renumber the terms in sorted order, so that the dictionary can be searched on disk,
+        # and sort every partition by subject and object, dropping duplicate triples.
+        # Returns (terms, {predicate: (subjects, objects)}).
+        terms = list(self.ids)
+        order = sorted(range(len(terms)), key=terms.__getitem__)
+        remap = np.empty(len(terms), dtype=np.int64)
+        remap[order] = np.arange(len(terms), dtype=np.int64)
+        terms = [terms[i] for i in order]
+
+        partitions = {}
+        for p, (s, o) in self.partitions.items():
+            partitions[p] = sort_pairs(remap_terms(s, remap), remap_terms(o, remap))
+
+        return terms, partitions
+
+
+def sort_pairs(s, o):
+    order = np.lexsort((o, s))
+    s = s[order]
+    o = o[order]
+    keep = np.ones(len(s), dtype=bool)
+    keep[1:] = (s[1:] != s[:-1]) | (o[1:] != o[:-1])
+
+    return s[keep], o[keep]
+
+
+def join_sorted(keys, sorted_keys):
+    # Equality join of keys with sorted_keys: (i, j) index pairs with keys[i] == sorted_keys[j],
+    # found with two binary searches per key rather than by comparing every pair. The keys
+    # are searched in sorted order, which is several times faster on large arrays.
+    order = np.argsort(keys, kind='stable')
+    lo = np.empty(len(keys), dtype=np.int64)
+    hi = np.empty(len(keys), dtype=np.int64)
+    needles = keys[order]
+    lo[order] = np.searchsorted(sorted_keys, needles, side='left')
+    hi[order] = np.searchsorted(sorted_keys, needles, side='right')
+    counts = hi - lo
+    rows = np.repeat(np.arange(len(keys)), counts)
+    starts = np.cumsum(counts) - counts
+    matches = lo[rows] + np.arange(len(rows)) - starts[rows]
+
+    return rows, matches
+
+
+def lookup_sorted(keys, values, ids):
+    # values[k] where keys[k] == ids (keys sorted), or ids themselves; and whether they were found
+    if not len(keys):
+        return ids.copy(), np.zeros(len(ids), dtype=bool)
+    i = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+    found = keys[i] == ids
+    return np.where(found, values[i], ids), found
+
+
+def lookup_table(store, mapping):
+    # Ids of a {term: term} mapping as arrays (keys, values) sorted by key, for lookup_sorted;
+    # terms missing from the store cannot be looked up and are left out
+    pairs = [(store.term_id(k), store.term_id(v)) for k, v in mapping.items()]
+    pairs = sorted((k, v) for k, v in pairs if k is not None and v is not None)
+    return (np.array([k for k, _ in pairs], dtype=np.int64),
+            np.array([v for _, v in pairs], dtype=np.int64))
+
+
+def write_store(directory, terms, partitions):
+    os.makedirs(os.path.join(directory, PREDICATES), exist_ok=True)
+
+    # Terms are written one after the other as UTF-8, whose byte order is the order of the
+    # code points: the sorted terms can be found by bisection without decoding the file
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    with open(os.path.join(directory, TERMS), 'wb') as f:
+        for i, term in enumerate(terms):
+            data = term.encode('utf-8')
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(os.path.join(directory, TERM_OFFSETS), offsets)
+
+    predicates = {}
+    for i, p in enumerate(sorted(partitions)):
+        s, o = partitions[p]
+        np.save(os.path.join(directory, PREDICATES, f'{i}.subjects.npy'), s)
+        np.save(os.path.join(directory, PREDICATES, f'{i}.objects.npy'), o)
+        predicates[p] = {'file': str(i), 'triples': len(s)}
+
+    manifest = {
+        'version': STORE_VERSION,
+        'terms': len(terms),
+        'triples': sum(p['triples'] for p in predicates.values()),
+        'predicates': predicates,
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    return manifest
+
+
+def build_store(triples, directory):
+    encoder = TripleEncoder()
+    for s, p, o in triples:
+        encoder.add(s, p, o)
+
+    return write_store(directory, *encoder.finish())
+
+
+def encode_chunk(data):
+    encoder = TripleEncoder()
+    for s, p, o in parse_chunk(data):
+        encoder.add(s, p, o)
+
+    return encoder.finish()
+
+
+def merge_chunks(chunks):
+    # Number the terms of all chunks together, and translate the numbers of every chunk
+    terms = sorted(set().union(*(chunk_terms for chunk_terms, _ in chunks)))
+    ids = {term: i for i, term in enumerate(terms)}
+
+    pieces = {}
+    for chunk_terms, partitions in chunks:
+        remap = np.fromiter((ids[term] for term in chunk_terms), dtype=np.int64, count=len(chunk_terms))
+        for p, (s, o) in partitions.items():
+            pieces.setdefault(p, []).append((remap_terms(s, remap), remap_terms(o, remap)))
+
+    partitions = {}
+    for p, arrays in pieces.items():
+        partitions[p] = sort_pairs(np.concatenate([s for s, _ in arrays]),
+                                   np.concatenate([o for _, o in arrays]))
+
+    return terms, partitions
+
+
+def parse_dumps(paths, workers, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    # The dumps are decompressed once, in this process, and cut into blocks of whole lines
+    # that the workers parse and encode on their own; at most two blocks per worker wait
+    # in memory. Returns (terms, partitions) as TripleEncoder.finish does.
+    chunks = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for data in read_chunks(paths, chunk_bytes):
+            if len(pending) >= 2 * workers:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                chunks.extend(future.result() for future in done)
+            pending.add(executor.submit(encode_chunk, data))
+        chunks.extend(future.result() for future in pending)
+
+    return merge_chunks(chunks)
+
+
+class TermDictionary:
+    # Terms of the store, as written in N-Triples, indexed by their numbers
+
+    def __init__(self, directory):
+        self.offsets = np.load(os.path.join(directory, TERM_OFFSETS), mmap_mode='r')
+        with open(os.path.join(directory, TERMS), 'rb') as f:
+            # An empty file cannot be mapped
+            if os.fstat(f.fileno()).st_size:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def lookup(self, term):
+        i = bisect.bisect_left(self, term)
+        if i < len(self) and self[i] == term:
+            return i
+        return None
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+class TripleStore:
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No store in {directory}; build it with `python -m divinwd.store`") from None
+        if self.manifest.get('version') != STORE_VERSION:
+            raise ValueError(f"The store in {directory} was built by another version; build it again")
+
+        self.terms = TermDictionary(directory)
+        self.partitions = {}
+
+    def predicates(self):
+        return list(self.manifest['predicates'])
+
+    def triples(self, predicate):
+        # (subjects, objects) of a predicate, sorted by subject then object
+        partition = self.partitions.get(predicate)
+        if partition is None:
+            info = self.manifest['predicates'].get(predicate)
+            if info is None:
+                empty = np.empty(0, dtype=np.int64)
+                return empty, empty
+            path = os.path.join(self.directory, PREDICATES, info['file'])
+            partition = self.partitions[predicate] = (
+                np.load(path + '.subjects.npy', mmap_mode='r'),
+                np.load(path + '.objects.npy', mmap_mode='r'),
+            )
+
+        return partition
+
+    def term_id(self, term):
+        i = pseudonym_id(term)
+        if i is not None:
+            return i
+        return self.terms.lookup(term)
+
+    def term(self, i):
+        if i > NUMBER_MASK:
+            return pseudonym_term(int(i))
+        return self.terms[i]
+
+    def close(self):
+        self.partitions.clear()
+        self.terms.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    arguments = get_arg_parser().parse_args()
+
+    start = time.perf_counter()
+    print("Reading the dataset...", file=sys.stderr)
+    if arguments.workers > 1:
+        chunk_bytes = arguments.chunk_size * 1024 * 1024
+        manifest = write_store(arguments.output, *parse_dumps(arguments.input, arguments.workers, chunk_bytes))
+    else:
+        manifest = build_store(read_triples(arguments.input), arguments.output)
+    print(f"Stored {manifest['triples']} triples of {len(manifest['predicates'])} predicates "
+          f"and {manifest['terms']} terms in {arguments.output} "
+          f"({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
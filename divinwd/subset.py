@@ -0,0 +1,133 @@
+import argparse
+import datetime
+import gzip
+import os
+import random
+import sys
+
+from divinwd.derive import (AUTHOR, AUTHOR_NAME_STRING, PUBLICATION_DATE, ROR_ID, ROR_ORGANIZATION_ID,
+                            find_eligible_articles)
+from divinwd.ntriples import read_triples
+
+
+# Subjects outside this namespace are Wikidata entities kept as they are (countries,
+# continents, languages, genders...): few, and shared by every article, they are all kept
+DIVINWD = '<https://divinwd.dev/'
+# p:P27, p:P108, p:P463... link a subject to its statements, whose values are given by
+# ps: and qualifiers by pq:
+STATEMENT = '<http://www.wikidata.org/prop/P'
+EMPLOYER_VALUE = '<http://www.wikidata.org/prop/statement/P108>'
+LINKS = (AUTHOR, EMPLOYER_VALUE, ROR_ID, ROR_ORGANIZATION_ID)
+# Triples that make an article eligible, written for the articles of the sample only: an
+# entity reached otherwise (as an author, say) must not add an article to the sample
+ARTICLE_PREDICATES = (AUTHOR, AUTHOR_NAME_STRING, PUBLICATION_DATE)
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Write a sample of the dataset: a fraction of the eligible articles of each year, with '
+                    'every triple the queries read about them, their authors, the statements and employers '
+                    'of the authors and the ROR organizations, so that the queries give the same results '
+                    'for these articles as on the whole dataset')
+    parser.add_argument('input', nargs='+', help='N-Triples dump(s), possibly gzipped (e.g. divinwd.nt.gz)')
+    parser.add_argument('--output', required=True, help='gzipped N-Triples file to write (e.g. divinwd.nt.gz in '
+                                                        'another directory)')
+    parser.add_argument('--fraction', type=float, required=True,
+                        help='fraction of the eligible articles of each year to keep (e.g. 0.01); at least one '
+                             'article is kept per year')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the sample (default: 0)')
+    parser.add_argument('--current-year', type=int, default=datetime.date.today().year,
+                        help='publication dates after this year are ignored, as YEAR(NOW()) does in the queries '
+                             '(default: this year)')
+
+    return parser
+
+
+def sample_articles(eligible, fraction, seed):
+    # The same fraction of the articles of every year, so that the sample keeps the
+    # distribution of the articles over the years
+    years = {}
+    for article, (_, year) in eligible.items():
+        years.setdefault(year, []).append(article)
+
+    rng = random.Random(seed)
+    sample = set()
+    for year in sorted(years):
+        articles = sorted(years[year])
+        sample.update(rng.sample(articles, max(1, round(fraction * len(articles)))))
+
+    return sample
+
+
+def is_shared(subject):
+    return not subject.startswith(DIVINWD)
+
+
+def close_subset(articles, triples):
+    # Subjects whose triples the queries read, starting from the articles: their authors,
+    # the statements of the authors (and of the countries), the employers of the
+    # statements, their ROR organizations. The other organizations with the ROR id of an
+    # employer are kept too: an id held by several organizations is left out by the
+    # queries, and must still be in the sample.
+    authors = {o for s, p, o in triples if p == AUTHOR and s in articles}
+    statements = {o for s, p, o in triples if p.startswith(STATEMENT) and (s in authors or is_shared(s))}
+    employers = {o for s, p, o in triples if p == EMPLOYER_VALUE and s in statements}
+    ror_ids = {o for s, p, o in triples if p == ROR_ID and s in employers}
+    organizations = {s for s, p, o in triples if p == ROR_ID and o in ror_ids}
+    ror_organizations = {s for s, p, o in triples if p == ROR_ORGANIZATION_ID and o in ror_ids}
+
+    return articles | authors | statements | employers | organizations | ror_organizations
+
+
+def collect_links(triples, into):
+    # Pass the triples through, keeping those linking subjects in `into`, as
+    # divinwd.derive.collect does
+    for triple in triples:
+        if triple[1] in LINKS or triple[1].startswith(STATEMENT):
+            into.append(triple)
+        yield triple
+
+
+def write_subset(path, triples, articles, subjects):
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for s, p, o in triples:
+            if p in ARTICLE_PREDICATES:
+                keep = s in articles
+            else:
+                keep = s in subjects or is_shared(s)
+            if keep:
+                f.write(f'{s} {p} {o} .\n')
+                count += 1
+
+    return count
+
+
+def main():
+    parser = get_arg_parser()
+    arguments = parser.parse_args()
+    if not 0 < arguments.fraction <= 1:
+        parser.error('--fraction must be in (0, 1]')
+    if os.path.abspath(arguments.output) in map(os.path.abspath, arguments.input):
+        parser.error('--output must not be one of the inputs, which are read twice')
+    # Checked before the first pass, which reads the whole dump
+    directory = os.path.dirname(os.path.abspath(arguments.output))
+    if not os.path.isdir(directory):
+        parser.error(f'the directory of --output does not exist: {directory}')
+
+    # The links followed from the articles are kept in memory during the first pass; the
+    # second pass writes the triples of the subjects reached
+    print("Reading the dataset...", file=sys.stderr)
+    links = []
+    eligible = find_eligible_articles(collect_links(read_triples(arguments.input), links), arguments.current_year)
+    articles = sample_articles(eligible, arguments.fraction, arguments.seed)
+    subjects = close_subset(articles, links)
+
+    print(f"Writing {len(articles):,} of the {len(eligible):,} eligible articles and {len(subjects):,} subjects "
+          f"in total...", file=sys.stderr)
+    count = write_subset(arguments.output, read_triples(arguments.input), articles, subjects)
+    print(f"Wrote {count:,} triples to {arguments.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
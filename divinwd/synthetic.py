@@ -0,0 +1,506 @@
+import argparse
+import datetime
+import gzip
+import sys
+import time
+
+import numpy as np
+
+from divinwd.countries import CONTINENTS, COUNTRY_MAPPING, EXCLUDED_COUNTRIES
+from divinwd.derive import (AUTHOR, AUTHOR_NAME_STRING, HUMAN, INSTANCE_OF, PUBLICATION_DATE, ROR_ID,
+                            ROR_ORGANIZATION_ID, SCHOLARLY_ARTICLE, WD, WDT, XSD)
+from divinwd.languages import ENGLISH, LANGUAGE_MAPPINGS, UNDETERMINED
+from divinwd.offline import BEST_RANK, END_TIME, P, RDF_TYPE, ROR, START_TIME
+from divinwd.store import ENTITY_TAG, PSEUDONYM_PREFIXES, STATEMENT_TAG
+
+
+# Sizes at scale 1: about 1.4M of the articles are analyzed, with 867k authors, as in the
+# dataset of May 2025
+ARTICLES = 1_750_000
+AUTHORS = 867_000
+ORGANIZATIONS = 45_000
+BLOCK = 100_000
+
+# Pseudonyms are numbers "randomly chosen": the numbers 0, 1, 2... of the entities and
+# statements are mapped to n * multiplier + offset modulo a prime, a bijection
+PRIME = 2 ** 31 - 1
+ENTITY_MULTIPLIER = 1_103_515_245
+STATEMENT_MULTIPLIER = 48_271
+PSEUDONYM_OFFSET = 12_345
+# Statements of an author: 2 of P27, then 4 of P108
+STATEMENTS_PER_AUTHOR = 6
+
+LANGUAGE = f'<{WDT}P407>'
+GENDER = f'<{WDT}P21>'
+INCEPTION = f'<{WDT}P571>'
+DISSOLVED = f'<{WDT}P576>'
+CONTINENT = f'<{WDT}P30>'
+ISO_CODE = f'<{WDT}P297>'
+LABEL = '<http://www.w3.org/2000/01/rdf-schema#label>'
+EXTERNAL_LANGUAGE = '<https://divinwd.dev/oacr/lang>'
+FOS_VALUE = '<https://divinwd.dev/semanticscholar/fos/value>'
+FOS_PREDICTION = '<https://divinwd.dev/semanticscholar/fos/prediction>'
+GENDERIZE_GENDER = '<https://divinwd.dev/genderize/gender>'
+GENDERIZE_NATIONALITY = '<https://divinwd.dev/genderize/nationality>'
+ROR_TYPE = f'<{ROR}type>'
+ROR_LOCATION = f'<{ROR}location>'
+THESIS = f'<{WD}Q1266946>'
+EUROPEAN_UNION = f'<{WD}Q458>'
+
+# (Wikidata id, ISO code, continents, share of the authors, inception, dissolution)
+COUNTRIES = [
+    ('Q30', 'US', ['Q49'], 20, None, None),
+    ('Q148', 'CN', ['Q48'], 14, '1949-10-01', None),
+    ('Q145', 'GB', ['Q46'], 7, '1801-01-01', None),
+    ('Q183', 'DE', ['Q46'], 6, '1949-05-23', None),
+    ('Q17', 'JP', ['Q48'], 6, None, None),
+    ('Q142', 'FR', ['Q46'], 4.5, None, None),
+    ('Q668', 'IN', ['Q48'], 4, '1947-08-15', None),
+    ('Q38', 'IT', ['Q46'], 3.5, '1861-03-17', None),
+    ('Q16', 'CA', ['Q49'], 3.5, '1867-07-01', None),
+    ('Q29', 'ES', ['Q46'], 3, None, None),
+    ('Q408', 'AU', ['Q55643'], 3, '1901-01-01', None),
+    ('Q884', 'KR', ['Q48'], 2.5, '1948-08-15', None),
+    ('Q155', 'BR', ['Q18'], 2.5, '1822-09-07', None),
+    ('Q29999', 'NL', ['Q46'], 2, '1815-03-16', None),
+    ('Q159', 'RU', ['Q46', 'Q48'], 2, '1991-12-25', None),
+    ('Q39', 'CH', ['Q46'], 1.5, None, None),
+    ('Q34', 'SE', ['Q46'], 1.2, None, None),
+    ('Q36', 'PL', ['Q46'], 1.2, '1918-11-11', None),
+    ('Q794', 'IR', ['Q48'], 1.2, None, None),
+    ('Q43', 'TR', ['Q46', 'Q48'], 1.2, '1923-10-29', None),
+    ('Q31', 'BE', ['Q46'], 1, '1830-10-04', None),
+    ('Q35', 'DK', ['Q46'], 0.8, None, None),
+    ('Q96', 'MX', ['Q49'], 0.8, '1821-09-27', None),
+    ('Q801', 'IL', ['Q48'], 0.7, '1948-05-14', None),
+    ('Q20', 'NO', ['Q46'], 0.6, None, None),
+    ('Q40', 'AT', ['Q46'], 0.6, '1955-07-27', None),
+    ('Q45', 'PT', ['Q46'], 0.6, None, None),
+    ('Q79', 'EG', ['Q15', 'Q48'], 0.6, None, None),
+    ('Q213', 'CZ', ['Q46'], 0.5, '1993-01-01', None),
+    ('Q33', 'FI', ['Q46'], 0.5, '1917-12-06', None),
+    ('Q41', 'GR', ['Q46'], 0.5, None, None),
+    ('Q258', 'ZA', ['Q15'], 0.5, '1910-05-31', None),
+    ('Q414', 'AR', ['Q18'], 0.5, '1816-07-09', None),
+    ('Q843', 'PK', ['Q48'], 0.5, '1947-08-14', None),
+    ('Q1033', 'NG', ['Q15'], 0.4, '1960-10-01', None),
+    ('Q664', 'NZ', ['Q55643'], 0.4, None, None),
+    ('Q298', 'CL', ['Q18'], 0.3, '1818-02-12', None),
+    ('Q739', 'CO', ['Q18'], 0.3, '1810-07-20', None),
+    ('Q114', 'KE', ['Q15'], 0.2, '1963-12-12', None),
+    ('Q15180', 'SU', ['Q46', 'Q48'], 0.2, '1922-12-30', '1991-12-26'),
+    ('Q16957', 'DD', ['Q46'], 0.1, '1949-10-07', '1990-10-03'),
+    ('Q33946', 'CS', ['Q46'], 0.1, '1918-10-28', '1993-01-01'),
+    ('Q804', 'PA', ['Q18', 'Q49'], 0.05, None, None),
+    ('Q23681', None, ['Q46'], 0.01, '1983-11-15', None),
+    ('Q712', 'FJ', [], 0.02, '1970-10-10', None),
+]
+EUROPEAN_UNION_MEMBERS = {'Q183': 1958, 'Q142': 1958, 'Q38': 1958, 'Q29999': 1958, 'Q31': 1958, 'Q35': 1973,
+                          'Q29': 1986, 'Q45': 1986, 'Q41': 1981, 'Q34': 1995, 'Q33': 1995, 'Q40': 1995,
+                          'Q36': 2004, 'Q213': 2004}
+# Citizenships that the queries map to countries, leave out, or do not know
+MAPPED_PLACES = 0.02
+EXCLUDED_PLACES = 0.005
+UNKNOWN_PLACES = 0.005
+
+# Share of the articles in each language, written in P407 as one of its variants at times
+LANGUAGES = {'Q1860': 0.82, 'Q1321': 0.03, 'Q188': 0.03, 'Q150': 0.03, 'Q7850': 0.025, 'Q5146': 0.015,
+             'Q5287': 0.01, 'Q7737': 0.01, 'Q652': 0.006, 'Q7411': 0.004, 'Q809': 0.004, 'Q256': 0.003,
+             'Q9176': 0.003, 'Q9043': 0.002, 'Q9288': 0.001}
+VARIANTS = 0.03
+
+FIELDS_OF_STUDY = {
+    'medicine': 0.3, 'biology': 0.15, 'computer science': 0.1, 'chemistry': 0.08, 'physics': 0.07,
+    'engineering': 0.06, 'materials science': 0.04, 'psychology': 0.03, 'environmental science': 0.03,
+    'mathematics': 0.03, 'agricultural and food sciences': 0.02, 'economics': 0.02, 'business': 0.01,
+    'education': 0.01, 'sociology': 0.01, 'geology': 0.01, 'geography': 0.005, 'political science': 0.005,
+    'history': 0.005, 'philosophy': 0.004, 'linguistics': 0.004, 'law': 0.003, 'art': 0.003,
+}
+
+MALE, FEMALE, UNKNOWN_GENDER = f'<{WD}Q6581097>', f'<{WD}Q6581072>', f'<{WD}Q113124952>'
+OTHER_GENDERS = [f'<{WD}Q48270>', f'<{WD}Q1052281>', f'<{WD}Q2449503>']
+
+# ROR types as the dataset writes them (see queries/affiliation/affiliation.py)
+ROR_TYPES = {'<http://www.ror.org/type/education>': 0.5, '<http://www.ror.org/type/healthcare>': 0.12,
+             '<http://www.ror.org/type/company>': 0.1, '<http://www.ror.org/type/facility>': 0.08,
+             '<http://www.ror.org/type/nonprofit>': 0.07, '<http://www.ror.org/type/government>': 0.07,
+             '<http://www.ror.org/type/funder>': 0.03, '<http://www.ror.org/type/other>': 0.02,
+             '<https://divinwd.dev/ror/type/archive>': 0.01}
+ROR_ALPHABET = np.array(list('0123456789abcdefghjkmnpqrstvwxyz'))
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic dataset with the schema of the DivinWD dataset (see database/README.md): '
+                    'pseudonymized articles, authors, statements and organizations, with the distributions and '
+                    'the gaps and conflicts of the real data, at any scale')
+    parser.add_argument('--output', required=True, help='gzipped N-Triples file to write (e.g. divinwd.nt.gz in '
+                                                        'another directory)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help=f'size relative to the dataset: {ARTICLES:,} articles, {AUTHORS:,} authors and '
+                             f'{ORGANIZATIONS:,} organizations at scale 1 (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the dataset (default: 0)')
+    parser.add_argument('--current-year', type=int, default=datetime.date.today().year,
+                        help='publication years grow until this year, and a few articles come after it '
+                             '(default: this year)')
+
+    return parser
+
+
+def pseudonyms(numbers, tag):
+    multiplier = ENTITY_MULTIPLIER if tag == ENTITY_TAG else STATEMENT_MULTIPLIER
+    return (np.asarray(numbers, dtype=np.int64) * multiplier + PSEUDONYM_OFFSET) % PRIME + 1
+
+
+def entity_terms(numbers, tag=ENTITY_TAG):
+    prefix = PSEUDONYM_PREFIXES[tag]
+    return [f'{prefix}{n}>' for n in pseudonyms(numbers, tag).ravel().tolist()]
+
+
+def date_term(year, month=1, day=1):
+    return f'"{year:04d}-{month:02d}-{day:02d}T00:00:00Z"^^<{XSD}dateTime>'
+
+
+def choose(rng, weights, size):
+    # Indexes drawn with the given weights
+    weights = np.asarray(list(weights), dtype=np.float64)
+    return rng.choice(len(weights), size=size, p=weights / weights.sum())
+
+
+def skewed(rng, n, size, exponent=2.0):
+    # Numbers below n, the first ones far more often: a few authors and organizations
+    # have most of the articles and employees
+    return np.minimum((n * rng.random(size) ** exponent).astype(np.int64), n - 1)
+
+
+def variants(mapping):
+    # Variants of each language, from the tables of divinwd/languages.json
+    found = {}
+    for variant, language in mapping.items():
+        found.setdefault(language, []).append(variant)
+    return found
+
+
+class Sizes:
+    def __init__(self, scale):
+        self.articles = max(1, round(ARTICLES * scale))
+        self.authors = max(1, round(AUTHORS * scale))
+        self.organizations = max(1, round(ORGANIZATIONS * scale))
+
+    def entities(self):
+        return self.articles + self.authors + self.organizations
+
+    def author_numbers(self, k):
+        return self.articles + np.asarray(k)
+
+    def organization_numbers(self, k):
+        return self.articles + self.authors + np.asarray(k)
+
+
+def world_triples(sizes):
+    # Countries, their continents and the European Union membership statements, which
+    # are few and fixed
+    lines = []
+    for q, label in CONTINENTS.items():
+        lines.append(f'<{WD}{q}> {LABEL} "{label}"@en .\n')
+    for q, iso, continents, _, inception, dissolved in COUNTRIES:
+        country = f'<{WD}{q}>'
+        if iso is not None:
+            lines.append(f'{country} {ISO_CODE} "{iso}" .\n')
+        for continent in continents:
+            lines.append(f'{country} {CONTINENT} <{WD}{continent}> .\n')
+        if inception is not None:
+            lines.append(f'{country} {INCEPTION} {date_term(*map(int, inception.split("-")))} .\n')
+        if dissolved is not None:
+            lines.append(f'{country} {DISSOLVED} {date_term(*map(int, dissolved.split("-")))} .\n')
+
+    statements = entity_terms(sizes.authors * STATEMENTS_PER_AUTHOR + np.arange(len(EUROPEAN_UNION_MEMBERS)),
+                              STATEMENT_TAG)
+    for statement, (q, year) in zip(statements, EUROPEAN_UNION_MEMBERS.items()):
+        lines.append(f'<{WD}{q}> <{P}P463> {statement} .\n')
+        lines.append(f'{statement} {RDF_TYPE} {BEST_RANK} .\n')
+        lines.append(f'{statement} <{P}statement/P463> {EUROPEAN_UNION} .\n')
+        lines.append(f'{statement} {START_TIME} {date_term(year)} .\n')
+
+    return lines
+
+
+def ror_ids(rng, size):
+    # ROR ids: 0, then 6 characters, then 2 check digits
+    chars = ROR_ALPHABET[rng.integers(len(ROR_ALPHABET), size=(size, 6))]
+    digits = rng.integers(100, size=size)
+    return [f'0{"".join(c)}{d:02d}' for c, d in zip(chars.tolist(), digits.tolist())]
+
+
+def organization_triples(rng, sizes):
+    # Most employers have a ROR id; a few share it with another employer or have two,
+    # and the queries leave them out
+    n = sizes.organizations
+    organizations = entity_terms(sizes.organization_numbers(np.arange(n)))
+    ids = ror_ids(rng, n)
+    has_id = rng.random(n) < 0.7
+    shared = rng.random(n) < 0.01
+    second = rng.random(n) < 0.01
+    countries = choose(rng, [c[3] for c in COUNTRIES], n)
+    types = choose(rng, ROR_TYPES.values(), n)
+    other_types = choose(rng, ROR_TYPES.values(), n)
+    type_terms = list(ROR_TYPES)
+
+    lines = []
+    for k in np.flatnonzero(has_id).tolist():
+        ror_id = ids[k - 1] if shared[k] and k > 0 else ids[k]
+        lines.append(f'{organizations[k]} {ROR_ID} "{ror_id}" .\n')
+        if second[k]:
+            lines.append(f'{organizations[k]} {ROR_ID} "{ids[(k + 1) % n]}" .\n')
+        if shared[k] and k > 0:
+            continue
+        ror = f'<{ROR}org/{ror_id}>'
+        lines.append(f'{ror} {ROR_ORGANIZATION_ID} "{ror_id}" .\n')
+        lines.append(f'{ror} {ROR_TYPE} {type_terms[types[k]]} .\n')
+        if other_types[k] != types[k] and rng.random() < 0.02:
+            lines.append(f'{ror} {ROR_TYPE} {type_terms[other_types[k]]} .\n')
+        lines.append(f'{ror} {ROR_LOCATION} <{WD}{COUNTRIES[countries[k]][0]}> .\n')
+
+    return lines
+
+
+def citizenship_values(rng, countries, size):
+    # Countries of citizenship: mostly the country of the author, at times a place that
+    # the queries map to a country or leave out, or an unknown value (None, for a blank node)
+    places = sorted(COUNTRY_MAPPING)
+    kind = rng.random(size)
+    values = [f'<{WD}{COUNTRIES[c][0]}>' for c in countries.tolist()]
+    for k in np.flatnonzero(kind < MAPPED_PLACES + EXCLUDED_PLACES + UNKNOWN_PLACES).tolist():
+        if kind[k] < MAPPED_PLACES:
+            values[k] = f'<{WD}{places[rng.integers(len(places))]}>'
+        elif kind[k] < MAPPED_PLACES + EXCLUDED_PLACES:
+            values[k] = f'<{WD}{EXCLUDED_COUNTRIES[rng.integers(len(EXCLUDED_COUNTRIES))]}>'
+        else:
+            values[k] = None
+    return values
+
+
+def author_triples(rng, sizes, start, end, current_year):
+    n = end - start
+    k = np.arange(start, end)
+    authors = entity_terms(sizes.author_numbers(k))
+    lines = []
+
+    # A few authors are not humans, which leaves their articles out
+    human = rng.random(n) >= 0.01
+
+    # Gender in Wikidata: none, one, or conflicting values; Genderize guesses it for most
+    gender = choose(rng, [0.38, 0.43, 0.16, 0.01, 0.01, 0.005, 0.005], n)
+    other_gender = rng.integers(len(OTHER_GENDERS), size=n)
+    blank_gender = rng.random(n) < 0.5
+    genderize = rng.random(n) < 0.8
+    genderize_male = np.where(gender == 1, rng.random(n) < 0.92,
+                              np.where(gender == 2, rng.random(n) < 0.08, rng.random(n) < 0.7))
+
+    # Country of the author, for citizenships, Genderize nationalities and employers
+    countries = choose(rng, [c[3] for c in COUNTRIES], n)
+    second_countries = choose(rng, [c[3] for c in COUNTRIES], n)
+    citizenships = choose(rng, [0.7, 0.27, 0.03], n)
+    first_values = citizenship_values(rng, countries, n)
+    second_values = citizenship_values(rng, second_countries, n)
+    nationality = rng.random(n) < 0.7
+    same_nationality = rng.random(n) < 0.8
+    two_nationalities = rng.random(n) < 0.05
+    codes = [c[1] for c in COUNTRIES if c[1] is not None]
+    other_codes = rng.integers(len(codes), size=(n, 2))
+
+    # Careers: citizenships hold from birth, employments for some years
+    career_start = np.maximum(1900, current_year - 1 - rng.geometric(1 / 15, size=n))
+    employers = choose(rng, [0.6, 0.25, 0.1, 0.05], n)
+    organizations = skewed(rng, sizes.organizations, (n, 4))
+    organization_terms = entity_terms(sizes.organization_numbers(organizations.ravel()))
+    employment_start = career_start[:, None] + rng.integers(0, 20, size=(n, 4))
+    employment_months = rng.integers(1, 13, size=(n, 4))
+    employment_years = rng.geometric(1 / 6, size=(n, 4))
+    qualifiers = rng.random((n, 6, 3))
+    statements = entity_terms(k[:, None] * STATEMENTS_PER_AUTHOR + np.arange(STATEMENTS_PER_AUTHOR), STATEMENT_TAG)
+
+    for i in range(n):
+        author = authors[i]
+        if human[i]:
+            lines.append(f'{author} {INSTANCE_OF} {HUMAN} .\n')
+
+        # None, male, female, other, unknown, male and female, other and female
+        g = gender[i]
+        if g == 1 or g == 5:
+            lines.append(f'{author} {GENDER} {MALE} .\n')
+        if g == 2 or g == 5 or g == 6:
+            lines.append(f'{author} {GENDER} {FEMALE} .\n')
+        if g == 3 or g == 6:
+            lines.append(f'{author} {GENDER} {OTHER_GENDERS[other_gender[i]]} .\n')
+        if g == 4:
+            unknown = f'_:gender{start + i}' if blank_gender[i] else UNKNOWN_GENDER
+            lines.append(f'{author} {GENDER} {unknown} .\n')
+        if genderize[i]:
+            lines.append(f'{author} {GENDERIZE_GENDER} "{"male" if genderize_male[i] else "female"}" .\n')
+
+        if nationality[i]:
+            code = COUNTRIES[countries[i]][1] if same_nationality[i] else None
+            lines.append(f'{author} {GENDERIZE_NATIONALITY} "{code or codes[other_codes[i, 0]]}" .\n')
+            if two_nationalities[i]:
+                lines.append(f'{author} {GENDERIZE_NATIONALITY} "{codes[other_codes[i, 1]]}" .\n')
+
+        for j in range(citizenships[i]):
+            statement = statements[i * STATEMENTS_PER_AUTHOR + j]
+            value = (first_values[i] if j == 0 else second_values[i]) or f'_:country{start + i}'
+            lines.append(f'{author} <{P}P27> {statement} .\n')
+            if qualifiers[i, j, 0] < 0.95:
+                lines.append(f'{statement} {RDF_TYPE} {BEST_RANK} .\n')
+            lines.append(f'{statement} <{P}statement/P27> {value} .\n')
+            if qualifiers[i, j, 1] < 0.2:
+                lines.append(f'{statement} {START_TIME} {date_term(int(career_start[i]) - 25)} .\n')
+            if qualifiers[i, j, 2] < 0.1:
+                lines.append(f'{statement} {END_TIME} {date_term(int(career_start[i]) + 10)} .\n')
+
+        for j in range(employers[i]):
+            statement = statements[i * STATEMENTS_PER_AUTHOR + 2 + j]
+            begin = int(employment_start[i, j])
+            lines.append(f'{author} <{P}P108> {statement} .\n')
+            if qualifiers[i, 2 + j, 0] < 0.95:
+                lines.append(f'{statement} {RDF_TYPE} {BEST_RANK} .\n')
+            lines.append(f'{statement} <{P}statement/P108> {organization_terms[i * 4 + j]} .\n')
+            if qualifiers[i, 2 + j, 1] < 0.6:
+                lines.append(f'{statement} {START_TIME} {date_term(begin, int(employment_months[i, j]))} .\n')
+            if qualifiers[i, 2 + j, 2] < 0.4:
+                lines.append(f'{statement} {END_TIME} {date_term(begin + int(employment_years[i, j]))} .\n')
+
+    return lines
+
+
+def publication_years(rng, size, current_year):
+    # The number of articles grows by about 5.5% a year; 1% of them are older, and a few
+    # are announced for the next years
+    years = np.arange(1900, current_year + 1)
+    weights = np.exp(0.055 * (years - current_year))
+    drawn = years[choose(rng, weights, size)]
+    kind = rng.random(size)
+    drawn = np.where(kind < 0.01, rng.integers(1700, 1900, size=size), drawn)
+    return np.where(kind > 0.998, current_year + rng.integers(1, 3, size=size), drawn)
+
+
+def article_triples(rng, sizes, start, end, current_year):
+    n = end - start
+    articles = entity_terms(np.arange(start, end))
+    lines = []
+
+    scholarly = rng.random(n) < 0.97
+    years = publication_years(rng, n, current_year)
+    months, days = rng.integers(1, 13, size=n), rng.integers(1, 29, size=n)
+    precision = rng.random(n)
+    # Several dates: the same year with another precision, or another year (printed and
+    # online editions), which leaves the article out
+    dates = rng.random(n)
+
+    # Authors: a few each, skewed towards prolific authors, and large collaborations
+    counts = np.where(rng.random(n) < 0.01, rng.integers(20, 300, size=n), rng.geometric(0.35, size=n))
+    authors = skewed(rng, sizes.authors, int(counts.sum()))
+    author_terms = entity_terms(sizes.author_numbers(authors))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    name_strings = rng.random(n) < 0.12
+
+    # Languages: most articles are in English; the language is missing from Wikidata or
+    # the external sources at times, given as a variant, or conflicting
+    language_codes = list(LANGUAGES)
+    languages = choose(rng, LANGUAGES.values(), n)
+    other_languages = choose(rng, LANGUAGES.values(), n)
+    wikidata_variants = variants(LANGUAGE_MAPPINGS['wikidata'])
+    external_variants = variants(LANGUAGE_MAPPINGS['external'])
+    language_draws = rng.random((n, 7))
+
+    fields = list(FIELDS_OF_STUDY)
+    field_draws = choose(rng, FIELDS_OF_STUDY.values(), (n, 2))
+    field_kind = rng.random((n, 2))
+
+    for i in range(n):
+        article = articles[i]
+        lines.append(f'{article} {INSTANCE_OF} {SCHOLARLY_ARTICLE if scholarly[i] else THESIS} .\n')
+
+        year = int(years[i])
+        if precision[i] < 0.85:
+            date = date_term(year, int(months[i]), int(days[i]))
+        elif precision[i] < 0.9:
+            date = date_term(year, int(months[i]))
+        else:
+            date = date_term(year)
+        lines.append(f'{article} {PUBLICATION_DATE} {date} .\n')
+        if dates[i] < 0.06:
+            lines.append(f'{article} {PUBLICATION_DATE} {date_term(year)} .\n')
+        elif dates[i] < 0.08:
+            lines.append(f'{article} {PUBLICATION_DATE} {date_term(year + 1, int(months[i]))} .\n')
+
+        for author in sorted(set(author_terms[offsets[i]:offsets[i + 1]])):
+            lines.append(f'{article} {AUTHOR} {author} .\n')
+        if name_strings[i]:
+            lines.append(f'{article} {AUTHOR_NAME_STRING} "author {start + i}" .\n')
+
+        language = language_codes[languages[i]]
+        present, variant, undetermined, conflict, external, external_variant, mixed = language_draws[i]
+        if present < 0.75:
+            choices = wikidata_variants.get(language, [])
+            value = choices[int(variant * len(choices) / VARIANTS)] if choices and variant < VARIANTS else language
+            if undetermined < 0.01:
+                value = UNDETERMINED
+            lines.append(f'{article} {LANGUAGE} <{WD}{value}> .\n')
+            if conflict < 0.02:
+                lines.append(f'{article} {LANGUAGE} <{WD}{language_codes[other_languages[i]]}> .\n')
+        if external < 0.7:
+            choices = external_variants.get(language, [])
+            value = choices[0] if choices and external_variant < VARIANTS else language
+            lines.append(f'{article} {EXTERNAL_LANGUAGE} <{WD}{value}> .\n')
+            if mixed < 0.01 and language != ENGLISH:
+                lines.append(f'{article} {EXTERNAL_LANGUAGE} <{WD}{ENGLISH}> .\n')
+
+        # Fields of study: labelled by Semantic Scholar, else predicted by S2FOS
+        kind = field_kind[i]
+        predicate = FOS_VALUE if kind[0] < 0.6 else FOS_PREDICTION if kind[0] < 0.9 else None
+        if predicate is not None:
+            lines.append(f'{article} {predicate} "{fields[field_draws[i, 0]]}" .\n')
+            if kind[1] < 0.15 and field_draws[i, 1] != field_draws[i, 0]:
+                lines.append(f'{article} {predicate} "{fields[field_draws[i, 1]]}" .\n')
+
+    return lines
+
+
+def write_dataset(path, sizes, seed, current_year):
+    # The dataset is written block by block, each from its own random generator, so that a
+    # seed gives the same file whatever the memory available
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        def write(lines):
+            nonlocal count
+            f.write(''.join(lines))
+            count += len(lines)
+
+        write(world_triples(sizes))
+        write(organization_triples(np.random.default_rng([seed, 0]), sizes))
+        for section, total, triples in ((1, sizes.authors, author_triples), (2, sizes.articles, article_triples)):
+            for block, start in enumerate(range(0, total, BLOCK)):
+                rng = np.random.default_rng([seed, section, block])
+                write(triples(rng, sizes, start, min(start + BLOCK, total), current_year))
+
+    return count
+
+
+def main():
+    parser = get_arg_parser()
+    arguments = parser.parse_args()
+    if arguments.scale <= 0:
+        parser.error('--scale must be positive')
+    sizes = Sizes(arguments.scale)
+    if max(sizes.entities(), sizes.authors * STATEMENTS_PER_AUTHOR + len(EUROPEAN_UNION_MEMBERS)) >= PRIME:
+        parser.error(f'--scale is too large: pseudonyms are numbers below {PRIME:,}')
+
+    start = time.perf_counter()
+    print(f"Writing {sizes.articles:,} articles, {sizes.authors:,} authors and {sizes.organizations:,} "
+          f"organizations...", file=sys.stderr)
+    count = write_dataset(arguments.output, sizes, arguments.seed, arguments.current_year)
+    print(f"Wrote {count:,} triples to {arguments.output} ({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,47 @@
-import requests
 import argparse
+import os
 import sys
 import io
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from divinwd.countries import continent_pattern, country_pattern, excluded_countries
+from divinwd.cube import add_source_arguments, counts_or_exit, parse_source_arguments
+from divinwd.sparql import client_from_arguments, query_or_exit
+
 def get_arg_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--url', required=True, help='SPARQL endpoint URL')
+    add_source_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='select articles and organizations with the triples derived when indexing the dataset '
+                             '(see database/README.md)')
     return parser
 
-def create_figure(matrix_csv, tot_csv):
+def split_counts(csv_text):
+    # Each row counts the authors sharing a set of "citizenship>affiliation" continent
+    # pairs. Expand the sets to count authors per pair, and per citizenship continent:
+    # an author with several pairs for the same citizenship counts once in its total.
+    df = pd.read_csv(io.StringIO(csv_text))
+
+    pairs = df.assign(pair=df['pairs'].str.split('|')).explode('pair')
+    pairs[['ac_label', 'rc_label']] = pairs['pair'].str.split('>', n=1, expand=True)
+
+    df_matrix = pairs.groupby(['ac_label', 'rc_label'], as_index=False)['count'].sum()
+    df_tot = pairs.drop_duplicates(['pairs', 'ac_label']).groupby('ac_label', as_index=False)['count'].sum()
+
+    return df_matrix, df_tot
+
+
+def create_figure(csv_text):
     try:
-        if not matrix_csv or not matrix_csv.strip():
-            raise ValueError("La query Matrix ha restituito un risultato vuoto.")
-        if not tot_csv or not tot_csv.strip():
-            raise ValueError("La query Totali ha restituito un risultato vuoto.")
-            
-        df_matrix_raw = pd.read_csv(io.StringIO(matrix_csv))
-        df_tot_raw = pd.read_csv(io.StringIO(tot_csv))
+        if not csv_text or not csv_text.strip():
+            raise ValueError("The query returned an empty result.")
+
+        df_matrix_raw, df_tot_raw = split_counts(csv_text)
     except (pd.errors.EmptyDataError, ValueError) as e:
-        print(f"Errore nel processare i CSV: {e}", file=sys.stderr)
+        print(f"Error while processing the CSV: {e}", file=sys.stderr)
         return
 
     df_abs = df_matrix_raw.pivot(index='ac_label', columns='rc_label', values='count').fillna(0)
@@ -80,38 +100,49 @@ def create_figure(matrix_csv, tot_csv):
     plt.savefig('figure.png', format='png', bbox_inches='tight', dpi=300)
 
 
-def query_endpoint(url, query):
-    headers = {
-        "Accept": "text/csv",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "User-Agent": "Python-Viz-Script/1.0"
-    }
+# Articles of the dataset: scholarly articles with a single publication year, whose
+# authors are all humans listed as Wikidata entities
+ARTICLES = """                    {
+                        SELECT ?article (MIN(?publicationDate) AS ?articlePublicationDate) WHERE {
+                            ?article wdt:P31 wd:Q13442814 ; wdt:P577 ?publicationDate ; wdt:P50 [ wdt:P31 wd:Q5 ] .
+
+                            FILTER (YEAR(?publicationDate) <= YEAR(NOW()))
+                            MINUS { ?article wdt:P2093 ?authorNameString . }
+                            MINUS {
+                                ?article wdt:P50 ?x .
+                                FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
+                            }
+                        }
+                        GROUP BY ?article
+                        HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && 2010 <= YEAR(?articlePublicationDate) && YEAR(?articlePublicationDate) <= 2024)
+                    }"""
+
+# The same articles, read from the triples derived from the dataset when it is indexed
+# (see database/README.md), without the grouping and MINUS clauses above
+ARTICLES_DERIVED = """                    ?article divinwd:eligibleDate ?articlePublicationDate .
+                    FILTER (2010 <= YEAR(?articlePublicationDate) && YEAR(?articlePublicationDate) <= 2024)"""
+
+# Organizations with a single ROR id that no other organization has, and their ROR
+# organization (entities have exactly one id that is not shared with other organizations)
+ROR_ORGANIZATIONS = """                    {
+                        SELECT (SAMPLE(?organization) AS ?org) ?rorid WHERE {
+                            SELECT ?organization (SAMPLE(?roridValue) AS ?rorid) WHERE { ?organization wdt:P6782 ?roridValue . }
+                            GROUP BY ?organization HAVING (COUNT(DISTINCT ?roridValue) = 1)
+                        }
+                        GROUP BY ?rorid
+                        HAVING (COUNT(DISTINCT ?organization) = 1)
+                    }
+                    ?org wdt:P6782 ?rorid .
+                    ?rorOrganization ror:id ?rorid ."""
 
-    data = {
-        "query": query,
-        "format": "text/csv"
-    }
+# The same organizations, read from the triples derived from the dataset when it is indexed
+ROR_ORGANIZATIONS_DERIVED = """                    ?org divinwd:rorOrganization ?rorOrganization ."""
 
-    try:
-        response = requests.post(url, headers=headers, data=data, timeout=300)
-        response.raise_for_status()
-        return response.text
-
-    except requests.ConnectionError:
-        print(f"Unable to connect to the server {url}.", file=sys.stderr)
-        sys.exit(1)
-    except requests.Timeout:
-        print("Error: Timeout.", file=sys.stderr)
-        sys.exit(1)
-    except requests.RequestException as e:
-        print(f"HTTP error: {str(e)}", file=sys.stderr)
-        # Se c'è una risposta del server (es. errore SPARQL), stampiamola
-        if e.response is not None:
-             print(f"Server details: {e.response.text}", file=sys.stderr)
-        sys.exit(1)
-
-
-QUERY_MATRIX = """
+
+# Each author contributes the set of (citizenship continent, affiliation continent) pairs
+# found for them. Counting authors per set evaluates the expensive pattern once, and both
+# the authors per pair and the authors per citizenship continent follow exactly.
+QUERY = """
 PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
 PREFIX wikibase: <http://wikiba.se/ontology#>
 PREFIX wd: <http://www.wikidata.org/entity/>
@@ -122,316 +153,107 @@ PREFIX pq: <http://www.wikidata.org/prop/qualifier/>
 PREFIX ror: <https://divinwd.dev/ror/>
 PREFIX genz: <https://divinwd.dev/genderize/>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX divinwd: <https://divinwd.dev/derived/>
 
-SELECT ?ac_label ?rc_label (COUNT(DISTINCT ?author) AS ?count) WHERE {
+SELECT ?pairs (COUNT(?author) AS ?count) WHERE {
     {
-        SELECT DISTINCT ?author ?authorContinent ?rorContinent WHERE {
+        SELECT ?author (GROUP_CONCAT(DISTINCT ?pair; SEPARATOR="|") AS ?pairs) WHERE {
             {
-                SELECT ?article (MIN(?publicationDate) AS ?articlePublicationDate) WHERE {
-                    ?article wdt:P31 wd:Q13442814 ; wdt:P577 ?publicationDate ; wdt:P50 [ wdt:P31 wd:Q5 ] .
-
-                    FILTER (YEAR(?publicationDate) <= YEAR(NOW()))
-                    MINUS { ?article wdt:P2093 ?authorNameString . }
-                    MINUS {
-                        ?article wdt:P50 ?x .
-                        FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
+                SELECT DISTINCT ?author ?authorContinent ?rorContinent WHERE {
+""" + ARTICLES + """
+                    BIND (YEAR(?articlePublicationDate) AS ?year)
+
+                    ?article wdt:P50 ?author .
+
+                    # Find nationality in Wikidata
+                    OPTIONAL {
+                        ?author p:P27 ?citizenship .
+                        ?citizenship rdf:type wikibase:BestRank .
+                        OPTIONAL { ?citizenship pq:P580 ?citizenship_startTime . }
+                        OPTIONAL { ?citizenship pq:P582 ?citizenship_endTime . }
+                        FILTER (
+                            (!BOUND(?citizenship_startTime) || ?citizenship_startTime <= ?articlePublicationDate) &&
+                            (!BOUND(?citizenship_endTime) || ?citizenship_endTime > ?articlePublicationDate)
+                        )
+                        ?citizenship ps:P27 ?wd_country_value .
+                        FILTER (!ISBLANK(?wd_country_value) && ?wd_country_value NOT IN (""" + excluded_countries() + """))
+                        OPTIONAL { ?wd_country_value wdt:571 ?country_Inception . }
+                        FILTER (!BOUND(?country_Inception) || ?articlePublicationDate >= ?country_Inception)
+                        OPTIONAL { ?wd_country_value wdt:P576 ?country_EndDate . }
+                        FILTER (!BOUND(?country_EndDate) || ?articlePublicationDate < ?country_EndDate)
                     }
-                }
-                GROUP BY ?article
-                HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && 2010 <= YEAR(?articlePublicationDate) && YEAR(?articlePublicationDate) <= 2024)
-            }
-            BIND (YEAR(?articlePublicationDate) AS ?year)
-
-            ?article wdt:P50 ?author .
-
-            # Find nationality in Wikidata
-            OPTIONAL {
-                ?author p:P27 ?citizenship .
-                ?citizenship rdf:type wikibase:BestRank .
-                OPTIONAL { ?citizenship pq:P580 ?citizenship_startTime . }
-                OPTIONAL { ?citizenship pq:P582 ?citizenship_endTime . }
-                FILTER (
-                    (!BOUND(?citizenship_startTime) || ?citizenship_startTime <= ?articlePublicationDate) &&
-                    (!BOUND(?citizenship_endTime) || ?citizenship_endTime > ?articlePublicationDate)
-                )
-                ?citizenship ps:P27 ?wd_country_value .
-                FILTER (!ISBLANK(?wd_country_value) && ?wd_country_value NOT IN (
-                    wd:Q18097, wd:Q1152445, wd:Q1128483, wd:Q108746595, wd:Q223050
-                ))
-                OPTIONAL { ?wd_country_value wdt:571 ?country_Inception . }
-                FILTER (!BOUND(?country_Inception) || ?articlePublicationDate >= ?country_Inception)
-                OPTIONAL { ?wd_country_value wdt:P576 ?country_EndDate . }
-                FILTER (!BOUND(?country_EndDate) || ?articlePublicationDate < ?country_EndDate)
-            }
 
-            # Find nationality in Genderize
-            OPTIONAL {
-                ?author genz:nationality ?iso .
-                ?genderize_country_value wdt:P297 ?iso .
-                OPTIONAL { ?genderize_country_value wdt:571 ?country_Inception . }
-                FILTER (!BOUND(?country_Inception) || ?articlePublicationDate >= ?country_Inception)
-                OPTIONAL { ?genderize_country_value wdt:P576 ?country_EndDate . }
-                FILTER (!BOUND(?country_EndDate) || ?articlePublicationDate < ?country_EndDate)
-            }
+                    # Find nationality in Genderize
+                    OPTIONAL {
+                        ?author genz:nationality ?iso .
+                        ?genderize_country_value wdt:P297 ?iso .
+                        OPTIONAL { ?genderize_country_value wdt:571 ?country_Inception . }
+                        FILTER (!BOUND(?country_Inception) || ?articlePublicationDate >= ?country_Inception)
+                        OPTIONAL { ?genderize_country_value wdt:P576 ?country_EndDate . }
+                        FILTER (!BOUND(?country_EndDate) || ?articlePublicationDate < ?country_EndDate)
+                    }
 
-            BIND (COALESCE(?wd_country_value, ?genderize_country_value, "unknown") AS ?country_value)
-
-            BIND (
-                COALESCE(
-                    IF(?country_value = wd:Q55, wd:Q29999, 1/0), 
-                    IF(?country_value = wd:Q756617, wd:Q35, 1/0), 
-                    IF(?country_value IN (wd:Q21, wd:Q22, wd:Q25, wd:Q42406), wd:Q145, 1/0), 
-                    IF(?country_value = wd:Q15124, wd:Q38, 1/0), 
-                    IF(?country_value = wd:Q188736, wd:Q225, 1/0), 
-                    IF(?country_value IN (wd:Q29520, wd:Q14773), wd:Q148, 1/0), 
-                    IF(?country_value = wd:Q1335, wd:Q77, 1/0), 
-                    IF(?country_value = wd:Q320015, wd:Q739, 1/0), 
-                    IF(?country_value = wd:Q205784, wd:Q717, 1/0), 
-                    IF(?country_value = wd:Q1018839, wd:Q30, 1/0), 
-                    IF(?country_value = wd:Q47588, wd:Q29, 1/0), 
-                    IF(?country_value = wd:Q5689, wd:Q33, 1/0), 
-                    ?country_value 
-                ) AS ?authorCountry
-            )
-
-            OPTIONAL {
-                ?authorCountry wdt:P30 ?continent_value .
-                FILTER (?continent_value IN (wd:Q15, wd:Q18, wd:Q46, wd:Q48, wd:Q49, wd:Q55643))
-                BIND (
-                    COALESCE(
-                        IF(?authorCountry = wd:Q23681, wd:Q48, 1/0), 
-                        IF(?authorCountry = wd:Q804, wd:Q49, 1/0), 
-                        IF(?authorCountry = wd:Q730, wd:Q18, 1/0), 
-                        ?continent_value
-                    ) AS ?continentDirect
-                )
-            }
-            BIND (
-                IF(BOUND(?continentDirect), ?continentDirect, COALESCE(
-                    IF(?authorCountry IN (wd:Q26988, wd:Q712, wd:Q691, wd:Q683, wd:Q678), wd:Q55643, 1/0)
-                )) AS ?continent
-            )
-            BIND (COALESCE(?continent, "unknown") AS ?authorContinent)
-
-            ### Affiliation ###
-            ?author p:P108 ?employment .
-            ?employment rdf:type wikibase:BestRank .
-            OPTIONAL { ?employment pq:P580 ?employment_startTime . }
-            OPTIONAL { ?employment pq:P582 ?employment_endTime . }
-            FILTER (
-                (BOUND(?employment_startTime) || BOUND(?employment_endTime)) &&
-                (!ISBLANK(?employment_startTime) || !ISBLANK(?employment_endTime)) &&
-                (!BOUND(?employment_startTime) || ?employment_startTime <= ?articlePublicationDate) &&
-                (!BOUND(?employment_endTime) || ?employment_endTime > ?articlePublicationDate)
-            )
-
-            ?employment ps:P108 ?org .
-            {
-                SELECT (SAMPLE(?organization) AS ?org) ?rorid WHERE {
-                    SELECT ?organization (SAMPLE(?roridValue) AS ?rorid) WHERE { ?organization wdt:P6782 ?roridValue . }
-                    GROUP BY ?organization HAVING (COUNT(DISTINCT ?roridValue) = 1)
-                }
-                GROUP BY ?rorid
-                HAVING (COUNT(DISTINCT ?organization) = 1)
-            }
-            ?org wdt:P6782 ?rorid .
-            ?rorOrganization ror:id ?rorid .
-            ?rorOrganization ror:location ?rorLocation .
-
-            OPTIONAL {
-                ?rorLocation wdt:P30 ?continent_value_ror .
-                FILTER (?continent_value_ror IN (wd:Q15, wd:Q18, wd:Q46, wd:Q48, wd:Q49, wd:Q55643))
-                BIND (
-                    COALESCE(
-                        IF(?rorLocation = wd:Q23681, wd:Q48, 1/0), 
-                        IF(?rorLocation = wd:Q804, wd:Q49, 1/0), 
-                        IF(?rorLocation = wd:Q730, wd:Q18, 1/0), 
-                        ?continent_value_ror
-                    ) AS ?continentDirect_ror
-                )
-            }
-            BIND (
-                IF(BOUND(?continentDirect_ror), ?continentDirect_ror, COALESCE(
-                    IF(?rorLocation IN (wd:Q26988, wd:Q712, wd:Q691, wd:Q683, wd:Q678), wd:Q55643, 1/0)
-                )) AS ?continent_ror
-            )
-            BIND (COALESCE(?continent_ror, "unknown") AS ?rorContinent)
-        }
-    }
-    FILTER (?authorContinent != "unknown" && ?rorContinent != "unknown")
+                    BIND (COALESCE(?wd_country_value, ?genderize_country_value, "unknown") AS ?country_value)
 
-    ?authorContinent rdfs:label ?ac_label .
-    FILTER (LANG(?ac_label) = "en")
-    ?rorContinent rdfs:label ?rc_label .
-    FILTER (LANG(?rc_label) = "en")
-}
-GROUP BY ?ac_label ?rc_label
-ORDER BY ?ac_label ?rc_label
-"""
+""" + country_pattern('country_value', 'authorCountry', '                    ') + """
 
-QUERY_TOT_AFF_CITIZENS = """
-PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-PREFIX wikibase: <http://wikiba.se/ontology#>
-PREFIX wd: <http://www.wikidata.org/entity/>
-PREFIX wdt: <http://www.wikidata.org/prop/direct/>
-PREFIX p: <http://www.wikidata.org/prop/>
-PREFIX ps: <http://www.wikidata.org/prop/statement/>
-PREFIX pq: <http://www.wikidata.org/prop/qualifier/>
-PREFIX ror: <https://divinwd.dev/ror/>
-PREFIX genz: <https://divinwd.dev/genderize/>
-PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+""" + continent_pattern('authorCountry', 'continent', '                    ') + """
+                    BIND (COALESCE(?continent, "unknown") AS ?authorContinent)
 
-SELECT ?ac_label (COUNT(DISTINCT ?author) AS ?count) WHERE {
-{
-SELECT DISTINCT ?author ?authorContinent ?rorContinent WHERE {
-    {
-        SELECT ?article (MIN(?publicationDate) AS ?articlePublicationDate) WHERE {
-            ?article wdt:P31 wd:Q13442814 ; wdt:P577 ?publicationDate ; wdt:P50 [ wdt:P31 wd:Q5 ] .
-
-            FILTER (YEAR(?publicationDate) <= YEAR(NOW()))
-            MINUS { ?article wdt:P2093 ?authorNameString . }
-            MINUS {
-                ?article wdt:P50 ?x .
-                FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
-            }
-        }
-        GROUP BY ?article
-        HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && 2010 <= YEAR(?articlePublicationDate) && YEAR(?articlePublicationDate) <= 2024)
-    }
-    BIND (YEAR(?articlePublicationDate) AS ?year)
-
-    ?article wdt:P50 ?author .
-
-    # Find nationality in Wikidata
-    OPTIONAL {
-        ?author p:P27 ?citizenship .
-        ?citizenship rdf:type wikibase:BestRank .
-        OPTIONAL { ?citizenship pq:P580 ?citizenship_startTime . }
-        OPTIONAL { ?citizenship pq:P582 ?citizenship_endTime . }
-        FILTER (
-            (!BOUND(?citizenship_startTime) || ?citizenship_startTime <= ?articlePublicationDate) &&
-            (!BOUND(?citizenship_endTime) || ?citizenship_endTime > ?articlePublicationDate)
-        )
-        ?citizenship ps:P27 ?wd_country_value .
-        FILTER (!ISBLANK(?wd_country_value) && ?wd_country_value NOT IN (
-            wd:Q18097, wd:Q1152445, wd:Q1128483, wd:Q108746595, wd:Q223050
-        ))
-        OPTIONAL { ?wd_country_value wdt:571 ?country_Inception . }
-        FILTER (!BOUND(?country_Inception) || ?articlePublicationDate >= ?country_Inception)
-        OPTIONAL { ?wd_country_value wdt:P576 ?country_EndDate . }
-        FILTER (!BOUND(?country_EndDate) || ?articlePublicationDate < ?country_EndDate)
-    }
+                    ### Affiliation ###
+                    ?author p:P108 ?employment .
+                    ?employment rdf:type wikibase:BestRank .
+                    OPTIONAL { ?employment pq:P580 ?employment_startTime . }
+                    OPTIONAL { ?employment pq:P582 ?employment_endTime . }
+                    FILTER (
+                        (BOUND(?employment_startTime) || BOUND(?employment_endTime)) &&
+                        (!ISBLANK(?employment_startTime) || !ISBLANK(?employment_endTime)) &&
+                        (!BOUND(?employment_startTime) || ?employment_startTime <= ?articlePublicationDate) &&
+                        (!BOUND(?employment_endTime) || ?employment_endTime > ?articlePublicationDate)
+                    )
 
-    # Find nationality in Genderize
-    OPTIONAL {
-        ?author genz:nationality ?iso .
-        ?genderize_country_value wdt:P297 ?iso .
-        OPTIONAL { ?genderize_country_value wdt:571 ?country_Inception . }
-        FILTER (!BOUND(?country_Inception) || ?articlePublicationDate >= ?country_Inception)
-        OPTIONAL { ?genderize_country_value wdt:P576 ?country_EndDate . }
-        FILTER (!BOUND(?country_EndDate) || ?articlePublicationDate < ?country_EndDate)
-    }
-    BIND (COALESCE(?wd_country_value, ?genderize_country_value, "unknown") AS ?country_value)
-
-    BIND (
-        COALESCE(
-            IF(?country_value = wd:Q55, wd:Q29999, 1/0), 
-            IF(?country_value = wd:Q756617, wd:Q35, 1/0), 
-            IF(?country_value IN (wd:Q21, wd:Q22, wd:Q25, wd:Q42406), wd:Q145, 1/0), 
-            IF(?country_value = wd:Q15124, wd:Q38, 1/0), 
-            IF(?country_value = wd:Q188736, wd:Q225, 1/0), 
-            IF(?country_value IN (wd:Q29520, wd:Q14773), wd:Q148, 1/0), 
-            IF(?country_value = wd:Q1335, wd:Q77, 1/0), 
-            IF(?country_value = wd:Q320015, wd:Q739, 1/0), 
-            IF(?country_value = wd:Q205784, wd:Q717, 1/0), 
-            IF(?country_value = wd:Q1018839, wd:Q30, 1/0), 
-            IF(?country_value = wd:Q47588, wd:Q29, 1/0), 
-            IF(?country_value = wd:Q5689, wd:Q33, 1/0), 
-            ?country_value 
-        ) AS ?authorCountry
-    )
+                    ?employment ps:P108 ?org .
+""" + ROR_ORGANIZATIONS + """
+                    ?rorOrganization ror:location ?rorLocation .
 
-    OPTIONAL {
-        ?authorCountry wdt:P30 ?continent_value .
-        FILTER (?continent_value IN (wd:Q15, wd:Q18, wd:Q46, wd:Q48, wd:Q49, wd:Q55643))
-        BIND (
-            COALESCE(
-                IF(?authorCountry = wd:Q23681, wd:Q48, 1/0), 
-                IF(?authorCountry = wd:Q804, wd:Q49, 1/0), 
-                IF(?authorCountry = wd:Q730, wd:Q18, 1/0), 
-                ?continent_value
-            ) AS ?continentDirect
-        )
-    }
-    BIND (
-        IF(BOUND(?continentDirect), ?continentDirect, COALESCE(
-            IF(?authorCountry IN (wd:Q26988, wd:Q712, wd:Q691, wd:Q683, wd:Q678), wd:Q55643, 1/0)
-        )) AS ?continent
-    )
-    BIND (COALESCE(?continent, "unknown") AS ?authorContinent)
-
-    ### Affiliation ###
-    ?author p:P108 ?employment .
-    ?employment rdf:type wikibase:BestRank .
-    OPTIONAL { ?employment pq:P580 ?employment_startTime . }
-    OPTIONAL { ?employment pq:P582 ?employment_endTime . }
-    FILTER (
-        (BOUND(?employment_startTime) || BOUND(?employment_endTime)) &&
-        (!ISBLANK(?employment_startTime) || !ISBLANK(?employment_endTime)) &&
-        (!BOUND(?employment_startTime) || ?employment_startTime <= ?articlePublicationDate) &&
-        (!BOUND(?employment_endTime) || ?employment_endTime > ?articlePublicationDate)
-    )
+""" + continent_pattern('rorLocation', 'continent_ror', '                    ') + """
+                    BIND (COALESCE(?continent_ror, "unknown") AS ?rorContinent)
+                }
+            }
+            FILTER (?authorContinent != "unknown" && ?rorContinent != "unknown")
 
-    ?employment ps:P108 ?org .
-    {
-        SELECT (SAMPLE(?organization) AS ?org) ?rorid WHERE {
-            SELECT ?organization (SAMPLE(?roridValue) AS ?rorid) WHERE { ?organization wdt:P6782 ?roridValue . }
-            GROUP BY ?organization HAVING (COUNT(DISTINCT ?roridValue) = 1)
+            ?authorContinent rdfs:label ?ac_label .
+            FILTER (LANG(?ac_label) = "en")
+            ?rorContinent rdfs:label ?rc_label .
+            FILTER (LANG(?rc_label) = "en")
+
+            BIND (CONCAT(STR(?ac_label), ">", STR(?rc_label)) AS ?pair)
         }
-        GROUP BY ?rorid
-        HAVING (COUNT(DISTINCT ?organization) = 1)
+        GROUP BY ?author
     }
-    ?org wdt:P6782 ?rorid .
-    ?rorOrganization ror:id ?rorid .
-    ?rorOrganization ror:location ?rorLocation .
-
-    OPTIONAL {
-        ?rorLocation wdt:P30 ?continent_value_ror .
-        FILTER (?continent_value_ror IN (wd:Q15, wd:Q18, wd:Q46, wd:Q48, wd:Q49, wd:Q55643))
-        BIND (
-            COALESCE(
-                IF(?rorLocation = wd:Q23681, wd:Q48, 1/0), 
-                IF(?rorLocation = wd:Q804, wd:Q49, 1/0), 
-                IF(?rorLocation = wd:Q730, wd:Q18, 1/0), 
-                ?continent_value_ror
-            ) AS ?continentDirect_ror
-        )
-    }
-    BIND (
-        IF(BOUND(?continentDirect_ror), ?continentDirect_ror, COALESCE(
-            IF(?rorLocation IN (wd:Q26988, wd:Q712, wd:Q691, wd:Q683, wd:Q678), wd:Q55643, 1/0)
-        )) AS ?continent_ror
-    )
-    BIND (COALESCE(?continent_ror, "unknown") AS ?rorContinent)
-}
-}
-FILTER (?authorContinent != "unknown" && ?rorContinent != "unknown")
-?authorContinent rdfs:label ?ac_label .
-FILTER (LANG(?ac_label) = "en")
 }
-GROUP BY ?ac_label
-ORDER BY ?ac_label
+GROUP BY ?pairs
 """
 
+QUERY_DERIVED = QUERY.replace(ARTICLES, ARTICLES_DERIVED).replace(ROR_ORGANIZATIONS, ROR_ORGANIZATIONS_DERIVED)
+
+
+def cube_counts(cube):
+    # The result of QUERY, from a cube built by `python -m divinwd.cube`
+    return cube.continent_pairs()
+
 
 def main():
-    arguments = get_arg_parser().parse_args()
+    arguments = parse_source_arguments(get_arg_parser())
 
-    print(f"Waiting for response...")
-    matrix = query_endpoint(arguments.url, QUERY_MATRIX)
-    tot = query_endpoint(arguments.url, QUERY_TOT_AFF_CITIZENS)
+    if arguments.cube:
+        csv_text = counts_or_exit(arguments.cube, cube_counts).to_csv(index=False)
+    else:
+        print(f"Waiting for response...")
+        with client_from_arguments(arguments) as client:
+            csv_text = query_or_exit(client, QUERY_DERIVED if arguments.derived else QUERY)
 
-    create_figure(matrix, tot)
+    create_figure(csv_text)
 
 
 if __name__ == '__main__':
@@ -1,14 +1,21 @@
-import requests
 import argparse
+import os
 import sys
 import io
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from divinwd.cube import add_source_arguments, counts_or_exit, parse_source_arguments
+from divinwd.sparql import client_from_arguments, query_or_exit
+
 
 def get_arg_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--url', required=True, help='SPARQL endpoint URL')
+    add_source_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='select articles and organizations with the triples derived when indexing the dataset '
+                             '(see database/README.md)')
 
     return parser
 
@@ -78,18 +85,9 @@ def create_figure(res):
     plt.savefig('figure.png', format='png', bbox_inches='tight', dpi=600)
 
 
-QUERY = """
-PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-PREFIX wikibase: <http://wikiba.se/ontology#>
-PREFIX wd: <http://www.wikidata.org/entity/>
-PREFIX wdt: <http://www.wikidata.org/prop/direct/>
-PREFIX p: <http://www.wikidata.org/prop/>
-PREFIX ps: <http://www.wikidata.org/prop/statement/>
-PREFIX pq: <http://www.wikidata.org/prop/qualifier/>
-PREFIX ror: <https://divinwd.dev/ror/>
-
-SELECT ?year ?rorType (COUNT(DISTINCT ?author) AS ?author_count) WHERE {
-    {
+# Articles of the dataset: scholarly articles with a single publication year, whose
+# authors are all humans listed as Wikidata entities
+ARTICLES = """    {
         SELECT ?article (MIN(?publicationDate) AS ?articlePublicationDate) WHERE {
             ?article wdt:P31 wd:Q13442814 ;
                     wdt:P577 ?publicationDate ;
@@ -104,7 +102,43 @@ SELECT ?year ?rorType (COUNT(DISTINCT ?author) AS ?author_count) WHERE {
         }
         GROUP BY ?article
         HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && 2010 <= YEAR(?articlePublicationDate) && YEAR(?articlePublicationDate) <= 2024)
+    }"""
+
+# The same articles, read from the triples derived from the dataset when it is indexed
+# (see database/README.md), without the grouping and MINUS clauses above
+ARTICLES_DERIVED = """    ?article divinwd:eligibleDate ?articlePublicationDate .
+    FILTER (2010 <= YEAR(?articlePublicationDate) && YEAR(?articlePublicationDate) <= 2024)"""
+
+# Organizations with a single ROR id that no other organization has, and their ROR
+# organization (entities have exactly one id that is not shared with other organizations)
+ROR_ORGANIZATIONS = """    {
+        SELECT (SAMPLE(?organization) AS ?org) ?rorid WHERE {
+            SELECT ?organization (SAMPLE(?roridValue) AS ?rorid) WHERE { ?organization wdt:P6782 ?roridValue . }
+            GROUP BY ?organization HAVING (COUNT(DISTINCT ?roridValue) = 1)
+        }
+        GROUP BY ?rorid
+        HAVING (COUNT(DISTINCT ?organization) = 1)
     }
+    ?org wdt:P6782 ?rorid .
+    ?rorOrganization ror:id ?rorid ."""
+
+# The same organizations, read from the triples derived from the dataset when it is indexed
+ROR_ORGANIZATIONS_DERIVED = """    ?org divinwd:rorOrganization ?rorOrganization ."""
+
+
+QUERY = """
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX wikibase: <http://wikiba.se/ontology#>
+PREFIX wd: <http://www.wikidata.org/entity/>
+PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+PREFIX p: <http://www.wikidata.org/prop/>
+PREFIX ps: <http://www.wikidata.org/prop/statement/>
+PREFIX pq: <http://www.wikidata.org/prop/qualifier/>
+PREFIX ror: <https://divinwd.dev/ror/>
+PREFIX divinwd: <https://divinwd.dev/derived/>
+
+SELECT ?year ?rorType (COUNT(DISTINCT ?author) AS ?author_count) WHERE {
+""" + ARTICLES + """
     BIND (YEAR(?articlePublicationDate) AS ?year)
 
 
@@ -121,47 +155,32 @@ SELECT ?year ?rorType (COUNT(DISTINCT ?author) AS ?author_count) WHERE {
 	)
 
     ?employment ps:P108 ?org .
-    # Select only organizations with a unique ror id (entities have exactly one id that is not shared with other organizations)
-    {
-        SELECT (SAMPLE(?organization) AS ?org) ?rorid WHERE {
-            SELECT ?organization (SAMPLE(?roridValue) AS ?rorid) WHERE { ?organization wdt:P6782 ?roridValue . }
-            GROUP BY ?organization HAVING (COUNT(DISTINCT ?roridValue) = 1)
-        }
-        GROUP BY ?rorid
-        HAVING (COUNT(DISTINCT ?organization) = 1)
-    }
-    ?org wdt:P6782 ?rorid .
-
-    ?rorOrganization ror:id ?rorid .
+""" + ROR_ORGANIZATIONS + """
     ?rorOrganization ror:type ?rorType .
 }
 GROUP BY ?year ?rorType
 """
 
+QUERY_DERIVED = QUERY.replace(ARTICLES, ARTICLES_DERIVED).replace(ROR_ORGANIZATIONS, ROR_ORGANIZATIONS_DERIVED)
 
-def query_endpoint(url, query):
-    headers = {"Accept": "text/csv"}
-    params = {"query": query, "format": "text/csv"}
 
-    print("Waiting for response...")
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        return response.text
-    except requests.ConnectionError:
-        print("Error: Failed to connect to the server. Check the URL (is the server up?)", file=sys.stderr)
-        sys.exit(1)
-    except requests.Timeout:
-        print("Error: Request timed out. The server took too long to respond.", file=sys.stderr)
-        sys.exit(1)
-    except requests.RequestException as e:
-        print(f"Error: An error occurred while making the request: {str(e)}", file=sys.stderr)
-        sys.exit(1)
+def cube_counts(cube):
+    # The result of QUERY, from a cube built by `python -m divinwd.cube`
+    df = cube.slice('authors', ['year', 'ror_type'], where={'year': range(2010, 2025)})
+    return df[df['ror_type'] != 'unknown'].rename(columns={'ror_type': 'rorType'})
 
 
 def main():
-    arguments = get_arg_parser().parse_args()
-    res = query_endpoint(arguments.url, QUERY)
+    arguments = parse_source_arguments(get_arg_parser())
+
+    if arguments.cube:
+        # Authors without a ROR organization are not counted by the query
+        res = counts_or_exit(arguments.cube, cube_counts).to_csv(index=False)
+    else:
+        print("Waiting for response...")
+        with client_from_arguments(arguments) as client:
+            res = query_or_exit(client, QUERY_DERIVED if arguments.derived else QUERY)
+
     create_figure(res)
 
 
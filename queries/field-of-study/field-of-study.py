@@ -1,5 +1,5 @@
-import requests
 import argparse
+import os
 import sys
 import io
 import numpy as np
@@ -8,10 +8,16 @@ import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import math
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from divinwd.cube import add_source_arguments, counts_or_exit, parse_source_arguments
+from divinwd.sparql import client_from_arguments, query_or_exit
+
 
 def get_arg_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--url', required=True, help='SPARQL endpoint URL')
+    add_source_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='select articles with the triples derived when indexing the dataset (see database/README.md)')
 
     return parser
 
@@ -75,12 +81,9 @@ def create_figure(csv_text):
     fig.savefig('figure.png', dpi=600)
 
 
-QUERY = """
-PREFIX wd: <http://www.wikidata.org/entity/>
-PREFIX wdt: <http://www.wikidata.org/prop/direct/>
-PREFIX s2fos: <https://divinwd.dev/semanticscholar/fos/>
-SELECT ?field_of_study (COUNT(DISTINCT ?article) AS ?article_count) WHERE {
-    {
+# Articles of the dataset: scholarly articles with a single publication year, whose
+# authors are all humans listed as Wikidata entities
+ARTICLES = """    {
         SELECT ?article (YEAR(MIN(?publicationDate)) AS ?year) WHERE {
             ?article wdt:P31 wd:Q13442814 ;
                      wdt:P577 ?publicationDate ;
@@ -94,7 +97,20 @@ SELECT ?field_of_study (COUNT(DISTINCT ?article) AS ?article_count) WHERE {
         }
         GROUP BY ?article
         HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && ?year <= YEAR(NOW()))
-    }
+    }"""
+
+# The same articles, read from the triples derived from the dataset when it is indexed
+# (see database/README.md), without the grouping and MINUS clauses above
+ARTICLES_DERIVED = """    ?article divinwd:eligibleYear ?year ."""
+
+
+QUERY = """
+PREFIX wd: <http://www.wikidata.org/entity/>
+PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+PREFIX s2fos: <https://divinwd.dev/semanticscholar/fos/>
+PREFIX divinwd: <https://divinwd.dev/derived/>
+SELECT ?field_of_study (COUNT(DISTINCT ?article) AS ?article_count) WHERE {
+""" + ARTICLES + """
 
     # Fetch field of study from external data sources
     OPTIONAL {
@@ -110,28 +126,23 @@ GROUP BY ?field_of_study
 ORDER BY DESC(?article_count)
 """
 
+QUERY_DERIVED = QUERY.replace(ARTICLES, ARTICLES_DERIVED)
+
+
+def cube_counts(cube):
+    # The result of QUERY, from a cube built by `python -m divinwd.cube`
+    return cube.slice('articles', ['field_of_study']).sort_values('article_count', ascending=False)
+
 
 def main():
-    arguments = get_arg_parser().parse_args()
-
-    url = arguments.url
-    headers = {"Accept": "text/csv"}
-    params = {"query": QUERY, "format": "text/csv"}
-
-    print("Waiting for response...")
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        csv_text = response.text
-    except requests.ConnectionError:
-        print("Error: Failed to connect to the server. Check the URL (is the server up?)", file=sys.stderr)
-        sys.exit(1)
-    except requests.Timeout:
-        print("Error: Request timed out. The server took too long to respond.", file=sys.stderr)
-        sys.exit(1)
-    except requests.RequestException as e:
-        print(f"Error: An error occurred while making the request: {str(e)}", file=sys.stderr)
-        sys.exit(1)
+    arguments = parse_source_arguments(get_arg_parser())
+
+    if arguments.cube:
+        csv_text = counts_or_exit(arguments.cube, cube_counts).to_csv(index=False)
+    else:
+        print("Waiting for response...")
+        with client_from_arguments(arguments) as client:
+            csv_text = query_or_exit(client, QUERY_DERIVED if arguments.derived else QUERY)
 
     create_figure(csv_text)
 
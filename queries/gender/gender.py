@@ -1,5 +1,5 @@
-import requests
 import argparse
+import os
 import sys
 import io
 import numpy as np
@@ -7,95 +7,96 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from divinwd.cube import add_source_arguments, counts_or_exit, parse_source_arguments
+from divinwd.sparql import client_from_arguments, count_rows_or_exit, query_or_exit
+
 
 def get_arg_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--url', required=True, help='SPARQL endpoint URL')
+    add_source_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='select articles with the triples derived when indexing the dataset (see database/README.md)')
+    parser.add_argument('--per-author', action='store_true',
+                        help='fetch one row per author and year and count them locally, instead of fetching counts')
 
     return parser
 
 
-def create_figure_abs(csv_text):
-    # Parse CSV text produced by the SPARQL endpoint
-    if not csv_text or not str(csv_text).strip():
-        print("No CSV data provided to create_figure()")
-        return
-
-    df = pd.read_csv(io.StringIO(csv_text))
-
-    # Map columns (be tolerant to variations in header names)
-    colmap = {}
-    for c in df.columns:
-        lc = c.lower()
-        if 'year' in lc:
-            colmap['year'] = c
-        elif 'source' in lc:
-            colmap['source'] = c
-        elif 'gender' in lc:
-            # prefer exact gender_category name if present
-            colmap['gender'] = c
-        elif 'author' in lc:
-            colmap['author'] = c
-
-    if 'year' not in colmap or 'gender' not in colmap:
-        print('CSV missing required columns (year and/or gender).')
+GENDER_CATEGORIES = ['Female', 'Male', 'Other', 'Unknown']
+SOURCE_CATEGORIES = ['Source: Wikidata', 'Source: Genderize', None]
+
+
+def classify_gender(value):
+    g = '' if pd.isna(value) else str(value).strip().lower()
+    if not g or g == 'unknown':
+        return 3
+    elif g == 'female':
+        return 0
+    elif g == 'male':
+        return 1
+    else:
+        return 2
+
+
+def classify_source(value):
+    # Be permissive: "genderize.io" counts as Genderize. Authors with no source are
+    # left uncounted in the source bars, they are tracked as unknown gender.
+    s = '' if pd.isna(value) else str(value).strip().lower()
+    if 'wikidata' in s:
+        return 0
+    elif 'genderize' in s:
+        return 1
+    else:
+        return 2
+
+
+def category_codes(column, classify):
+    # Classify each distinct value once instead of each row; missing values get the
+    # factorize code -1, which picks the last entry, i.e. the class of a missing value
+    codes, values = pd.factorize(column)
+    classes = np.array([classify(v) for v in values] + [classify(None)], dtype=np.int64)
+    return classes[codes]
+
+
+def count_authors(df, years):
+    # Count authors per year and gender category, and per year and source. df holds
+    # either one row per author (counted once each) or per-group author counts.
+    df = df[df['year'].notnull()]
+    year_pos = df['year'].to_numpy(dtype=np.int64) - years[0]
+    in_range = (year_pos >= 0) & (year_pos < len(years))
+
+    if 'author_count' in df.columns:
+        weights = df['author_count'].to_numpy(dtype=np.float64)[in_range]
+    else:
+        weights = None
+    year_pos = year_pos[in_range]
+
+    gender = category_codes(df['gender_category'], classify_gender)[in_range]
+    source = category_codes(df['source'], classify_source)[in_range]
+
+    n_gender = len(GENDER_CATEGORIES)
+    n_source = len(SOURCE_CATEGORIES)
+    gender_counts = np.bincount(year_pos * n_gender + gender, weights=weights, minlength=len(years) * n_gender)
+    source_counts = np.bincount(year_pos * n_source + source, weights=weights, minlength=len(years) * n_source)
+    gender_counts = gender_counts.reshape(len(years), n_gender).round().astype(int)
+    source_counts = source_counts.reshape(len(years), n_source).round().astype(int)
+
+    data_source = {label: source_counts[:, k] for k, label in enumerate(SOURCE_CATEGORIES) if label is not None}
+    data_gender = {label: gender_counts[:, k] for k, label in enumerate(GENDER_CATEGORIES) if label != 'Unknown'}
+    unknown = gender_counts[:, GENDER_CATEGORIES.index('Unknown')]
+
+    return data_source, data_gender, unknown
+
+
+def create_figure_abs(df):
+    # df holds one row per year, gender category and source, with the number of authors
+    if df.empty:
+        print("No data returned from query.")
         return
 
-    # Ensure year is integer and restrict to 2010-2024
-    df = df[df[colmap['year']].notnull()]
-    df[colmap['year']] = df[colmap['year']].astype(int)
     years = np.arange(2010, 2025)
-
-    # Initialize counts
-    data_source = {
-        "Source: Wikidata": np.zeros(len(years), dtype=int),
-        "Source: Genderize": np.zeros(len(years), dtype=int),
-    }
-    data_gender = {
-        "Female": np.zeros(len(years), dtype=int),
-        "Male": np.zeros(len(years), dtype=int),
-        "Other": np.zeros(len(years), dtype=int),
-    }
-    unknown = np.zeros(len(years), dtype=int)
-
-    for i, y in enumerate(years):
-        dfy = df[df[colmap['year']] == int(y)]
-        if dfy.empty:
-            continue
-
-        for _, row in dfy.iterrows():
-            # Gender classification
-            g = row[colmap['gender']]
-            try:
-                g = '' if pd.isna(g) else str(g).strip().lower()
-            except Exception:
-                g = str(g).strip().lower()
-
-            if not g or g == 'unknown':
-                unknown[i] += 1
-            elif g == 'female':
-                data_gender['Female'][i] += 1
-            elif g == 'male':
-                data_gender['Male'][i] += 1
-            else:
-                data_gender['Other'][i] += 1
-
-            # Source classification (be permissive)
-            s = ''
-            if 'source' in colmap:
-                s = row[colmap['source']]
-                try:
-                    s = '' if pd.isna(s) else str(s).strip().lower()
-                except Exception:
-                    s = str(s).strip().lower()
-
-            if 'wikidata' in s:
-                data_source['Source: Wikidata'][i] += 1
-            elif 'genderize' in s:
-                data_source['Source: Genderize'][i] += 1
-            else:
-                # leave uncounted in source arrays; unknowns are tracked in `unknown`
-                pass
+    data_source, data_gender, unknown = count_authors(df, years)
 
     # Use absolute values instead of percentages
     data_source_abs = data_source
@@ -158,87 +159,14 @@ def create_figure_abs(csv_text):
     plt.close(fig)
 
 
-def create_figure_perc(csv_text):
-    # Parse CSV text produced by the SPARQL endpoint
-    if not csv_text or not str(csv_text).strip():
-        print("No CSV data provided to create_figure()")
-        return
-
-    df = pd.read_csv(io.StringIO(csv_text))
-
-    # Map columns (be tolerant to variations in header names)
-    colmap = {}
-    for c in df.columns:
-        lc = c.lower()
-        if 'year' in lc:
-            colmap['year'] = c
-        elif 'source' in lc:
-            colmap['source'] = c
-        elif 'gender' in lc:
-            # prefer exact gender_category name if present
-            colmap['gender'] = c
-        elif 'author' in lc:
-            colmap['author'] = c
-
-    if 'year' not in colmap or 'gender' not in colmap:
-        print('CSV missing required columns (year and/or gender).')
+def create_figure_perc(df):
+    # df holds one row per year, gender category and source, with the number of authors
+    if df.empty:
+        print("No data returned from query.")
         return
 
-    # Ensure year is integer and restrict to 2010-2024
-    df = df[df[colmap['year']].notnull()]
-    df[colmap['year']] = df[colmap['year']].astype(int)
     years = np.arange(2010, 2025)
-
-    # Initialize counts
-    data_source = {
-        "Source: Wikidata": np.zeros(len(years), dtype=int),
-        "Source: Genderize": np.zeros(len(years), dtype=int),
-    }
-    data_gender = {
-        "Female": np.zeros(len(years), dtype=int),
-        "Male": np.zeros(len(years), dtype=int),
-        "Other": np.zeros(len(years), dtype=int),
-    }
-    unknown = np.zeros(len(years), dtype=int)
-
-    for i, y in enumerate(years):
-        dfy = df[df[colmap['year']] == int(y)]
-        if dfy.empty:
-            continue
-
-        for _, row in dfy.iterrows():
-            # Gender classification
-            g = row[colmap['gender']]
-            try:
-                g = '' if pd.isna(g) else str(g).strip().lower()
-            except Exception:
-                g = str(g).strip().lower()
-
-            if not g or g == 'unknown':
-                unknown[i] += 1
-            elif g == 'female':
-                data_gender['Female'][i] += 1
-            elif g == 'male':
-                data_gender['Male'][i] += 1
-            else:
-                data_gender['Other'][i] += 1
-
-            # Source classification (be permissive)
-            s = ''
-            if 'source' in colmap:
-                s = row[colmap['source']]
-                try:
-                    s = '' if pd.isna(s) else str(s).strip().lower()
-                except Exception:
-                    s = str(s).strip().lower()
-
-            if 'wikidata' in s:
-                data_source['Source: Wikidata'][i] += 1
-            elif 'genderize' in s:
-                data_source['Source: Genderize'][i] += 1
-            else:
-                # leave uncounted in source arrays; unknowns are tracked in `unknown`
-                pass
+    data_source, data_gender, unknown = count_authors(df, years)
 
     # Compute percentages, avoiding division by zero
     totals_source = np.sum(list(data_source.values()), axis=0) + unknown
@@ -296,15 +224,16 @@ def create_figure_perc(csv_text):
     plt.close(fig)
 
 
-QUERY = """
+QUERY_PREFIXES = """
 PREFIX wd: <http://www.wikidata.org/entity/>
 PREFIX wdt: <http://www.wikidata.org/prop/direct/>
 PREFIX genz: <https://divinwd.dev/genderize/>
+PREFIX divinwd: <https://divinwd.dev/derived/>
+"""
 
-SELECT DISTINCT ?author ?year ?gender_category ?source WHERE {
-    {
-        SELECT ?author ?year (SAMPLE(?gender) AS ?author_gender_category) (COUNT(DISTINCT ?gender) AS ?gender_count) WHERE {
-            {
+# Articles of the dataset: scholarly articles with a single publication year, whose
+# authors are all humans listed as Wikidata entities
+ARTICLES = """            {
                 SELECT ?article (YEAR(MIN(?publicationDate)) AS ?year) WHERE {
                     ?article wdt:P31 wd:Q13442814 ;
                             wdt:P577 ?publicationDate ;
@@ -319,7 +248,18 @@ SELECT DISTINCT ?author ?year ?gender_category ?source WHERE {
                 }
                 GROUP BY ?article
                 HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && 2010 <= ?year && ?year <= 2024)
-            }
+            }"""
+
+# The same articles, read from the triples derived from the dataset when it is indexed
+# (see database/README.md), without the grouping and MINUS clauses above
+ARTICLES_DERIVED = """            ?article divinwd:eligibleYear ?year .
+            FILTER (2010 <= ?year && ?year <= 2024)"""
+
+# Gender category and source of each author, for each year they published in
+QUERY_PATTERN = """
+    {
+        SELECT ?author ?year (SAMPLE(?gender) AS ?author_gender_category) (COUNT(DISTINCT ?gender) AS ?gender_count) WHERE {
+""" + ARTICLES + """
 
             ?article wdt:P50 ?author .
 
@@ -348,33 +288,46 @@ SELECT DISTINCT ?author ?year ?gender_category ?source WHERE {
 
     # Bind final category
     BIND (IF(?wd_gender != "unknown", ?wd_gender, COALESCE(?genderize_gender, "unknown")) AS ?gender_category)
-}
 """
 
+# Number of authors per year, gender category and source, counted by the server
+QUERY = QUERY_PREFIXES + """
+SELECT ?year ?gender_category ?source (COUNT(DISTINCT ?author) AS ?author_count) WHERE {""" + QUERY_PATTERN + """}
+GROUP BY ?year ?gender_category ?source
+ORDER BY ?year ?gender_category ?source
+"""
+
+# One row per author and year, to audit how single authors are classified
+QUERY_AUTHORS = QUERY_PREFIXES + """
+SELECT DISTINCT ?author ?year ?gender_category ?source WHERE {""" + QUERY_PATTERN + """}
+"""
+
+QUERY_DERIVED = QUERY.replace(ARTICLES, ARTICLES_DERIVED)
+QUERY_AUTHORS_DERIVED = QUERY_AUTHORS.replace(ARTICLES, ARTICLES_DERIVED)
+
+
+def cube_counts(cube):
+    # The result of QUERY, from a cube built by `python -m divinwd.cube`
+    df = cube.slice('authors', ['year', 'gender', 'gender_source'], where={'year': range(2010, 2025)})
+    return df.rename(columns={'gender': 'gender_category', 'gender_source': 'source'})
+
 
 def main():
-    arguments = get_arg_parser().parse_args()
+    arguments = parse_source_arguments(get_arg_parser())
 
-    url = arguments.url
-    headers = {"Accept": "text/csv"}
-    params = {"query": QUERY, "format": "text/csv"}
+    if arguments.cube:
+        create_figure_perc(counts_or_exit(arguments.cube, cube_counts))
+        return
 
     print("Waiting for response...")
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        csv_text = response.text
-    except requests.ConnectionError:
-        print("Error: Failed to connect to the server. Check the URL (is the server up?)", file=sys.stderr)
-        sys.exit(1)
-    except requests.Timeout:
-        print("Error: Request timed out. The server took too long to respond.", file=sys.stderr)
-        sys.exit(1)
-    except requests.RequestException as e:
-        print(f"Error: An error occurred while making the request: {str(e)}", file=sys.stderr)
-        sys.exit(1)
-
-    create_figure_perc(csv_text)
+    with client_from_arguments(arguments) as client:
+        if arguments.per_author:
+            # One row per author and year: count them while the result streams in
+            df = count_rows_or_exit(client, QUERY_AUTHORS_DERIVED if arguments.derived else QUERY_AUTHORS, ['year', 'gender_category', 'source'], name='author_count')
+        else:
+            df = pd.read_csv(io.StringIO(query_or_exit(client, QUERY_DERIVED if arguments.derived else QUERY)))
+
+    create_figure_perc(df)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,5 @@
-import requests
 import argparse
+import os
 import sys
 import io
 import numpy as np
@@ -7,17 +7,25 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from divinwd.cube import add_source_arguments, counts_or_exit, parse_source_arguments
+from divinwd.languages import language_pattern
+from divinwd.sparql import client_from_arguments, count_rows_or_exit, query_or_exit
+
 
 def get_arg_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--url', required=True, help='SPARQL endpoint URL')
+    add_source_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='select articles with the triples derived when indexing the dataset (see database/README.md)')
+    parser.add_argument('--per-article', action='store_true',
+                        help='fetch one row per article and count them locally, instead of fetching counts')
 
     return parser
 
 
-def create_figure_abs(csv_text):
-    # parse csv to dataframe
-    df = pd.read_csv(io.StringIO(csv_text))
+def create_figure_abs(df):
+    # df holds one row per year, language category and source, with the number of articles
     if df.empty:
         print("No data returned from query.")
         return
@@ -33,12 +41,12 @@ def create_figure_abs(csv_text):
 
     years = np.arange(df['year'].min(), df['year'].max() + 1, dtype=int)
 
-    pivot_src = df.pivot_table(index='year', columns='source', values='article', aggfunc='count').reindex(index=years, fill_value=0)
+    pivot_src = df.pivot_table(index='year', columns='source', values='article_count', aggfunc='sum', fill_value=0).reindex(index=years, fill_value=0)
     wikidata_counts = pivot_src.get('wikidata', pd.Series(0, index=years)).to_numpy()
     external_counts = pivot_src.get('external', pd.Series(0, index=years)).to_numpy()
     unknown_src_counts = pivot_src.get('unknown', pd.Series(0, index=years)).to_numpy()
 
-    pivot_lang = df.pivot_table(index='year', columns='languageCategory', values='article', aggfunc='count').reindex(index=years, fill_value=0)
+    pivot_lang = df.pivot_table(index='year', columns='languageCategory', values='article_count', aggfunc='sum', fill_value=0).reindex(index=years, fill_value=0)
     english_counts = pivot_lang.get('English', pd.Series(0, index=years)).to_numpy()
     other_counts = pivot_lang.get('Other', pd.Series(0, index=years)).to_numpy()
     unknown_lang_counts = pivot_lang.get('Unknown', pd.Series(0, index=years)).to_numpy()
@@ -107,9 +115,8 @@ def create_figure_abs(csv_text):
     plt.savefig('figure.png', format='png', bbox_inches='tight', dpi=600)
 
 
-def create_figure_perc(csv_text):
-    # parse csv to dataframe
-    df = pd.read_csv(io.StringIO(csv_text))
+def create_figure_perc(df):
+    # df holds one row per year, language category and source, with the number of articles
     if df.empty:
         print("No data returned from query.")
         return
@@ -125,12 +132,12 @@ def create_figure_perc(csv_text):
 
     years = np.arange(df['year'].min(), df['year'].max() + 1, dtype=int)
 
-    pivot_src = df.pivot_table(index='year', columns='source', values='article', aggfunc='count').reindex(index=years, fill_value=0)
+    pivot_src = df.pivot_table(index='year', columns='source', values='article_count', aggfunc='sum', fill_value=0).reindex(index=years, fill_value=0)
     wikidata_counts = pivot_src.get('wikidata', pd.Series(0, index=years)).to_numpy()
     external_counts = pivot_src.get('external', pd.Series(0, index=years)).to_numpy()
     unknown_src_counts = pivot_src.get('unknown', pd.Series(0, index=years)).to_numpy()
 
-    pivot_lang = df.pivot_table(index='year', columns='languageCategory', values='article', aggfunc='count').reindex(index=years, fill_value=0)
+    pivot_lang = df.pivot_table(index='year', columns='languageCategory', values='article_count', aggfunc='sum', fill_value=0).reindex(index=years, fill_value=0)
     english_counts = pivot_lang.get('English', pd.Series(0, index=years)).to_numpy()
     other_counts = pivot_lang.get('Other', pd.Series(0, index=years)).to_numpy()
     unknown_lang_counts = pivot_lang.get('Unknown', pd.Series(0, index=years)).to_numpy()
@@ -201,45 +208,55 @@ def create_figure_perc(csv_text):
     plt.savefig('figure.png', format='png', bbox_inches='tight', dpi=600)
 
 
-QUERY = """
+QUERY_PREFIXES = """
 PREFIX wd: <http://www.wikidata.org/entity/>
 PREFIX wdt: <http://www.wikidata.org/prop/direct/>
 PREFIX oacr: <https://divinwd.dev/oacr/>
-SELECT DISTINCT ?article ?year ?languageCategory ?source WHERE {
+PREFIX divinwd: <https://divinwd.dev/derived/>
+"""
+
+# Articles of the dataset: scholarly articles with a single publication year, whose
+# authors are all humans listed as Wikidata entities
+ARTICLES = """            {
+                SELECT ?article (YEAR(MIN(?publicationDate)) AS ?year) WHERE {
+                    ?article wdt:P31 wd:Q13442814 ;
+                             wdt:P577 ?publicationDate ;
+                             wdt:P50 [ wdt:P31 wd:Q5 ] .
+
+                    FILTER (YEAR(?publicationDate) <= YEAR(NOW()))
+                    MINUS { ?article wdt:P2093 ?authorNameString . }
+                    MINUS {
+                        ?article wdt:P50 ?x .
+                        FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
+                    }
+                }
+                GROUP BY ?article
+                HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && 2010 <= ?year && ?year <= 2024)
+            }"""
+
+# The same articles, read from the triples derived from the dataset when it is indexed
+# (see database/README.md), without the grouping and MINUS clauses above
+ARTICLES_DERIVED = """            ?article divinwd:eligibleYear ?year .
+            FILTER (2010 <= ?year && ?year <= 2024)"""
+
+# Language category and source of each article
+QUERY_PATTERN = """
     {
-        SELECT ?article
-            (YEAR(MIN(?publicationDate)) AS ?year)
+        SELECT ?article ?year
             (SAMPLE(?language) AS ?articleLanguage)
             (COUNT(DISTINCT ?language) AS ?languageCount)
         WHERE {
-            ?article wdt:P31 wd:Q13442814 ;
-                     wdt:P577 ?publicationDate ;
-                     wdt:P50 [ wdt:P31 wd:Q5 ] .
-
-            FILTER (YEAR(?publicationDate) <= YEAR(NOW()))
-            MINUS { ?article wdt:P2093 ?authorNameString . }
-            MINUS {
-                ?article wdt:P50 ?x .
-                FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
-            }
+""" + ARTICLES + """
 
-            OPTIONAL { ?article wdt:P407 ?languageValue . }
-
-            BIND (
-                COALESCE(
-                    IF(!BOUND(?languageValue) || ?languageValue IN (wd:Q66724591, wd:Q20923490), wd:Q22282914, 1/0), # map to undetermined: non-English, multiple languages
-                    IF(?languageValue IN (wd:Q44679, wd:Q44676, wd:Q7979, wd:Q1348800, wd:Q21480034, wd:Q7976, wd:Q6144345, wd:Q7707309), wd:Q1860, 1/0), # English
-                    IF(?languageValue IN (wd:Q24841726, wd:Q13414913, wd:Q18130932, wd:Q100148307, wd:Q64427357, wd:Q13646143, wd:Q1048980, wd:Q262828, wd:Q4380827), wd:Q7850, 1/0), # Chinese
-                    IF(?languageValue = wd:Q750553, wd:Q5146, 1/0), # Portuguese
-                    IF(?languageValue = wd:Q8141, wd:Q9288, 1/0), # Hebrew
-                    IF(?languageValue = wd:Q1115875, wd:Q1321, 1/0), # Spanish
-                    IF(?languageValue IN (wd:Q306626, wd:Q125258960, wd:Q1366643, wd:Q64427341), wd:Q188, 1/0), # German
-                    ?languageValue
-                ) AS ?language
-            )
+            # Languages in Wikidata, with variants mapped to base languages (see divinwd/languages.json);
+            # articles without any are undetermined
+            OPTIONAL {
+                ?article wdt:P407 ?languageValue .
+""" + language_pattern('wikidata', 'languageValue', 'wikidataLanguage', '                ') + """
+            }
+            BIND (COALESCE(?wikidataLanguage, wd:Q22282914) AS ?language)
         }
-        GROUP BY ?article
-        HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && 2010 <= ?year && ?year <= 2024)
+        GROUP BY ?article ?year
     }
 
     # Mark as unknown if multiple languages are found
@@ -248,11 +265,7 @@ SELECT DISTINCT ?article ?year ?languageCategory ?source WHERE {
     # Fetch language from external data sources
     OPTIONAL {
         ?article oacr:lang ?langValue .
-        BIND (COALESCE(
-            IF(?langValue = wd:Q191769, wd:Q9043, 1/0),
-            IF(?langValue IN (wd:Q24841726, wd:Q13414913, wd:Q18130932, wd:Q100148307, wd:Q64427357, wd:Q13646143, wd:Q1048980, wd:Q262828, wd:Q4380827), wd:Q7850, 1/0),
-            ?langValue
-        ) AS ?extLang)
+""" + language_pattern('external', 'langValue', 'extLang', '        ') + """
     }
 
     # Bind final language
@@ -262,33 +275,44 @@ SELECT DISTINCT ?article ?year ?languageCategory ?source WHERE {
     BIND (IF(?wdLang != wd:Q22282914, "wikidata", IF(BOUND(?extLang), "external", "unknown")) AS ?source)
 
     BIND (IF(?language = wd:Q22282914, "unknown", IF(?language = wd:Q1860, "English", "non-English")) AS ?languageCategory)
-}
 """
 
+# Number of articles per year, language category and source, counted by the server
+QUERY = QUERY_PREFIXES + """SELECT ?year ?languageCategory ?source (COUNT(DISTINCT ?article) AS ?article_count) WHERE {""" + QUERY_PATTERN + """}
+GROUP BY ?year ?languageCategory ?source
+ORDER BY ?year ?languageCategory ?source
+"""
+
+# One row per article, to audit how single articles are classified
+QUERY_ARTICLES = QUERY_PREFIXES + """SELECT DISTINCT ?article ?year ?languageCategory ?source WHERE {""" + QUERY_PATTERN + """}
+"""
+
+QUERY_DERIVED = QUERY.replace(ARTICLES, ARTICLES_DERIVED)
+QUERY_ARTICLES_DERIVED = QUERY_ARTICLES.replace(ARTICLES, ARTICLES_DERIVED)
+
+
+def cube_counts(cube):
+    # The result of QUERY, from a cube built by `python -m divinwd.cube`
+    df = cube.slice('articles', ['year', 'language', 'language_source'], where={'year': range(2010, 2025)})
+    return df.rename(columns={'language': 'languageCategory', 'language_source': 'source'})
+
 
 def main():
-    arguments = get_arg_parser().parse_args()
+    arguments = parse_source_arguments(get_arg_parser())
 
-    url = arguments.url
-    headers = {"Accept": "text/csv"}
-    params = {"query": QUERY, "format": "text/csv"}
+    if arguments.cube:
+        create_figure_perc(counts_or_exit(arguments.cube, cube_counts))
+        return
 
     print("Waiting for response...")
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        csv_text = response.text
-    except requests.ConnectionError:
-        print("Error: Failed to connect to the server. Check the URL (is the server up?)", file=sys.stderr)
-        sys.exit(1)
-    except requests.Timeout:
-        print("Error: Request timed out. The server took too long to respond.", file=sys.stderr)
-        sys.exit(1)
-    except requests.RequestException as e:
-        print(f"Error: An error occurred while making the request: {str(e)}", file=sys.stderr)
-        sys.exit(1)
-
-    create_figure_perc(csv_text)
+    with client_from_arguments(arguments) as client:
+        if arguments.per_article:
+            # One row per article: count them while the result streams in
+            df = count_rows_or_exit(client, QUERY_ARTICLES_DERIVED if arguments.derived else QUERY_ARTICLES, ['year', 'languageCategory', 'source'], name='article_count')
+        else:
+            df = pd.read_csv(io.StringIO(query_or_exit(client, QUERY_DERIVED if arguments.derived else QUERY)))
+
+    create_figure_perc(df)
 
 
 if __name__ == '__main__':
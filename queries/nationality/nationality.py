@@ -1,5 +1,5 @@
-import requests
 import argparse
+import os
 import sys
 import io
 import numpy as np
@@ -7,19 +7,39 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from divinwd.cube import add_source_arguments, counts_or_exit, parse_source_arguments
+from divinwd.countries import continent_pattern, country_pattern, excluded_countries
+from divinwd.sparql import client_from_arguments, query_or_exit
+
 
 def get_arg_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--url', required=True, help='SPARQL endpoint URL')
+    add_source_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='select articles with the triples derived when indexing the dataset (see database/README.md)')
 
     return parser
 
 
-def create_figure_abs(continents, sources, authors):
+def split_counts(df):
+    # Each row counts the authors of a year having a given set of sources and set of
+    # continents. Expand the sets to count authors per year and source, and per year
+    # and continent: an author with several continents counts once in each of them.
+    df = df.fillna({'sources': 'unknown', 'continents': 'Unknown'})
+
+    df_sources = df.assign(source=df['sources'].str.split('|')).explode('source')
+    df_sources = df_sources.groupby(['year', 'source'], as_index=False)['author_count'].sum()
+
+    df_continents = df.assign(continent_label=df['continents'].str.split('|')).explode('continent_label')
+    df_continents = df_continents.groupby(['year', 'continent_label'], as_index=False)['author_count'].sum()
+
+    df_authors = df.groupby('year', as_index=False)['author_count'].sum()
+
+    return df_continents, df_sources, df_authors
+
 
-    df_continents = pd.read_csv(io.StringIO(continents))
-    df_sources = pd.read_csv(io.StringIO(sources))
-    df_authors = pd.read_csv(io.StringIO(authors))
+def create_figure_abs(df_continents, df_sources, df_authors):
 
     df_continents['continent_label'] = df_continents['continent_label'].fillna('Unknown').astype(str)
 
@@ -180,11 +200,7 @@ def create_figure_abs(continents, sources, authors):
     plt.tight_layout()
     
     plt.savefig('figure.png', format='png', bbox_inches='tight', dpi=300)
-def create_figure_perc(continents, sources, authors):
-
-    df_continents = pd.read_csv(io.StringIO(continents))
-    df_sources = pd.read_csv(io.StringIO(sources))
-    df_authors = pd.read_csv(io.StringIO(authors))
+def create_figure_perc(df_continents, df_sources, df_authors):
 
     df_continents['continent_label'] = df_continents['continent_label'].fillna('Unknown').astype(str)
 
@@ -339,7 +355,34 @@ def create_figure_perc(continents, sources, authors):
     plt.savefig('figure.png', format='png', bbox_inches='tight', dpi=300)
 
 
-QUERY_CONTINENT = """
+# Articles of the dataset: scholarly articles with a single publication year, whose
+# authors are all humans listed as Wikidata entities
+ARTICLES = """            {
+                SELECT ?article (MIN(?publication_date) AS ?article_publication_date) WHERE {
+                    ?article wdt:P31 wd:Q13442814 ; wdt:P577 ?publication_date ; wdt:P50 [ wdt:P31 wd:Q5 ] .
+
+                    FILTER (YEAR(?publication_date) <= YEAR(NOW()))
+                    MINUS { ?article wdt:P2093 ?author_name_string . }
+                    MINUS {
+                        ?article wdt:P50 ?x .
+                        FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
+                    }
+                }
+                GROUP BY ?article
+                HAVING (COUNT(DISTINCT YEAR(?publication_date)) = 1 && 2010 <= YEAR(?article_publication_date) && YEAR(?article_publication_date) <= 2024)
+            }"""
+
+# The same articles, read from the triples derived from the dataset when it is indexed
+# (see database/README.md), without the grouping and MINUS clauses above
+ARTICLES_DERIVED = """            ?article divinwd:eligibleDate ?article_publication_date .
+            FILTER (2010 <= YEAR(?article_publication_date) && YEAR(?article_publication_date) <= 2024)"""
+
+
+# Each author contributes one row per year: the set of sources and the set of continents
+# of their citizenships valid at the publication dates (an author can have several).
+# Counting authors per year and combination of sets evaluates the expensive pattern
+# only once, yet the authors per source, per continent and per year follow exactly.
+QUERY = """
 PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 PREFIX wikibase: <http://wikiba.se/ontology#>
@@ -349,285 +392,105 @@ PREFIX p: <http://www.wikidata.org/prop/>
 PREFIX ps: <http://www.wikidata.org/prop/statement/>
 PREFIX pq: <http://www.wikidata.org/prop/qualifier/>
 PREFIX genz: <https://divinwd.dev/genderize/>
-SELECT ?year ?continent_label (COUNT(DISTINCT ?author) AS ?author_count) WHERE {
-
-    # Select articles of the dataset published between 2010 and 2024
+PREFIX divinwd: <https://divinwd.dev/derived/>
+SELECT ?year ?sources ?continents (COUNT(?author) AS ?author_count) WHERE {
     {
-        SELECT ?article (MIN(?publication_date) AS ?article_publication_date) WHERE {
-            ?article wdt:P31 wd:Q13442814 ; wdt:P577 ?publication_date ; wdt:P50 [ wdt:P31 wd:Q5 ] .
-
-            FILTER (YEAR(?publication_date) <= YEAR(NOW()))
-            MINUS { ?article wdt:P2093 ?author_name_string . }
-            MINUS {
-                ?article wdt:P50 ?x .
-                FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
+        SELECT ?year ?author
+            (GROUP_CONCAT(DISTINCT ?source; SEPARATOR="|") AS ?sources)
+            (GROUP_CONCAT(DISTINCT ?continent_name; SEPARATOR="|") AS ?continents)
+        WHERE {
+            # Select articles of the dataset published between 2010 and 2024
+""" + ARTICLES + """
+
+            BIND (YEAR(?article_publication_date) AS ?year)
+
+            ?article wdt:P50 ?author .
+
+            # Find nationality in Wikidata
+            OPTIONAL {
+                ?author p:P27 ?citizenship .
+                ?citizenship rdf:type wikibase:BestRank .
+
+                # Get time qualifiers
+                OPTIONAL { ?citizenship pq:P580 ?citizenship_startTime . }
+                OPTIONAL { ?citizenship pq:P582 ?citizenship_endTime . }
+                FILTER (
+                    (!BOUND(?citizenship_startTime) || ?citizenship_startTime <= ?article_publication_date) &&
+                    (!BOUND(?citizenship_endTime) || ?citizenship_endTime > ?article_publication_date)
+                )
+
+                ?citizenship ps:P27 ?wd_country_value .
+
+                # Exclude some special values (see divinwd/countries.json)
+                FILTER (!ISBLANK(?wd_country_value) && ?wd_country_value NOT IN (""" + excluded_countries() + """))
+
+                # Filter countries that are not historically compatible with the article publication date
+                OPTIONAL { ?wd_country_value wdt:571 ?country_Inception . }
+                FILTER (!BOUND(?country_Inception) || ?article_publication_date >= ?country_Inception)
+                OPTIONAL { ?wd_country_value wdt:P576 ?country_EndDate . }
+                FILTER (!BOUND(?country_EndDate) || ?article_publication_date < ?country_EndDate)
             }
-        }
-        GROUP BY ?article
-        HAVING (COUNT(DISTINCT YEAR(?publication_date)) = 1 && 2010 <= YEAR(?article_publication_date) && YEAR(?article_publication_date) <= 2024)
-    }
-
-    BIND (YEAR(?article_publication_date) AS ?year)
-
-    ?article wdt:P50 ?author .
-
-    # Find nationality in Wikidata
-    OPTIONAL {
-        ?author p:P27 ?citizenship .
-        ?citizenship rdf:type wikibase:BestRank .
-
-        # Get time qualifiers
-        OPTIONAL { ?citizenship pq:P580 ?citizenship_startTime . }
-        OPTIONAL { ?citizenship pq:P582 ?citizenship_endTime . }
-        FILTER (
-            (!BOUND(?citizenship_startTime) || ?citizenship_startTime <= ?article_publication_date) &&
-            (!BOUND(?citizenship_endTime) || ?citizenship_endTime > ?article_publication_date)
-        )
-
-        ?citizenship ps:P27 ?wd_country_value .
-
-        # Exclude some special values
-        FILTER (!ISBLANK(?wd_country_value) && ?wd_country_value NOT IN (
-            wd:Q18097, # Korea
-            wd:Q1152445, # Aerican Empire
-            wd:Q1128483, # Cascadia
-            wd:Q108746595, # Kaksonen
-            wd:Q223050 # Statelessness
-        ))
-
-        # Filter countries that are not historically compatible with the article publication date
-        OPTIONAL { ?wd_country_value wdt:571 ?country_Inception . }
-        FILTER (!BOUND(?country_Inception) || ?article_publication_date >= ?country_Inception)
-        OPTIONAL { ?wd_country_value wdt:P576 ?country_EndDate . }
-        FILTER (!BOUND(?country_EndDate) || ?article_publication_date < ?country_EndDate)
-    }
-
-    # Find nationality in Genderize
-    OPTIONAL {
-        ?author genz:nationality ?iso .
-        # Genderize nationalities come with ISO 3166-1 alpha-2 codes (i.e., 2-characters identifiers)
-        # Map them to Wikidata countries with codes (see property P297)
-        ?genderize_country_value wdt:P297 ?iso .
-
-        OPTIONAL { ?genderize_country_value wdt:571 ?country_Inception . }
-        FILTER (!BOUND(?country_Inception) || ?article_publication_date >= ?country_Inception)
-        OPTIONAL { ?genderize_country_value wdt:P576 ?country_EndDate . }
-        FILTER (!BOUND(?country_EndDate) || ?article_publication_date < ?country_EndDate)
-    }
-
-    # Bind final country
-    BIND (COALESCE(?wd_country_value, ?genderize_country_value, "unknown") AS ?country_value)
-
-    # Map some places to countries
-    BIND (
-        COALESCE(
-            IF(?country_value = wd:Q55, wd:Q29999, 1/0), # Netherlands -> Kingdom of the Netherlands
-            IF(?country_value = wd:Q756617, wd:Q35, 1/0), # Kingdom of Denmark -> Denmark
-            IF(?country_value IN (wd:Q21, wd:Q22, wd:Q25, wd:Q42406), wd:Q145, 1/0), # England, Scotland, Wales, citizens of England -> UK
-            IF(?country_value = wd:Q15124, wd:Q38, 1/0), # Sudtirolo -> Italia
-            IF(?country_value = wd:Q188736, wd:Q225, 1/0), # Bosnia -> Bosnia and Herzegovina
-            IF(?country_value IN (wd:Q29520, wd:Q14773), wd:Q148, 1/0), # Cina, Macao -> Repubblica Popolare Cinese
-            IF(?country_value = wd:Q1335, wd:Q77, 1/0), # Città di Montevideo -> Uruguay
-            IF(?country_value = wd:Q320015, wd:Q739, 1/0), # Città di Pasto -> Colombia
-            IF(?country_value = wd:Q205784, wd:Q717, 1/0), # Stato di Portuguesa -> Venezuela
-            IF(?country_value = wd:Q1018839, wd:Q30, 1/0), # Città di Española -> USA
-            IF(?country_value = wd:Q47588, wd:Q29, 1/0), # Paesi baschi -> Spagna
-            IF(?country_value = wd:Q5689, wd:Q33, 1/0), # Åland -> Finland
-            ?country_value # Default
-        ) AS ?author_country
-    )
-
-    # Bind source
-    BIND (IF(BOUND(?wd_country_value), "wikidata", IF(BOUND(?genderize_country_value), "genderize", "unknown")) AS ?source)
-
-    # Continent
-    OPTIONAL {
-        ?author_country wdt:P30 ?continent_value .
-        FILTER (?continent_value IN (wd:Q15, wd:Q18, wd:Q46, wd:Q48, wd:Q49, wd:Q55643))
-        BIND (
-            COALESCE(
-                IF(?author_country = wd:Q23681, wd:Q48, 1/0), # Northern Cyprus
-                IF(?author_country = wd:Q804, wd:Q49, 1/0), # Suriname
-                IF(?author_country = wd:Q730, wd:Q18, 1/0), # Panama
-                ?continent_value
-            ) AS ?continent_direct
-        )
-    }
-    BIND (
-        # Some islands in the Pacific Ocean are not linked to Oceania
-        IF(BOUND(?continent_direct), ?continent_direct, COALESCE(
-            IF(?author_country IN (wd:Q26988, wd:Q712, wd:Q691, wd:Q683, wd:Q678), wd:Q55643, 1/0)
-        )) AS ?continent
-    )
-    BIND (COALESCE(?continent, "unknown") AS ?author_continent)
-    
-    OPTIONAL {
-        ?author_continent rdfs:label ?continent_label .
-        FILTER (LANG(?continent_label) = "en")
-    }
-}
-GROUP BY ?year ?continent_label
-"""
-
 
-QUERY_SOURCE = """
-PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-PREFIX wikibase: <http://wikiba.se/ontology#>
-PREFIX wd: <http://www.wikidata.org/entity/>
-PREFIX wdt: <http://www.wikidata.org/prop/direct/>
-PREFIX p: <http://www.wikidata.org/prop/>
-PREFIX ps: <http://www.wikidata.org/prop/statement/>
-PREFIX pq: <http://www.wikidata.org/prop/qualifier/>
-PREFIX genz: <https://divinwd.dev/genderize/>
-SELECT ?year ?source (COUNT(DISTINCT ?author) AS ?author_count) WHERE {
-
-    # Select articles of the dataset published between 2010 and 2024
-    {
-        SELECT ?article (MIN(?publication_date) AS ?article_publication_date) WHERE {
-            ?article wdt:P31 wd:Q13442814 ; wdt:P577 ?publication_date ; wdt:P50 [ wdt:P31 wd:Q5 ] .
-
-            FILTER (YEAR(?publication_date) <= YEAR(NOW()))
-            MINUS { ?article wdt:P2093 ?author_name_string . }
-            MINUS {
-                ?article wdt:P50 ?x .
-                FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
+            # Find nationality in Genderize
+            OPTIONAL {
+                ?author genz:nationality ?iso .
+                # Genderize nationalities come with ISO 3166-1 alpha-2 codes (i.e., 2-characters identifiers)
+                # Map them to Wikidata countries with codes (see property P297)
+                ?genderize_country_value wdt:P297 ?iso .
+
+                OPTIONAL { ?genderize_country_value wdt:571 ?country_Inception . }
+                FILTER (!BOUND(?country_Inception) || ?article_publication_date >= ?country_Inception)
+                OPTIONAL { ?genderize_country_value wdt:P576 ?country_EndDate . }
+                FILTER (!BOUND(?country_EndDate) || ?article_publication_date < ?country_EndDate)
             }
-        }
-        GROUP BY ?article
-        HAVING (COUNT(DISTINCT YEAR(?publication_date)) = 1 && 2010 <= YEAR(?article_publication_date) && YEAR(?article_publication_date) <= 2024)
-    }
 
-    BIND (YEAR(?article_publication_date) AS ?year)
-
-    ?article wdt:P50 ?author .
-
-    # Find nationality in Wikidata
-    OPTIONAL {
-        ?author p:P27 ?citizenship .
-        ?citizenship rdf:type wikibase:BestRank .
-
-        # Get time qualifiers
-        OPTIONAL { ?citizenship pq:P580 ?citizenship_startTime . }
-        OPTIONAL { ?citizenship pq:P582 ?citizenship_endTime . }
-        FILTER (
-            (!BOUND(?citizenship_startTime) || ?citizenship_startTime <= ?article_publication_date) &&
-            (!BOUND(?citizenship_endTime) || ?citizenship_endTime > ?article_publication_date)
-        )
-
-        ?citizenship ps:P27 ?wd_country_value .
-
-        # Exclude some special values
-        FILTER (!ISBLANK(?wd_country_value) && ?wd_country_value NOT IN (
-            wd:Q18097, # Korea
-            wd:Q1152445, # Aerican Empire
-            wd:Q1128483, # Cascadia
-            wd:Q108746595, # Kaksonen
-            wd:Q223050 # Statelessness
-        ))
-
-        # Filter countries that are not historically compatible with the article publication date
-        OPTIONAL { ?wd_country_value wdt:571 ?country_Inception . }
-        FILTER (!BOUND(?country_Inception) || ?article_publication_date >= ?country_Inception)
-        OPTIONAL { ?wd_country_value wdt:P576 ?country_EndDate . }
-        FILTER (!BOUND(?country_EndDate) || ?article_publication_date < ?country_EndDate)
-    }
+            # Bind final country
+            BIND (COALESCE(?wd_country_value, ?genderize_country_value, "unknown") AS ?country_value)
 
-    # Find nationality in Genderize
-    OPTIONAL {
-        ?author genz:nationality ?iso .
-        # Genderize nationalities come with ISO 3166-1 alpha-2 codes (i.e., 2-characters identifiers)
-        # Map them to Wikidata countries with codes (see property P297)
-        ?genderize_country_value wdt:P297 ?iso .
-
-        OPTIONAL { ?genderize_country_value wdt:571 ?country_Inception . }
-        FILTER (!BOUND(?country_Inception) || ?article_publication_date >= ?country_Inception)
-        OPTIONAL { ?genderize_country_value wdt:P576 ?country_EndDate . }
-        FILTER (!BOUND(?country_EndDate) || ?article_publication_date < ?country_EndDate)
-    }
+            # Map some places to countries (see divinwd/countries.json)
+""" + country_pattern('country_value', 'author_country', '            ') + """
 
-    # Bind final country
-    BIND (COALESCE(?wd_country_value, ?genderize_country_value, "unknown") AS ?country_value)
-
-    # Map some places to countries
-    BIND (
-        COALESCE(
-            IF(?country_value = wd:Q55, wd:Q29999, 1/0), # Netherlands -> Kingdom of the Netherlands
-            IF(?country_value = wd:Q756617, wd:Q35, 1/0), # Kingdom of Denmark -> Denmark
-            IF(?country_value IN (wd:Q21, wd:Q22, wd:Q25, wd:Q42406), wd:Q145, 1/0), # England, Scotland, Wales, citizens of England -> UK
-            IF(?country_value = wd:Q15124, wd:Q38, 1/0), # Sudtirolo -> Italia
-            IF(?country_value = wd:Q188736, wd:Q225, 1/0), # Bosnia -> Bosnia and Herzegovina
-            IF(?country_value IN (wd:Q29520, wd:Q14773), wd:Q148, 1/0), # Cina, Macao -> Repubblica Popolare Cinese
-            IF(?country_value = wd:Q1335, wd:Q77, 1/0), # Città di Montevideo -> Uruguay
-            IF(?country_value = wd:Q320015, wd:Q739, 1/0), # Città di Pasto -> Colombia
-            IF(?country_value = wd:Q205784, wd:Q717, 1/0), # Stato di Portuguesa -> Venezuela
-            IF(?country_value = wd:Q1018839, wd:Q30, 1/0), # Città di Española -> USA
-            IF(?country_value = wd:Q47588, wd:Q29, 1/0), # Paesi baschi -> Spagna
-            IF(?country_value = wd:Q5689, wd:Q33, 1/0), # Åland -> Finland
-            ?country_value # Default
-        ) AS ?author_country
-    )
-
-    # Bind source
-    BIND (IF(BOUND(?wd_country_value), "wikidata", IF(BOUND(?genderize_country_value), "genderize", "unknown")) AS ?source)
-}
-GROUP BY ?year ?source
-"""
+            # Bind source
+            BIND (IF(BOUND(?wd_country_value), "wikidata", IF(BOUND(?genderize_country_value), "genderize", "unknown")) AS ?source)
 
+            # Continent; some islands in the Pacific Ocean are not linked to Oceania (see divinwd/countries.json)
+""" + continent_pattern('author_country', 'continent', '            ') + """
+            BIND (COALESCE(?continent, "unknown") AS ?author_continent)
 
-QUERY_AUTHORS = """
-PREFIX wd: <http://www.wikidata.org/entity/>
-PREFIX wdt: <http://www.wikidata.org/prop/direct/>
-SELECT ?year (COUNT(DISTINCT ?author) AS ?author_count) WHERE {
-    {
-        SELECT ?article (YEAR(MIN(?publicationDate)) AS ?year) WHERE {
-            ?article wdt:P31 wd:Q13442814 ;
-                    wdt:P577 ?publicationDate ;
-                    wdt:P50 [ wdt:P31 wd:Q5 ] .
-
-            FILTER (YEAR(?publicationDate) <= YEAR(NOW()))
-            MINUS { ?article wdt:P2093 ?authorNameString . }
-            MINUS {
-                ?article wdt:P50 ?x .
-                FILTER NOT EXISTS { ?x wdt:P31 wd:Q5 . }
+            OPTIONAL {
+                ?author_continent rdfs:label ?continent_label .
+                FILTER (LANG(?continent_label) = "en")
             }
+
+            BIND (COALESCE(?continent_label, "Unknown") AS ?continent_name)
         }
-        GROUP BY ?article
-        HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && 2010 <= ?year && ?year <= 2024)
+        GROUP BY ?year ?author
     }
-    ?article wdt:P50 ?author .
 }
-GROUP BY ?year
+GROUP BY ?year ?sources ?continents
+ORDER BY ?year ?sources ?continents
 """
 
+QUERY_DERIVED = QUERY.replace(ARTICLES, ARTICLES_DERIVED)
 
-def query_endpoint(url, query):
-    headers = {"Accept": "text/csv"}
-    params = {"query": query, "format": "text/csv"}
 
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        return response.text
-    except requests.ConnectionError:
-        print("Error: Failed to connect to the server. Check the URL (is the server up?)", file=sys.stderr)
-        sys.exit(1)
-    except requests.Timeout:
-        print("Error: Request timed out. The server took too long to respond.", file=sys.stderr)
-        sys.exit(1)
-    except requests.RequestException as e:
-        print(f"Error: An error occurred while making the request: {str(e)}", file=sys.stderr)
-        sys.exit(1)
+def cube_counts(cube):
+    # The result of QUERY, from a cube built by `python -m divinwd.cube`
+    df = cube.slice('authors', ['year', 'nationality_sources', 'continents'], where={'year': range(2010, 2025)})
+    return df.rename(columns={'nationality_sources': 'sources'})
 
 
 def main():
-    arguments = get_arg_parser().parse_args()
+    arguments = parse_source_arguments(get_arg_parser())
 
-    print("Waiting for response...")
-    continents = query_endpoint(arguments.url, QUERY_CONTINENT)
-    sources = query_endpoint(arguments.url, QUERY_SOURCE)
-    authors = query_endpoint(arguments.url, QUERY_AUTHORS)
+    if arguments.cube:
+        df = counts_or_exit(arguments.cube, cube_counts)
+    else:
+        print("Waiting for response...")
+        with client_from_arguments(arguments) as client:
+            df = pd.read_csv(io.StringIO(query_or_exit(client, QUERY_DERIVED if arguments.derived else QUERY)))
 
-    create_figure_abs(continents, sources, authors)
+    create_figure_abs(*split_counts(df))
 
 
 if __name__ == '__main__':
@@ -1,5 +1,5 @@
-import requests
 import argparse
+import os
 import sys
 import io
 import numpy as np
@@ -7,10 +7,16 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.metrics import r2_score
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from divinwd.cube import add_source_arguments, counts_or_exit, parse_source_arguments
+from divinwd.sparql import client_from_arguments, query_or_exit
+
 
 def get_arg_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--url', required=True, help='SPARQL endpoint URL')
+    add_source_arguments(parser)
+    parser.add_argument('--derived', action='store_true',
+                        help='select articles with the triples derived when indexing the dataset (see database/README.md)')
 
     return parser
 
@@ -86,12 +92,9 @@ def create_figure(csv_text):
     plt.savefig('figure.png', format='png', bbox_inches='tight', dpi=600)
 
 
-QUERY = """
-PREFIX wd: <http://www.wikidata.org/entity/>
-PREFIX wdt: <http://www.wikidata.org/prop/direct/>
-
-SELECT ?year (COUNT(DISTINCT ?article) AS ?article_count) WHERE {
-    {
+# Articles of the dataset: scholarly articles with a single publication year, whose
+# authors are all humans listed as Wikidata entities
+ARTICLES = """    {
         SELECT ?article (YEAR(MIN(?publicationDate)) AS ?year) WHERE {
             ?article wdt:P31 wd:Q13442814 ;
                     wdt:P577 ?publicationDate ;
@@ -106,35 +109,43 @@ SELECT ?year (COUNT(DISTINCT ?article) AS ?article_count) WHERE {
         }
         GROUP BY ?article
         HAVING (COUNT(DISTINCT YEAR(?publicationDate)) = 1 && ?year <= YEAR(NOW()))
-    }
+    }"""
+
+# The same articles, read from the triples derived from the dataset when it is indexed
+# (see database/README.md), without the grouping and MINUS clauses above
+ARTICLES_DERIVED = """    ?article divinwd:eligibleYear ?year ."""
+
+
+QUERY = """
+PREFIX wd: <http://www.wikidata.org/entity/>
+PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+PREFIX divinwd: <https://divinwd.dev/derived/>
+
+SELECT ?year (COUNT(DISTINCT ?article) AS ?article_count) WHERE {
+""" + ARTICLES + """
     ?article wdt:P50 ?author .
 }
 GROUP BY ?year
 ORDER BY ?year
 """
 
+QUERY_DERIVED = QUERY.replace(ARTICLES, ARTICLES_DERIVED)
 
-def main():
-    arguments = get_arg_parser().parse_args()
 
-    url = arguments.url
-    headers = {"Accept": "text/csv"}
-    params = {"query": QUERY, "format": "text/csv"}
+def cube_counts(cube):
+    # The result of QUERY, from a cube built by `python -m divinwd.cube`
+    return cube.slice('articles', ['year'])
 
-    print("Waiting for response...")
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        csv_text = response.text
-    except requests.ConnectionError:
-        print("Error: Failed to connect to the server. Check the URL (is the server up?)", file=sys.stderr)
-        sys.exit(1)
-    except requests.Timeout:
-        print("Error: Request timed out. The server took too long to respond.", file=sys.stderr)
-        sys.exit(1)
-    except requests.RequestException as e:
-        print(f"Error: An error occurred while making the request: {str(e)}", file=sys.stderr)
-        sys.exit(1)
+
+def main():
+    arguments = parse_source_arguments(get_arg_parser())
+
+    if arguments.cube:
+        csv_text = counts_or_exit(arguments.cube, cube_counts).to_csv(index=False)
+    else:
+        print("Waiting for response...")
+        with client_from_arguments(arguments) as client:
+            csv_text = query_or_exit(client, QUERY_DERIVED if arguments.derived else QUERY)
 
     create_figure(csv_text)
 